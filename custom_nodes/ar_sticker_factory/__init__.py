@@ -3,22 +3,19 @@ AR Sticker Factory - ComfyUI Custom Node
 Generate AR-ready stickers with FLUX.1-schnell and SAM2
 """
 
-from .nodes.ar_sticker_generator import ARStickerGenerator
-from .nodes.sam2_segmenter import SAM2Segmenter
-from .nodes.usdz_exporter import USDZExporter
+# The node classes (and the warm-standby hook) live in .registration and are
+# imported on first access to the mappings, so importing a utils or pipeline
+# module from this package doesn't pull in the nodes and their loaders
+_REGISTRATION_NAMES = ("NODE_CLASS_MAPPINGS", "NODE_DISPLAY_NAME_MAPPINGS")
 
-# ComfyUI Node Registration
-NODE_CLASS_MAPPINGS = {
-    "ARStickerGenerator": ARStickerGenerator,
-    "SAM2Segmenter": SAM2Segmenter,
-    "USDZExporter": USDZExporter,
-}
 
-NODE_DISPLAY_NAME_MAPPINGS = {
-    "ARStickerGenerator": "AR Sticker Generator",
-    "SAM2Segmenter": "SAM2 Background Removal",
-    "USDZExporter": "USDZ AR Exporter",
-}
+def __getattr__(name):
+    if name in _REGISTRATION_NAMES:
+        from . import registration
+
+        return getattr(registration, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # ComfyUI Web Extension Support
 WEB_DIRECTORY = "./web"
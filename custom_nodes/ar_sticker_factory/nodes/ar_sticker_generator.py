@@ -7,7 +7,16 @@ Optimized for fast, production-ready sticker generation on H100 GPUs
 import torch
 import numpy as np
 import time
-from ..models.sdxl_loader import SDXLLoader
+from ..utils.memory_tracking import memory_summary
+from ..utils.profiling import profiled
+from ..utils.quality_gate import check_sticker, retry_seed
+from ..utils.upscaling import (
+    DEFAULT_UPSCALER,
+    estimate_time_saved,
+    generation_size,
+    upscale_sticker,
+)
+from ..utils.weight_loading import get_model_cache
 from .sam2_segmenter import SAM2Segmenter
 
 
@@ -77,20 +86,52 @@ class ARStickerGenerator:
                 ),
                 "seed": ("INT", {"default": -1, "min": -1, "max": 2**32 - 1}),
                 "remove_background": ("BOOLEAN", {"default": True}),
-            }
+            },
+            "optional": {
+                "fast_upscale": ("BOOLEAN", {"default": False}),
+                "generate_scale": (
+                    "FLOAT",
+                    {"default": 0.5, "min": 0.25, "max": 1.0, "step": 0.05},
+                ),
+                "upscaler": ("STRING", {"default": DEFAULT_UPSCALER}),
+                "quality_gate": ("BOOLEAN", {"default": True}),
+                "quality_retries": ("INT", {"default": 2, "min": 0, "max": 10}),
+            },
         }
 
-    RETURN_TYPES = ("IMAGE", "IMAGE", "MASK")
-    RETURN_NAMES = ("original_image", "sticker_with_alpha", "mask")
+    RETURN_TYPES = ("IMAGE", "IMAGE", "MASK", "INT")
+    RETURN_NAMES = ("original_image", "sticker_with_alpha", "mask", "seed")
     FUNCTION = "generate_sticker"
     CATEGORY = "AR Sticker Factory"
 
+    @classmethod
+    def IS_CHANGED(cls, seed=-1, **inputs):
+        """
+        Re-run on every queue when the seed is randomized
+
+        ComfyUI already caches on the inputs, so a fixed seed needs nothing
+        more; a seed of -1 draws a new image each time, with the seed it
+        resolved to on the seed output.
+        """
+        return float("nan") if seed == -1 else seed
+
     def __init__(self):
+        # Imported here so the class (and its INPUT_TYPES) is importable
+        # without the model loaders, e.g. by the headless stub pipeline
+        from ..models.sdxl_loader import SDXLLoader
+
         self.sdxl_loader = SDXLLoader()
         self.sam2_segmenter = SAM2Segmenter()
         self.pipeline = None
         self.generation_count = 0
 
+    def load_pipeline(self):
+        """Load SDXL once per process; every generator instance shares it"""
+        if self.pipeline is None:
+            print("🚀 Loading SDXL pipeline...")
+            self.pipeline = get_model_cache().get("sdxl", self.sdxl_loader.load_pipeline)
+        return self.pipeline
+
     def _enhance_sticker_prompt(self, base_prompt, sticker_style, background_style):
         """
         Enhance the base prompt with sticker-specific optimizations
@@ -120,6 +161,50 @@ class ARStickerGenerator:
 
         return width, height
 
+    @profiled("generate_images")
+    def generate_images(
+        self,
+        prompts,
+        negative_prompts,
+        width,
+        height,
+        num_inference_steps,
+        guidance_scale,
+        seeds,
+    ):
+        """
+        Run one batched SDXL call for prompts sharing dimensions and sampler settings
+
+        Args:
+            prompts: Already-enhanced prompts, one per image
+            negative_prompts: Negative prompts aligned with prompts
+            width, height: Validated output dimensions
+            num_inference_steps: Denoising steps for the whole batch
+            guidance_scale: CFG scale for the whole batch
+            seeds: Resolved integer seeds, one per image
+
+        Returns:
+            List of PIL images in prompt order
+        """
+        self.load_pipeline()
+
+        # One generator per image keeps each result reproducible from its own seed
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        generators = [torch.Generator(device=device).manual_seed(s) for s in seeds]
+
+        result = self.pipeline(
+            prompt=list(prompts),
+            negative_prompt=list(negative_prompts),
+            width=width,
+            height=height,
+            num_inference_steps=num_inference_steps,
+            guidance_scale=guidance_scale,
+            generator=generators,
+        )
+
+        return result.images
+
+    @profiled("generate_sticker")
     def generate_sticker(
         self,
         prompt,
@@ -132,20 +217,33 @@ class ARStickerGenerator:
         guidance_scale,
         seed,
         remove_background,
+        fast_upscale=False,
+        generate_scale=0.5,
+        upscaler=DEFAULT_UPSCALER,
+        quality_gate=True,
+        quality_retries=2,
     ):
         """
         Generate a high-quality sticker image using SDXL
+
+        With fast_upscale the image is denoised and segmented at a lower
+        resolution bucket (generate_scale of the target), then the image,
+        sticker and mask are upscaled to the target size.
+
+        With quality_gate the segmented sticker is checked before it is
+        returned; a rejected one is regenerated with a new seed up to
+        quality_retries times. The seed output is the seed finally used.
         """
         generation_start = time.time()
 
         try:
-            # Load pipeline if not already loaded
-            if self.pipeline is None:
-                print("🚀 Loading SDXL pipeline...")
-                self.pipeline = self.sdxl_loader.load_pipeline()
-
             # Validate and optimize dimensions
             width, height = self._validate_dimensions(width, height)
+            generate_width, generate_height = width, height
+            if fast_upscale:
+                generate_width, generate_height = generation_size(
+                    width, height, generate_scale
+                )
 
             # Enhance prompt for sticker generation
             enhanced_prompt = self._enhance_sticker_prompt(
@@ -155,57 +253,69 @@ class ARStickerGenerator:
             # Set seed for reproducibility
             if seed == -1:
                 seed = torch.randint(0, 2**32 - 1, (1,)).item()
-
-            device = "cuda" if torch.cuda.is_available() else "cpu"
-            generator = torch.Generator(device=device).manual_seed(seed)
+                print(f"🎲 Resolved random seed: {seed}")
 
             print(f"🎨 Generating sticker {self.generation_count + 1}")
             print(f"📝 Enhanced prompt: {enhanced_prompt[:100]}...")
             print(f"📐 Dimensions: {width}x{height}")
+            if (generate_width, generate_height) != (width, height):
+                print(f"⚡ Fast upscale: generating at {generate_width}x{generate_height}")
             print(f"⚡ Steps: {num_inference_steps}")
 
-            # Generate image with optimized parameters
-            inference_start = time.time()
-
-            result = self.pipeline(
-                prompt=enhanced_prompt,
-                negative_prompt=negative_prompt,
-                width=width,
-                height=height,
-                num_inference_steps=num_inference_steps,
-                guidance_scale=guidance_scale,
-                generator=generator,
-            )
-
-            inference_time = time.time() - inference_start
-
-            image = result.images[0]
-
-            # Convert PIL to tensor format expected by ComfyUI
-            image_array = np.array(image).astype(np.float32) / 255.0
-            image_tensor = torch.from_numpy(image_array)[None,]
-
-            # Store original image for return
-            original_tensor = image_tensor
-
-            # Apply background removal if requested
-            if remove_background:
-                print("🎭 Applying background removal...")
-                bg_removal_start = time.time()
-                
-                sticker_with_alpha, mask = self.sam2_segmenter.segment_background(
-                    image_tensor, 
-                    confidence_threshold=0.5,
-                    edge_smoothing=True,
-                    padding=5
+            first_seed = seed
+            attempt = 0
+            while True:
+                original_tensor, sticker_with_alpha, mask, inference_time = (
+                    self._generate_and_segment(
+                        enhanced_prompt,
+                        negative_prompt,
+                        generate_width,
+                        generate_height,
+                        num_inference_steps,
+                        guidance_scale,
+                        seed,
+                        remove_background,
+                    )
+                )
+                if not (remove_background and quality_gate):
+                    break
+
+                verdict = check_sticker(mask, method=self.sam2_segmenter.last_method)
+                if verdict["passed"]:
+                    break
+
+                reasons = ", ".join(verdict["reasons"])
+                attempt += 1
+                if attempt > quality_retries:
+                    print(
+                        f"⚠️  Quality gate: seed {seed} rejected ({reasons}), "
+                        "retries used up"
+                    )
+                    break
+                seed = retry_seed(first_seed, attempt)
+                print(f"🚫 Quality gate rejected ({reasons}); retrying with seed {seed}")
+
+            if (generate_width, generate_height) != (width, height):
+                sticker_with_alpha, mask, upscale_time = upscale_sticker(
+                    sticker_with_alpha, mask, (width, height), upscaler
+                )
+                if remove_background:
+                    original_tensor, _, original_time = upscale_sticker(
+                        original_tensor, None, (width, height), upscaler
+                    )
+                    upscale_time += original_time
+                else:
+                    original_tensor = sticker_with_alpha
+                full_time, saved = estimate_time_saved(
+                    inference_time,
+                    upscale_time,
+                    (generate_width, generate_height),
+                    (width, height),
+                )
+                print(
+                    f"⚡ Upscaled to {width}x{height} with {upscaler} in {upscale_time:.2f}s; "
+                    f"~{saved:.2f}s saved vs ~{full_time:.2f}s at full size"
                 )
-                
-                bg_removal_time = time.time() - bg_removal_start
-                print(f"🎭 Background removal: {bg_removal_time:.2f}s")
-            else:
-                # No background removal - return original with dummy mask
-                sticker_with_alpha = image_tensor
-                mask = torch.ones(1, 1, image_tensor.shape[1], image_tensor.shape[2])
 
             total_time = time.time() - generation_start
             self.generation_count += 1
@@ -213,9 +323,9 @@ class ARStickerGenerator:
             print(f"✅ Sticker generated successfully!")
             print(f"⏱️  Inference time: {inference_time:.2f}s")
             print(f"🎯 Total time: {total_time:.2f}s")
-            print(f"💾 GPU Memory: {self._get_memory_usage()}")
+            print(f"💾 Memory: {self._get_memory_usage()}")
 
-            return (original_tensor, sticker_with_alpha, mask)
+            return (original_tensor, sticker_with_alpha, mask, seed)
 
         except Exception as e:
             print(f"❌ Error in ARStickerGenerator: {str(e)}")
@@ -223,10 +333,63 @@ class ARStickerGenerator:
             print(f"🔧 Debug info - Dimensions: {width}x{height}")
             raise e
 
-    def _get_memory_usage(self):
-        """Get current GPU memory usage"""
-        if not torch.cuda.is_available():
-            return "CPU mode"
+    def _generate_and_segment(
+        self,
+        enhanced_prompt,
+        negative_prompt,
+        width,
+        height,
+        num_inference_steps,
+        guidance_scale,
+        seed,
+        remove_background,
+    ):
+        """
+        Generate one image and remove its background
 
-        allocated = torch.cuda.memory_allocated() / 1024**3
-        return f"{allocated:.1f}GB"
+        Returns:
+            Tuple of (original image, sticker with alpha, mask, inference seconds)
+        """
+        # Generate image with optimized parameters
+        inference_start = time.time()
+
+        image = self.generate_images(
+            [enhanced_prompt],
+            [negative_prompt],
+            width,
+            height,
+            num_inference_steps,
+            guidance_scale,
+            [seed],
+        )[0]
+
+        inference_time = time.time() - inference_start
+
+        # Convert PIL to tensor format expected by ComfyUI
+        image_array = np.array(image).astype(np.float32) / 255.0
+        image_tensor = torch.from_numpy(image_array)[None,]
+
+        # Apply background removal if requested
+        if remove_background:
+            print("🎭 Applying background removal...")
+            bg_removal_start = time.time()
+
+            sticker_with_alpha, mask = self.sam2_segmenter.segment_background(
+                image_tensor,
+                confidence_threshold=0.5,
+                edge_smoothing=True,
+                padding=5,
+            )
+
+            bg_removal_time = time.time() - bg_removal_start
+            print(f"🎭 Background removal: {bg_removal_time:.2f}s")
+        else:
+            # No background removal - return original with dummy mask
+            sticker_with_alpha = image_tensor
+            mask = torch.ones(1, 1, image_tensor.shape[1], image_tensor.shape[2])
+
+        return image_tensor, sticker_with_alpha, mask, inference_time
+
+    def _get_memory_usage(self):
+        """Get current and peak GPU and host memory usage"""
+        return memory_summary()
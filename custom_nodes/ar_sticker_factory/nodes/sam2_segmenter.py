@@ -6,8 +6,10 @@ Background removal using Meta's Segment Anything Model 2
 import torch
 import numpy as np
 from PIL import Image
-from ..models.sam2_loader import SAM2Loader
 from ..utils.image_processing import process_alpha_channel
+from ..utils.profiling import profiled
+from ..utils.tiling import apply_mask_tiled, to_float_tensor, to_uint8
+from ..utils.weight_loading import get_model_cache, load_rembg_session
 
 
 class SAM2Segmenter:
@@ -35,9 +37,22 @@ class SAM2Segmenter:
     CATEGORY = "AR Sticker Factory"
 
     def __init__(self):
+        # Imported here so the class (and its INPUT_TYPES) is importable
+        # without the model loaders, e.g. by the headless stub pipeline
+        from ..models.sam2_loader import SAM2Loader
+
         self.sam2_loader = SAM2Loader()
         self.predictor = None
+        # Method behind the latest result: "sam2", "rembg" or "fallback"
+        self.last_method = None
+
+    def load_model(self):
+        """Load SAM2 once per process; every segmenter instance shares it"""
+        if self.predictor is None:
+            self.predictor = get_model_cache().get("sam2", self.sam2_loader.load_model)
+        return self.predictor
 
+    @profiled("segment_background")
     def segment_background(self, image, confidence_threshold, edge_smoothing, padding):
         """
         Remove background using SAM2 automatic segmentation with rembg fallback
@@ -47,20 +62,24 @@ class SAM2Segmenter:
             if self.sam2_loader and hasattr(self.sam2_loader, 'load_model'):
                 result = self._try_sam2_segmentation(image, confidence_threshold, edge_smoothing, padding)
                 if result is not None:
+                    self.last_method = "sam2"
                     return result
                     
             # Fallback to rembg if SAM2 fails
             print("🔄 SAM2 unavailable, trying rembg background removal...")
             result = self._try_rembg_segmentation(image, edge_smoothing, padding)
             if result is not None:
+                self.last_method = "rembg"
                 return result
                 
             # Final fallback to geometric mask
             print("⚠️  All automatic methods failed, using geometric fallback")
+            self.last_method = "fallback"
             return self._fallback_segmentation(image, padding)
 
         except Exception as e:
             print(f"❌ Error in SAM2Segmenter: {str(e)}")
+            self.last_method = "fallback"
             return self._fallback_segmentation(image, padding)
 
     def _try_sam2_segmentation(self, image, confidence_threshold, edge_smoothing, padding):
@@ -68,15 +87,13 @@ class SAM2Segmenter:
         try:
             from sam2.automatic_mask_generator import SAM2AutomaticMaskGenerator
             
-            # Load SAM2 model if not already loaded
-            if self.predictor is None:
-                self.predictor = self.sam2_loader.load_model()
+            self.load_model()
 
             if self.predictor is None:
                 return None
 
             # Convert ComfyUI tensor to numpy array
-            image_np = (image.squeeze(0).numpy() * 255).astype(np.uint8)
+            image_np = to_uint8(image)
             
             # Create automatic mask generator for better subject detection
             mask_generator = SAM2AutomaticMaskGenerator(
@@ -145,8 +162,7 @@ class SAM2Segmenter:
             image_with_alpha = self._apply_mask_to_image(pil_image, best_mask)
             
             # Convert to tensors
-            result_array = np.array(image_with_alpha).astype(np.float32) / 255.0
-            result_tensor = torch.from_numpy(result_array)[None,]
+            result_tensor = to_float_tensor(np.asarray(image_with_alpha))
             mask_tensor = torch.from_numpy(best_mask.astype(np.float32))[None, None,]
             
             return (result_tensor, mask_tensor)
@@ -158,14 +174,14 @@ class SAM2Segmenter:
     def _try_rembg_segmentation(self, image, edge_smoothing, padding):
         """Try rembg background removal as fallback"""
         try:
-            from rembg import remove, new_session
+            from rembg import remove
             
             # Convert tensor to PIL
-            image_np = (image.squeeze(0).numpy() * 255).astype(np.uint8)
+            image_np = to_uint8(image)
             pil_image = Image.fromarray(image_np)
             
-            # Use u2net model (good for general objects)
-            session = new_session('u2net')
+            # Use u2net model (good for general objects), loaded once per process
+            session = get_model_cache().get("u2net", load_rembg_session)
             result_image = remove(pil_image, session=session)
             
             # Extract alpha channel as mask
@@ -180,8 +196,7 @@ class SAM2Segmenter:
                 print("✅ rembg background removal successful")
                 
                 # Convert to tensors
-                result_array = np.array(result_image).astype(np.float32) / 255.0
-                result_tensor = torch.from_numpy(result_array)[None,]
+                result_tensor = to_float_tensor(np.asarray(result_image))
                 mask_tensor = torch.from_numpy(mask)[None, None,]
                 
                 return (result_tensor, mask_tensor)
@@ -215,15 +230,14 @@ class SAM2Segmenter:
         mask = mask.float()
 
         # Convert image to PIL for processing
-        image_np = (image.squeeze(0).numpy() * 255).astype(np.uint8)
+        image_np = to_uint8(image)
         pil_image = Image.fromarray(image_np)
 
         # Apply mask
         image_with_alpha = self._apply_mask_to_image(pil_image, mask.numpy())
 
         # Convert back to tensors
-        result_array = np.array(image_with_alpha).astype(np.float32) / 255.0
-        result_tensor = torch.from_numpy(result_array)[None,]
+        result_tensor = to_float_tensor(np.asarray(image_with_alpha))
         mask_tensor = mask[
             None,
             None,
@@ -233,14 +247,6 @@ class SAM2Segmenter:
 
     def _apply_mask_to_image(self, image, mask):
         """Apply mask to create RGBA image with transparent background"""
-        image_array = np.array(image)
-
-        # Add alpha channel
-        if image_array.shape[2] == 3:  # RGB
-            alpha = mask.astype(np.uint8) * 255
-            image_with_alpha = np.dstack([image_array, alpha])
-        else:  # Already has alpha
-            image_with_alpha = image_array.copy()
-            image_with_alpha[:, :, 3] = mask.astype(np.uint8) * 255
-
+        # Filled band by band, so large frames never get a stacked copy
+        image_with_alpha = apply_mask_tiled(np.asarray(image), mask)
         return Image.fromarray(image_with_alpha, "RGBA")
@@ -0,0 +1,288 @@
+"""
+Sticker Pack Bundler Node
+Bundle a batch of stickers into a single AR pack archive with a manifest
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+import torch
+from PIL import Image
+
+from ..utils.fingerprint import fingerprint_inputs
+from ..utils.image_processing import tensor_to_rgba
+from ..utils.png_encoding import encode_png, PNG_PROFILES, DEFAULT_PNG_PROFILE
+from .usdz_exporter import USDZExporter
+
+
+class StickerPackBundler:
+    """
+    ComfyUI node for exporting many stickers into one pack archive
+
+    Members are exported in parallel and streamed into the archive as each
+    one finishes, so only the in-flight members are held in memory.
+    """
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "images": ("IMAGE",),
+                "pack_name": ("STRING", {"default": "sticker_pack", "multiline": False}),
+                "pack_theme": ("STRING", {"default": "", "multiline": True}),
+                "scale": (
+                    "FLOAT",
+                    {"default": 0.1, "min": 0.01, "max": 2.0, "step": 0.01},
+                ),
+                "material_type": (
+                    ["matte", "glossy", "metallic"],
+                    {"default": "matte"},
+                ),
+                "ar_behavior": (
+                    ["billboard", "fixed", "physics"],
+                    {"default": "billboard"},
+                ),
+                "export_format": (
+                    list(USDZExporter.EXPORT_FORMATS.keys()),
+                    {"default": "usdz"},
+                ),
+            },
+            "optional": {
+                "png_profile": (
+                    list(PNG_PROFILES.keys()),
+                    {"default": DEFAULT_PNG_PROFILE},
+                ),
+                "max_workers": ("INT", {"default": 4, "min": 1, "max": 32, "step": 1}),
+                "thumbnail_size": (
+                    "INT",
+                    {"default": 256, "min": 64, "max": 1024, "step": 32},
+                ),
+            },
+        }
+
+    # Accept an IMAGE batch or a list of IMAGE batches from upstream nodes
+    INPUT_IS_LIST = True
+
+    RETURN_TYPES = ("STRING", "IMAGE")
+    RETURN_NAMES = ("pack_path", "thumbnail")
+    FUNCTION = "bundle_pack"
+    CATEGORY = "AR Sticker Factory"
+    OUTPUT_NODE = True
+
+    @classmethod
+    def IS_CHANGED(cls, pack_name="sticker_pack", max_workers=None, **inputs):
+        """
+        Hash of the pack inputs, or NaN when the pack archive is missing
+
+        max_workers only changes how fast the pack is built, not its contents.
+        """
+        name = pack_name[0] if isinstance(pack_name, list) else pack_name
+        pack_path = os.path.join(os.getcwd(), "output", "sticker_packs", f"{name}.zip")
+
+        if not os.path.exists(pack_path):
+            return float("nan")
+        return fingerprint_inputs(pack_name=name, **inputs)
+
+    def __init__(self):
+        self.exporter = USDZExporter()
+
+    def bundle_pack(
+        self,
+        images,
+        pack_name,
+        pack_theme,
+        scale,
+        material_type,
+        ar_behavior,
+        export_format,
+        png_profile=None,
+        max_workers=None,
+        thumbnail_size=None,
+    ):
+        """
+        Export every sticker and stream them into a pack archive
+
+        Raises:
+            ValueError: No images, or a pack_name that isn't a plain file name
+        """
+        # Shares the bulk runner's rule for names that end up in paths
+        from ..pipeline.runner import _FILENAME_PATTERN
+
+        # INPUT_IS_LIST wraps every widget value in a list
+        pack_name = pack_name[0]
+        if not isinstance(pack_name, str) or not _FILENAME_PATTERN.fullmatch(pack_name):
+            raise ValueError(
+                "pack_name must be 1-128 letters, digits, '.', '_' or '-', "
+                "starting with a letter or digit"
+            )
+        pack_theme = pack_theme[0]
+        scale = scale[0]
+        material_type = material_type[0]
+        ar_behavior = ar_behavior[0]
+        export_format = export_format[0]
+        png_profile = png_profile[0] if png_profile else DEFAULT_PNG_PROFILE
+        max_workers = max_workers[0] if max_workers else 4
+        thumbnail_size = thumbnail_size[0] if thumbnail_size else 256
+
+        # Flatten batches into individual (1, H, W, C) frames
+        frames = [batch[i : i + 1] for batch in images for i in range(batch.shape[0])]
+        if not frames:
+            raise ValueError("StickerPackBundler received no images")
+
+        pack_start = time.time()
+        output_dir = os.path.join(os.getcwd(), "output", "sticker_packs")
+        os.makedirs(output_dir, exist_ok=True)
+        pack_path = os.path.join(output_dir, f"{pack_name}.zip")
+
+        print(f"📦 Bundling {len(frames)} stickers into {pack_path}")
+
+        # Stream into a temp file in the same directory and rename it into
+        # place at the end, so a failed member or a crash never leaves a
+        # truncated pack at pack_path
+        fd, temp_path = tempfile.mkstemp(dir=output_dir, prefix=".tmp-", suffix=".zip")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                with zipfile.ZipFile(f, "w", zipfile.ZIP_STORED) as archive:
+                    thumbnail = self._write_pack(
+                        archive,
+                        frames,
+                        pack_name,
+                        pack_theme,
+                        scale,
+                        material_type,
+                        ar_behavior,
+                        export_format,
+                        png_profile,
+                        max_workers,
+                        thumbnail_size,
+                    )
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, pack_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        print(f"🎁 Sticker pack created: {pack_path} ({time.time() - pack_start:.2f}s)")
+
+        thumbnail_array = np.array(thumbnail).astype(np.float32) / 255.0
+        return (pack_path, torch.from_numpy(thumbnail_array)[None,])
+
+    def _write_pack(
+        self,
+        archive,
+        frames,
+        pack_name,
+        pack_theme,
+        scale,
+        material_type,
+        ar_behavior,
+        export_format,
+        png_profile,
+        max_workers,
+        thumbnail_size,
+    ):
+        """
+        Export the members in parallel and stream them, the thumbnail and
+        the manifest into an open archive
+
+        Returns:
+            The pack thumbnail as a PIL Image
+        """
+        members = []
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            pending = set()
+            next_index = 0
+
+            # Keep a bounded window of members in flight
+            while next_index < len(frames) or pending:
+                while next_index < len(frames) and len(pending) < max_workers * 2:
+                    pending.add(
+                        pool.submit(
+                            self._export_member,
+                            export_format,
+                            next_index,
+                            frames[next_index],
+                            scale,
+                            material_type,
+                            ar_behavior,
+                            png_profile,
+                        )
+                    )
+                    next_index += 1
+
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, payload, size = future.result()
+                    name = f"stickers/{pack_name}_{index:03d}.{export_format}"
+                    archive.writestr(name, payload)
+                    members.append(
+                        {
+                            "index": index,
+                            "file": name,
+                            "width": size[0],
+                            "height": size[1],
+                            "bytes": len(payload),
+                            "sha256": hashlib.sha256(payload).hexdigest(),
+                        }
+                    )
+                    print(f"✅ Packed {name}")
+
+        thumbnail = self._create_thumbnail(frames, thumbnail_size)
+        thumbnail_bytes, _ = encode_png(thumbnail, png_profile)
+        archive.writestr("thumbnail.png", thumbnail_bytes)
+
+        members.sort(key=lambda member: member["index"])
+        manifest = {
+            "pack_name": pack_name,
+            "pack_theme": pack_theme,
+            "format": export_format,
+            "scale": scale,
+            "material_type": material_type,
+            "behavior": ar_behavior,
+            "count": len(members),
+            "thumbnail": "thumbnail.png",
+            "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "stickers": members,
+        }
+        archive.writestr("manifest.json", json.dumps(manifest, indent=2))
+        return thumbnail
+
+    def _export_member(
+        self, export_format, index, frame, scale, material_type, ar_behavior, png_profile
+    ):
+        """Export one sticker into an in-memory payload"""
+        result = self.exporter.export_payload(
+            frame,
+            scale=scale,
+            material_type=material_type,
+            ar_behavior=ar_behavior,
+            png_profile=png_profile,
+            export_format=export_format,
+        )
+        if result["format"] != export_format:
+            raise RuntimeError(f"Failed to export sticker {index} as {export_format}")
+        return index, result["payload"], (result["width"], result["height"])
+
+    def _create_thumbnail(self, frames, size):
+        """Compose up to four stickers into a square pack thumbnail"""
+        thumbnail = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+        samples = frames[:4]
+        columns = 1 if len(samples) == 1 else 2
+        cell = size // columns
+
+        for i, frame in enumerate(samples):
+            sticker = tensor_to_rgba(frame)
+            sticker.thumbnail((cell, cell), Image.Resampling.LANCZOS)
+            x = (i % columns) * cell + (cell - sticker.width) // 2
+            y = (i // columns) * cell + (cell - sticker.height) // 2
+            thumbnail.alpha_composite(sticker, (x, y))
+
+        return thumbnail
@@ -3,15 +3,26 @@ USDZ Exporter Node
 Export images as AR-ready USDZ files for iOS QuickLook with fallback support
 """
 
-import numpy as np
 from PIL import Image
+import hashlib
+import io
 import os
 import json
+import time
 from ..utils.usdz_creation import (
     create_usdz_from_image, 
     create_fallback_obj, 
-    USD_AVAILABLE
+    fallback_obj_paths,
 )
+from ..utils.async_writer import get_export_writer
+from ..utils.export_cache import get_export_cache
+from ..utils.fingerprint import fingerprint, fingerprint_params
+from ..utils.glb_creation import create_glb_from_image
+from ..utils.image_processing import tensor_to_rgba, trim_to_alpha
+from ..utils.manifest_index import IN_MEMORY_PATH_PREFIX, get_default_index
+from ..utils.output_store import get_default_store, write_atomic
+from ..utils.profiling import profiled
+from ..utils.png_encoding import encode_png, PNG_PROFILES, DEFAULT_PNG_PROFILE
 
 
 class USDZExporter:
@@ -19,6 +30,18 @@ class USDZExporter:
     ComfyUI node for exporting images as USDZ AR files with fallback to OBJ/PNG
     """
 
+    # Single-file formats and their writers; png_obj is the multi-file fallback
+    EXPORT_FORMATS = {
+        "usdz": create_usdz_from_image,
+        "glb": create_glb_from_image,
+    }
+
+    CONTENT_TYPES = {
+        "usdz": "model/vnd.usdz+zip",
+        "glb": "model/gltf-binary",
+        "png": "image/png",
+    }
+
     @classmethod
     def INPUT_TYPES(cls):
         return {
@@ -41,7 +64,29 @@ class USDZExporter:
                     "BOOLEAN",
                     {"default": True},
                 ),
-            }
+            },
+            "optional": {
+                "auto_trim": ("BOOLEAN", {"default": False}),
+                "trim_margin": (
+                    "INT",
+                    {"default": 8, "min": 0, "max": 128, "step": 1},
+                ),
+                "png_profile": (
+                    list(PNG_PROFILES.keys()),
+                    {"default": DEFAULT_PNG_PROFILE},
+                ),
+                "export_format": (
+                    ["usdz", "glb", "png_obj"],
+                    {"default": "usdz"},
+                ),
+                "async_export": ("BOOLEAN", {"default": False}),
+                "output_layout": (
+                    ["flat", "content_addressed"],
+                    {"default": "flat"},
+                ),
+                "write_sidecars": ("BOOLEAN", {"default": True}),
+                "prompt": ("STRING", {"default": "", "forceInput": True}),
+            },
         }
 
     RETURN_TYPES = ("STRING", "STRING", "STRING")
@@ -50,79 +95,514 @@ class USDZExporter:
     CATEGORY = "AR Sticker Factory"
     OUTPUT_NODE = True
 
-    def export_ar_sticker(self, image, scale, filename, material_type, ar_behavior, optimize_mobile):
+    @classmethod
+    def IS_CHANGED(
+        cls,
+        image=None,
+        scale=0.1,
+        filename="sticker",
+        material_type="matte",
+        ar_behavior="billboard",
+        optimize_mobile=True,
+        auto_trim=False,
+        trim_margin=8,
+        png_profile=DEFAULT_PNG_PROFILE,
+        export_format="usdz",
+        async_export=False,
+        output_layout="flat",
+        write_sidecars=True,
+        prompt="",
+    ):
         """
-        Export image as AR-ready file (USDZ preferred, OBJ/PNG fallback)
+        Hash of the export inputs, or NaN when their artifact is missing
+
+        ComfyUI skips the export while the hash is unchanged; NaN never
+        compares equal, so deleting the output re-triggers only this node.
+        async_export and prompt do not change the artifact and are left out.
         """
-        try:
-            # Convert ComfyUI tensor to PIL Image
-            image_np = (image.squeeze(0).numpy() * 255).astype(np.uint8)
+        params = cls._export_params(
+            scale,
+            filename,
+            material_type,
+            ar_behavior,
+            optimize_mobile,
+            auto_trim,
+            trim_margin,
+            png_profile,
+            export_format,
+            output_layout,
+            write_sidecars,
+        )
+
+        if image is not None:
+            key = fingerprint(tensor_to_rgba(image), **params)
+            available = get_export_cache().peek(key) is not None
+        else:
+            # Linked image not provided: fall back to the flat output path
+            key = fingerprint_params(**params)
+            output_dir = os.path.join(os.getcwd(), "output", "ar_stickers")
+            output_path, _ = cls._expected_output(output_dir, filename, export_format)
+            available = output_layout == "flat" and os.path.exists(output_path)
 
-            # Handle RGBA if present, ensure transparency
-            if image_np.shape[2] == 4:
-                pil_image = Image.fromarray(image_np, "RGBA")
-            else:
-                # Convert RGB to RGBA for AR transparency support
-                pil_image = Image.fromarray(image_np, "RGB").convert("RGBA")
+        return key if available else float("nan")
 
-            # Optimize for mobile if requested
-            if optimize_mobile:
-                pil_image = self._optimize_for_mobile(pil_image)
+    @staticmethod
+    def _export_params(
+        scale,
+        filename,
+        material_type,
+        ar_behavior,
+        optimize_mobile,
+        auto_trim,
+        trim_margin,
+        png_profile,
+        export_format,
+        output_layout,
+        write_sidecars,
+    ):
+        """Parameters that determine the exported artifact"""
+        return dict(
+            scale=scale,
+            filename=filename,
+            material_type=material_type,
+            ar_behavior=ar_behavior,
+            optimize_mobile=optimize_mobile,
+            auto_trim=auto_trim,
+            trim_margin=trim_margin,
+            png_profile=png_profile,
+            export_format=export_format,
+            output_layout=output_layout,
+            write_sidecars=write_sidecars,
+        )
+
+    @profiled("export_ar_sticker")
+    def export_ar_sticker(
+        self,
+        image,
+        scale,
+        filename,
+        material_type,
+        ar_behavior,
+        optimize_mobile,
+        auto_trim=False,
+        trim_margin=8,
+        png_profile=DEFAULT_PNG_PROFILE,
+        export_format="usdz",
+        async_export=False,
+        output_layout="flat",
+        write_sidecars=True,
+        prompt="",
+    ):
+        """
+        Export image as AR-ready file (USDZ or GLB, OBJ/PNG fallback)
+
+        With async_export the encoding and writes run on the background
+        export writer and the output path is returned immediately. That path
+        is the only place the job writes: a USDZ/GLB export that fails is
+        recorded as an error instead of falling back to PNG elsewhere.
+        Progress and failures are available from
+        get_export_writer().status(output_path).
+
+        With the content_addressed layout the payload is stored once under
+        its SHA-256 digest (see utils.output_store) and the stored path is
+        returned; the filename is only used for the AR instructions. The
+        stored path depends on the payload, so these exports run synchronously.
+
+        Exports are memoized on a hash of the image buffer and all export
+        parameters; a repeat export whose artifact still verifies is returned
+        without any work (see get_export_cache().stats()).
+
+        Every export is recorded in the manifest index (utils.manifest_index),
+        which makes the per-sticker JSON sidecars optional.
+
+        Raises:
+            Exception: The synchronous export failed; nothing was written
+                to the returned path
+        """
+        try:
+            # Convert ComfyUI tensor to RGBA PIL Image
+            pil_image = tensor_to_rgba(image)
+
+            cache_key = fingerprint(
+                pil_image,
+                **self._export_params(
+                    scale,
+                    filename,
+                    material_type,
+                    ar_behavior,
+                    optimize_mobile,
+                    auto_trim,
+                    trim_margin,
+                    png_profile,
+                    export_format,
+                    output_layout,
+                    write_sidecars,
+                ),
+            )
+            cache = get_export_cache()
+            cached = cache.lookup(cache_key)
+            if cached is not None:
+                print(
+                    f"♻️ Reusing export: {cached[0]} "
+                    f"(hit rate {cache.stats()['hit_rate']:.0%})"
+                )
+                return cached
 
             # Create output directories
             output_dir = os.path.join(os.getcwd(), "output", "ar_stickers")
             os.makedirs(output_dir, exist_ok=True)
 
-            # Try USDZ export first
-            if USD_AVAILABLE:
-                output_path = os.path.join(output_dir, f"{filename}.usdz")
-                success = create_usdz_from_image(
-                    image=pil_image,
-                    output_path=output_path,
-                    scale=scale,
-                    material_type=material_type,
+            export_options = dict(
+                pil_image=pil_image,
+                output_dir=output_dir,
+                filename=filename,
+                scale=scale,
+                material_type=material_type,
+                ar_behavior=ar_behavior,
+                optimize_mobile=optimize_mobile,
+                auto_trim=auto_trim,
+                trim_margin=trim_margin,
+                png_profile=png_profile,
+                export_format=export_format,
+                output_layout=output_layout,
+                prompt=prompt,
+                write_sidecars=write_sidecars,
+                input_fingerprint=cache_key,
+            )
+
+            if async_export and output_layout == "flat":
+                output_path, format_type = self._expected_output(
+                    output_dir, filename, export_format
+                )
+                job_id = get_export_writer().submit(
+                    output_path,
+                    self._export_and_remember,
+                    cache_key,
+                    fallback=False,
+                    **export_options,
+                )
+                print(f"⏳ Export queued: {output_path} ({job_id})")
+                return (
+                    output_path,
+                    format_type,
+                    self._generate_ar_instructions(format_type, filename),
+                )
+
+            return self._export_and_remember(cache_key, **export_options)
+
+        except Exception as e:
+            # Fail the node rather than hand an error string on as a path
+            print(f"❌ Error in USDZExporter: {str(e)}")
+            raise
+
+    @profiled("export_payload")
+    def export_payload(
+        self,
+        image,
+        scale=0.1,
+        material_type="matte",
+        ar_behavior="billboard",
+        optimize_mobile=True,
+        auto_trim=False,
+        trim_margin=8,
+        png_profile=DEFAULT_PNG_PROFILE,
+        export_format="usdz",
+        write_to_disk=False,
+        filename=None,
+        prompt="",
+    ):
+        """
+        Export image into memory for direct serving
+
+        Produces the same payload the file export writes (USDZ, GLB, or the
+        transparent PNG when png_obj is requested or a single-file format
+        fails) without a write-then-read round trip. Errors are raised.
+
+        The export is recorded in the manifest index like file exports;
+        payloads that are not persisted are recorded under a memory://
+        path named by their digest.
+
+        Args:
+            image: ComfyUI IMAGE tensor or PIL Image
+            write_to_disk: Also persist the payload to the content store
+            filename: Name to record in the manifest index
+            prompt: Prompt to record in the manifest index
+
+        Returns:
+            Dict with payload (memoryview), format, content_type, bytes and
+            path (None unless write_to_disk)
+        """
+        export_start = time.time()
+        if isinstance(image, Image.Image):
+            pil_image = image.convert("RGBA")
+        else:
+            pil_image = tensor_to_rgba(image)
+
+        pil_image, mesh_scale, trim_box = self._prepare_image(
+            pil_image, scale, optimize_mobile, auto_trim, trim_margin
+        )
+        payload, format_type, png_stats = self._render_payload(
+            pil_image, mesh_scale, material_type, ar_behavior, png_profile, export_format
+        )
+
+        path = None
+        if write_to_disk:
+            stored = get_default_store().put(payload, f".{format_type}")
+            path = stored["location"]
+            content_sha256 = stored["digest"]
+        else:
+            content_sha256 = hashlib.sha256(payload).hexdigest()
+
+        get_default_index().record(
+            path=path or f"{IN_MEMORY_PATH_PREFIX}{content_sha256}.{format_type}",
+            format=format_type,
+            filename=filename,
+            prompt=prompt or None,
+            scale=scale,
+            behavior=ar_behavior,
+            material_type=material_type,
+            width=pil_image.width,
+            height=pil_image.height,
+            bytes=len(payload),
+            content_sha256=content_sha256,
+            encode_ms=png_stats.get("encode_ms"),
+            export_ms=round((time.time() - export_start) * 1000, 2),
+            png_profile=png_profile,
+            output_layout="content_addressed" if write_to_disk else "memory",
+            trim_box=list(trim_box) if trim_box else None,
+        )
+
+        return {
+            "payload": memoryview(payload),
+            "format": format_type,
+            "content_type": self.CONTENT_TYPES[format_type],
+            "bytes": len(payload),
+            "width": pil_image.width,
+            "height": pil_image.height,
+            "png_encoding": png_stats,
+            "path": path,
+        }
+
+    def _export_and_remember(self, cache_key, **export_options):
+        """
+        Write the export and memoize its result under cache_key, with every
+        file it wrote so a reuse verifies all of them
+        """
+        artifacts = []
+        result = self._write_outputs(artifacts=artifacts, **export_options)
+        get_export_cache().store(cache_key, result, artifacts)
+        return result
+
+    @classmethod
+    def _expected_output(cls, output_dir, filename, export_format):
+        """Output path and format the export will produce if it succeeds"""
+        if export_format in cls.EXPORT_FORMATS:
+            return (
+                os.path.join(output_dir, f"{filename}.{export_format}"),
+                export_format,
+            )
+        return os.path.join(output_dir, f"{filename}_ar.png"), "png"
+
+    def _prepare_image(self, pil_image, scale, optimize_mobile, auto_trim, trim_margin):
+        """
+        Trim and resize the sticker before encoding
+
+        Returns:
+            Tuple of (PIL Image, mesh scale, trim box or None)
+        """
+        # Crop transparent margins, shrinking the quad so the sticker
+        # keeps the same real-world size
+        mesh_scale = scale
+        trim_box = None
+        if auto_trim:
+            original_width = pil_image.width
+            pil_image, trim_box = trim_to_alpha(pil_image, trim_margin)
+            mesh_scale = scale * pil_image.width / original_width
+            print(f"✂️ Trimmed to {pil_image.width}x{pil_image.height}")
+
+        # Optimize for mobile if requested
+        if optimize_mobile:
+            pil_image = self._optimize_for_mobile(pil_image)
+
+        return pil_image, mesh_scale, trim_box
+
+    def _render_payload(
+        self,
+        pil_image,
+        mesh_scale,
+        material_type,
+        ar_behavior,
+        png_profile,
+        export_format,
+        fallback=True,
+    ):
+        """
+        Encode the export in memory
+
+        Single-file formats (USDZ is packaged natively, with or without USD)
+        fall back to the transparent PNG when they fail, unless fallback is
+        off.
+
+        Returns:
+            Tuple of (payload bytes, format_type, png_stats)
+
+        Raises:
+            RuntimeError: The single-file format failed and fallback is off
+        """
+        if export_format in self.EXPORT_FORMATS:
+            buffer = io.BytesIO()
+            png_stats = {}
+            success = self.EXPORT_FORMATS[export_format](
+                image=pil_image,
+                output_path=buffer,
+                scale=mesh_scale,
+                material_type=material_type,
+                ar_behavior=ar_behavior,
+                png_profile=png_profile,
+                stats=png_stats,
+            )
+            if success:
+                self._report_png_stats(png_stats)
+                return buffer.getvalue(), export_format, png_stats
+            if not fallback:
+                raise RuntimeError(f"{export_format.upper()} export failed")
+
+        # Fallback to PNG (+ OBJ when written to the flat layout)
+        print("📱 Using OBJ/PNG fallback for AR compatibility")
+        png_bytes, png_stats = encode_png(pil_image, png_profile)
+        self._report_png_stats(png_stats)
+        return png_bytes, "png", png_stats
+
+    def _write_outputs(
+        self,
+        pil_image,
+        output_dir,
+        filename,
+        scale,
+        material_type,
+        ar_behavior,
+        optimize_mobile,
+        auto_trim,
+        trim_margin,
+        png_profile,
+        export_format,
+        output_layout="flat",
+        prompt="",
+        write_sidecars=True,
+        input_fingerprint=None,
+        fallback=True,
+        artifacts=None,
+    ):
+        """
+        Process, encode and write the export files, then record them in the
+        manifest index
+
+        Args:
+            artifacts: Optional list extended with the path of every file
+                written (sticker, OBJ/MTL/texture, sidecars)
+
+        Returns:
+            Tuple of (output_path, format_type, ar_instructions)
+        """
+        export_start = time.time()
+
+        pil_image, mesh_scale, trim_box = self._prepare_image(
+            pil_image, scale, optimize_mobile, auto_trim, trim_margin
+        )
+        payload, format_type, png_stats = self._render_payload(
+            pil_image,
+            mesh_scale,
+            material_type,
+            ar_behavior,
+            png_profile,
+            export_format,
+            fallback,
+        )
+        ar_instructions = self._generate_ar_instructions(format_type, filename)
+        content_sha256 = None
+
+        if output_layout == "content_addressed":
+            suffix = ".png" if format_type == "png" else f".{format_type}"
+            stored = get_default_store().put(payload, suffix)
+            output_path = stored["location"]
+            written = [output_path]
+            content_sha256 = stored["digest"]
+            state = "deduplicated" if stored["deduplicated"] else "stored"
+            print(f"✅ {format_type.upper()} {state}: {output_path}")
+
+        elif format_type in self.EXPORT_FORMATS:
+            output_path = os.path.join(output_dir, f"{filename}.{format_type}")
+            # Readers (and the export cache) never see a half-written file
+            write_atomic(output_path, payload)
+            written = [output_path]
+
+            # Add AR metadata for QuickLook / Scene Viewer
+            if write_sidecars:
+                written.append(
+                    self._create_ar_metadata(output_path, ar_behavior, scale, png_stats)
                 )
-                
-                if success:
-                    # Add AR metadata for iOS QuickLook
-                    self._create_ar_metadata(output_path, ar_behavior, scale)
-                    
-                    ar_instructions = self._generate_ar_instructions("usdz", filename)
-                    print(f"✅ USDZ AR file created: {output_path}")
-                    return (output_path, "usdz", ar_instructions)
-
-            # Fallback to OBJ + PNG export
-            print("📱 Using OBJ/PNG fallback for AR compatibility")
-            
+
+            print(f"✅ {format_type.upper()} AR file created: {output_path}")
+
+        else:
             # Save optimized PNG
-            png_path = os.path.join(output_dir, f"{filename}_ar.png")
-            pil_image.save(png_path, "PNG", optimize=True)
-            
-            # Create OBJ for 3D viewers
+            output_path = os.path.join(output_dir, f"{filename}_ar.png")
+            write_atomic(output_path, payload)
+            written = [output_path]
+
+            # Create OBJ for 3D viewers, textured with the PNG just written
             obj_path = os.path.join(output_dir, f"{filename}.obj")
-            obj_success = create_fallback_obj(pil_image, obj_path, scale)
-            
+            obj_success = create_fallback_obj(
+                pil_image, obj_path, mesh_scale, texture_bytes=payload
+            )
+            if obj_success:
+                written.extend(fallback_obj_paths(obj_path))
+
             # Create AR instruction file
-            instructions_path = os.path.join(output_dir, f"{filename}_ar_instructions.json")
-            ar_data = {
-                "format": "png_obj",
-                "png_file": os.path.basename(png_path),
-                "obj_file": os.path.basename(obj_path) if obj_success else None,
-                "scale": scale,
-                "behavior": ar_behavior,
-                "instructions": self._generate_ar_instructions("png", filename)
-            }
-            
-            with open(instructions_path, 'w') as f:
-                json.dump(ar_data, f, indent=2)
-            
-            ar_instructions = self._generate_ar_instructions("png", filename)
-            print(f"✅ AR-ready PNG created: {png_path}")
-            return (png_path, "png", ar_instructions)
+            if write_sidecars:
+                instructions_path = os.path.join(
+                    output_dir, f"{filename}_ar_instructions.json"
+                )
+                ar_data = {
+                    "format": "png_obj",
+                    "png_file": os.path.basename(output_path),
+                    "obj_file": os.path.basename(obj_path) if obj_success else None,
+                    "scale": scale,
+                    "behavior": ar_behavior,
+                    "trim_box": list(trim_box) if trim_box else None,
+                    "png_encoding": png_stats,
+                    "instructions": ar_instructions
+                }
 
-        except Exception as e:
-            print(f"❌ Error in USDZExporter: {str(e)}")
-            return (f"Error: {str(e)}", "error", "Export failed")
+                with open(instructions_path, 'w') as f:
+                    json.dump(ar_data, f, indent=2)
+                written.append(instructions_path)
+
+            print(f"✅ AR-ready PNG created: {output_path}")
+
+        get_default_index().record(
+            path=output_path,
+            format=format_type,
+            filename=filename,
+            prompt=prompt or None,
+            scale=scale,
+            behavior=ar_behavior,
+            material_type=material_type,
+            width=pil_image.width,
+            height=pil_image.height,
+            bytes=len(payload),
+            content_sha256=content_sha256 or hashlib.sha256(payload).hexdigest(),
+            input_fingerprint=input_fingerprint,
+            encode_ms=png_stats.get("encode_ms"),
+            export_ms=round((time.time() - export_start) * 1000, 2),
+            png_profile=png_profile,
+            output_layout=output_layout,
+            trim_box=list(trim_box) if trim_box else None,
+        )
+
+        if artifacts is not None:
+            artifacts.extend(written)
+        return (output_path, format_type, ar_instructions)
 
     def _optimize_for_mobile(self, image):
         """Optimize image for mobile AR performance"""
@@ -136,9 +616,18 @@ class USDZExporter:
         # Optimize PNG compression
         return image
 
-    def _create_ar_metadata(self, usdz_path, behavior, scale):
-        """Create AR metadata for iOS QuickLook"""
-        metadata_path = usdz_path.replace('.usdz', '_ar_info.json')
+    def _report_png_stats(self, png_stats):
+        """Log PNG encode time and size for the selected profile"""
+        if png_stats:
+            palette = ", palette" if png_stats["palette"] else ""
+            print(
+                f"🗜️ PNG ({png_stats['profile']}{palette}): "
+                f"{png_stats['bytes']:,} bytes in {png_stats['encode_ms']:.1f}ms"
+            )
+
+    def _create_ar_metadata(self, usdz_path, behavior, scale, png_stats=None):
+        """Create AR metadata for iOS QuickLook and return its path"""
+        metadata_path = os.path.splitext(usdz_path)[0] + '_ar_info.json'
         metadata = {
             "ar_quicklook_compatible": True,
             "behavior": behavior,
@@ -148,11 +637,13 @@ class USDZExporter:
             "instructions": {
                 "ios": "Tap to place in AR, pinch to resize",
                 "android": "Use AR Core compatible viewer"
-            }
+            },
+            "png_encoding": png_stats,
         }
         
         with open(metadata_path, 'w') as f:
             json.dump(metadata, f, indent=2)
+        return metadata_path
 
     def _generate_ar_instructions(self, format_type, filename):
         """Generate AR viewing instructions"""
@@ -170,6 +661,19 @@ Sharing:
 • AirDrop to other iOS devices
 • Works in Messages, Mail, Safari
 • Compatible with AR Quick Look"""
+
+        elif format_type == "glb":
+            return f"""🎯 AR Instructions for {filename}.glb:
+
+Android (Scene Viewer):
+1. Open {filename}.glb from Files or a web link
+2. Tap 'View in your space'
+3. Point camera at flat surface
+4. Drag to move, pinch to resize
+
+Web:
+• Embed with <model-viewer src="{filename}.glb" ar>
+• Single self-contained file with embedded texture"""
         
         else:  # PNG fallback
             return f"""📱 AR Instructions for {filename}_ar.png:
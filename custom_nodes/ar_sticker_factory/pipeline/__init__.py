@@ -0,0 +1,31 @@
+"""
+AR Sticker Pipeline
+Headless generate → segment → export execution outside the ComfyUI graph
+"""
+
+from .backends import NodeBackend, StubBackend, BACKENDS
+from .journal import JobJournal
+from .runner import (
+    StickerPipeline,
+    default_params,
+    defaults_from_workflow,
+    load_rows,
+)
+from .shared_frames import FrameHandle, FrameRing, StaleFrame
+from .worker_pool import WorkerPool, detect_devices
+
+__all__ = [
+    "NodeBackend",
+    "StubBackend",
+    "BACKENDS",
+    "JobJournal",
+    "StickerPipeline",
+    "default_params",
+    "defaults_from_workflow",
+    "load_rows",
+    "FrameHandle",
+    "FrameRing",
+    "StaleFrame",
+    "WorkerPool",
+    "detect_devices",
+]
@@ -0,0 +1,220 @@
+"""
+Admission Control
+Per-stage service-time estimates, deadline-aware admission and queue metrics
+"""
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds per job before any are observed; replaced by the first sample
+DEFAULT_STAGE_ESTIMATES = {"generate": 4.0, "segment": 1.0, "export": 0.3}
+
+
+class Overloaded(Exception):
+    """Raised when a job is deferred or rejected; carries the decision"""
+
+    def __init__(self, decision):
+        super().__init__(decision["reason"])
+        self.decision = decision
+
+
+class AdmissionController:
+    """
+    Decide whether a new job can finish in time before it is queued
+
+    Each stage keeps an exponentially weighted moving average (EWMA) of its
+    service time. The slowest stage per slot (EWMA / concurrency limit)
+    bounds throughput, so a job with N jobs ahead of it is expected to
+    complete in about N / throughput + its own time through every stage.
+
+    Decisions:
+        admit  - no deadline, or the estimate fits it
+        defer  - the deadline can't be met now but could once the queue
+                 drains; the caller is told when to retry
+        reject - the deadline is shorter than the job's own service time,
+                 so it can't be met at any load
+    """
+
+    def __init__(self, stage_limits, initial_estimates=None, alpha=0.2, max_depth=None):
+        self.stage_limits = dict(stage_limits)
+        self.alpha = alpha
+        self.max_depth = max_depth
+
+        self._ewma = {
+            stage: DEFAULT_STAGE_ESTIMATES.get(stage, 1.0) for stage in self.stage_limits
+        }
+        self._ewma.update(initial_estimates or {})
+        self._samples = {stage: 0 for stage in self.stage_limits}
+        self._inflight = {stage: 0 for stage in self.stage_limits}
+        self.decisions = {"admit": 0, "defer": 0, "reject": 0}
+        self.expired = 0
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        """Fold one measured stage duration into its EWMA"""
+        with self._lock:
+            if self._samples[stage] == 0:
+                self._ewma[stage] = seconds
+            else:
+                self._ewma[stage] += self.alpha * (seconds - self._ewma[stage])
+            self._samples[stage] += 1
+
+    @contextmanager
+    def track(self, stage):
+        """Count a job as in flight in a stage and observe its duration"""
+        with self._lock:
+            self._inflight[stage] += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._inflight[stage] -= 1
+            self.observe(stage, time.perf_counter() - start)
+
+    def service_time(self):
+        """Expected seconds for one job through every stage on an idle system"""
+        return sum(self._ewma.values())
+
+    def throughput(self):
+        """Jobs per second the bottleneck stage can sustain"""
+        return min(
+            self.stage_limits[stage] / max(self._ewma[stage], 1e-6)
+            for stage in self.stage_limits
+        )
+
+    def estimate(self, jobs_ahead):
+        """Expected seconds until a job with jobs_ahead in front completes"""
+        return jobs_ahead / self.throughput() + self.service_time()
+
+    def decide(self, jobs_ahead, depth, deadline_s=None):
+        """
+        Admission decision for a new job
+
+        Args:
+            jobs_ahead: Jobs that will be served before this one
+            depth: Jobs currently waiting in the queue
+            deadline_s: Seconds from now the result is needed by, or None
+
+        Returns:
+            Dict with action, eta_s, retry_after_s and reason
+        """
+        eta = self.estimate(jobs_ahead)
+        decision = {"action": "admit", "eta_s": round(eta, 3), "retry_after_s": None}
+
+        if deadline_s is not None and deadline_s < self.service_time():
+            decision.update(
+                action="reject",
+                reason=f"deadline {deadline_s:.1f}s is below the "
+                f"{self.service_time():.1f}s service time",
+            )
+        elif deadline_s is not None and eta > deadline_s:
+            decision.update(
+                action="defer",
+                retry_after_s=math.ceil(eta - deadline_s),
+                reason=f"estimated completion {eta:.1f}s exceeds deadline {deadline_s:.1f}s",
+            )
+        elif self.max_depth is not None and depth >= self.max_depth:
+            decision.update(
+                action="defer",
+                retry_after_s=math.ceil((depth - self.max_depth + 1) / self.throughput()),
+                reason=f"queue depth {depth} at limit {self.max_depth}",
+            )
+
+        with self._lock:
+            self.decisions[decision["action"]] += 1
+        return decision
+
+    def record_expired(self):
+        """Count a queued job dropped because its deadline passed"""
+        with self._lock:
+            self.expired += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "stage_seconds_ewma": {
+                    stage: round(value, 4) for stage, value in self._ewma.items()
+                },
+                "stage_inflight": dict(self._inflight),
+                "throughput_per_s": round(self.throughput(), 4),
+                "decisions": dict(self.decisions),
+                "expired": self.expired,
+            }
+
+    def prometheus_metrics(self, depth_by_class, wait_stats, jobs_ahead):
+        """
+        Render metrics in the Prometheus text exposition format
+
+        sticker_queue_depth and sticker_estimated_completion_seconds are
+        meant as custom autoscaling signals (see k8s/hpa.yaml).
+
+        Args:
+            depth_by_class: Waiting jobs per priority class
+            wait_stats: FairScheduler.stats() output
+            jobs_ahead: Jobs a newly submitted job would wait behind
+        """
+        snapshot = self.snapshot()
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{val}"' for key, val in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+        metric(
+            "sticker_queue_depth",
+            "gauge",
+            "Jobs waiting to be scheduled",
+            [({"priority": name}, depth) for name, depth in depth_by_class.items()],
+        )
+        metric(
+            "sticker_estimated_completion_seconds",
+            "gauge",
+            "Estimated seconds for a job submitted now to complete",
+            [({}, round(self.estimate(jobs_ahead), 3))],
+        )
+        metric(
+            "sticker_stage_inflight",
+            "gauge",
+            "Jobs currently running in each stage",
+            [({"stage": name}, value) for name, value in snapshot["stage_inflight"].items()],
+        )
+        metric(
+            "sticker_stage_seconds_ewma",
+            "gauge",
+            "Moving average of stage service time",
+            [
+                ({"stage": name}, value)
+                for name, value in snapshot["stage_seconds_ewma"].items()
+            ],
+        )
+        metric(
+            "sticker_admission_decisions_total",
+            "counter",
+            "Admission decisions by outcome",
+            [({"decision": name}, value) for name, value in snapshot["decisions"].items()],
+        )
+        metric(
+            "sticker_expired_jobs_total",
+            "counter",
+            "Queued jobs dropped before running because their deadline passed",
+            [({}, snapshot["expired"])],
+        )
+        metric(
+            "sticker_queue_wait_seconds",
+            "gauge",
+            "Recent queue wait by priority class",
+            [
+                ({"priority": name, "quantile": quantile}, stats[key] / 1000)
+                for name, stats in wait_stats.items()
+                if isinstance(stats, dict) and "wait_ms_p95" in stats
+                for quantile, key in (("0.5", "wait_ms_p50"), ("0.95", "wait_ms_p95"))
+            ],
+        )
+
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,277 @@
+"""
+Pipeline Backends
+Stage implementations for the headless runner: real nodes or a CPU stub
+"""
+
+import numpy as np
+import torch
+from PIL import Image, ImageDraw
+
+from ..utils.image_processing import process_alpha_channel
+from ..utils.quality_gate import check_sticker
+from ..utils.upscaling import DEFAULT_UPSCALER, generation_size, upscale_sticker
+from ..utils.weight_loading import load_rembg_session, preload_models
+
+
+class NodeBackend:
+    """
+    Runs each stage through the ComfyUI node classes
+
+    The generator and segmenter are created once and keep their loaded models
+    between batches; rows sharing dimensions and sampler settings are sent to
+    SDXL as one batched call.
+    """
+
+    name = "nodes"
+
+    def __init__(self):
+        from ..nodes.ar_sticker_generator import ARStickerGenerator
+        from ..nodes.usdz_exporter import USDZExporter
+
+        self.generator = ARStickerGenerator()
+        # Reuse the generator's segmenter so SAM2 is only loaded once
+        self.segmenter = self.generator.sam2_segmenter
+        self.exporter = USDZExporter()
+
+    def preload(self):
+        """
+        Load SDXL, SAM2 and the rembg fallback in parallel before any job
+
+        Returns:
+            Dict of model name -> loaded model (None where loading failed)
+        """
+        loaders = {
+            "sdxl": self.generator.sdxl_loader.load_pipeline,
+            "sam2": self.segmenter.sam2_loader.load_model,
+        }
+        try:
+            import rembg  # noqa: F401
+
+            loaders["u2net"] = load_rembg_session
+        except ImportError:
+            pass
+
+        models = preload_models(loaders)
+        self.generator.load_pipeline()
+        self.segmenter.load_model()
+        return models
+
+    def generate(self, rows):
+        """
+        Generate one image per row in a single batched call
+
+        Args:
+            rows: Normalized rows sharing width, height, steps, guidance
+                and fast upscale settings
+
+        Returns:
+            List of (1, H, W, 3) image tensors in row order; smaller than
+            the row size in fast_upscale mode
+        """
+        first = rows[0]
+        width, height = self.generation_size(first)
+        prompts = [
+            self.generator._enhance_sticker_prompt(
+                row["prompt"], row["sticker_style"], row["background_style"]
+            )
+            for row in rows
+        ]
+
+        images = self.generator.generate_images(
+            prompts,
+            [row["negative_prompt"] for row in rows],
+            width,
+            height,
+            first["num_inference_steps"],
+            first["guidance_scale"],
+            [row["seed"] for row in rows],
+        )
+        self.generator.generation_count += len(images)
+
+        return [_pil_to_tensor(image) for image in images]
+
+    def segment(self, image, row):
+        """Remove the background of one generated image"""
+        image_with_alpha, _ = self.segmenter.segment_background(
+            image,
+            row["confidence_threshold"],
+            row["edge_smoothing"],
+            row["padding"],
+        )
+        return image_with_alpha
+
+    def output_size(self, row):
+        """(width, height) the sticker is delivered at"""
+        return self.generator._validate_dimensions(row["width"], row["height"])
+
+    def generation_size(self, row):
+        """(width, height) to denoise at: a lower bucket in fast_upscale mode"""
+        width, height = self.output_size(row)
+        if row.get("fast_upscale"):
+            return generation_size(width, height, row["generate_scale"])
+        return width, height
+
+    def upscale(self, image, row):
+        """
+        Upscale a segmented fast_upscale sticker to its output size
+
+        Returns the image unchanged when it is already that size.
+        """
+        size = self.output_size(row)
+        if (image.shape[2], image.shape[1]) == size:
+            return image
+        image, _, seconds = upscale_sticker(
+            image, None, size, row.get("upscaler") or DEFAULT_UPSCALER
+        )
+        print(f"⚡ Upscaled to {size[0]}x{size[1]} in {seconds:.2f}s")
+        return image
+
+    def check_quality(self, image, row):
+        """
+        Quality gate verdict for a segmented sticker (see check_sticker)
+
+        Returns:
+            The verdict dict, or None when the row turns the gate off
+        """
+        if not row.get("quality_gate", True) or image.shape[-1] != 4:
+            return None
+        return check_sticker(image[..., 3])
+
+    def segment_checked(self, image, row):
+        """
+        Segment, run the quality gate, and upscale stickers that pass, for
+        callers that treat all three as one stage
+
+        Returns:
+            (image, verdict); verdict is None with the gate off, and a
+            rejected image is left at its segmented size
+        """
+        image = self.segment(image, row)
+        verdict = self.check_quality(image, row)
+        if verdict is None or verdict["passed"]:
+            image = self.upscale(image, row)
+        return image, verdict
+
+    def export(self, image, row, output_layout):
+        """
+        Export one sticker through the exporter node
+
+        Returns:
+            (output_path, format_type)
+        """
+        output_path, format_type, _ = self.exporter.export_ar_sticker(
+            image,
+            row["scale"],
+            row["filename"],
+            row["material_type"],
+            row["ar_behavior"],
+            row["optimize_mobile"],
+            auto_trim=row["auto_trim"],
+            trim_margin=row["trim_margin"],
+            png_profile=row["png_profile"],
+            export_format=row["export_format"],
+            output_layout=output_layout,
+            write_sidecars=row["write_sidecars"],
+            prompt=row["prompt"],
+        )
+
+        return output_path, format_type
+
+    def export_payload(self, image, row, write_to_disk=False):
+        """
+        Export one sticker into memory for serving
+
+        Returns:
+            The exporter's export_payload result dictionary
+        """
+        return self.exporter.export_payload(
+            image,
+            scale=row["scale"],
+            material_type=row["material_type"],
+            ar_behavior=row["ar_behavior"],
+            optimize_mobile=row["optimize_mobile"],
+            auto_trim=row["auto_trim"],
+            trim_margin=row["trim_margin"],
+            png_profile=row["png_profile"],
+            export_format=row["export_format"],
+            write_to_disk=write_to_disk,
+            filename=row.get("filename"),
+            prompt=row.get("prompt", ""),
+        )
+
+
+class StubBackend(NodeBackend):
+    """
+    CPU-only backend for local runs without model weights
+
+    Generation draws a deterministic flat-colored shape on white from the
+    row seed and segmentation thresholds against the white background, so
+    runs are reproducible and exercise the real alpha processing and export.
+    """
+
+    name = "stub"
+
+    def __init__(self):
+        from ..nodes.usdz_exporter import USDZExporter
+
+        self.exporter = USDZExporter()
+
+    def preload(self):
+        """Nothing to load; the stub draws its images"""
+        return {}
+
+    def generate(self, rows):
+        return [self._draw_sticker(row) for row in rows]
+
+    def output_size(self, row):
+        return row["width"], row["height"]
+
+    def segment(self, image, row):
+        rgb = (image.squeeze(0).numpy() * 255).astype(np.uint8)
+
+        # Anything visibly darker than the white background is foreground
+        mask = (rgb.min(axis=2) < 245).astype(np.float32)
+
+        if row["edge_smoothing"]:
+            mask = process_alpha_channel(mask, padding=row["padding"])
+
+        rgba = np.dstack([rgb.astype(np.float32) / 255.0, mask])
+        return torch.from_numpy(rgba.astype(np.float32))[None,]
+
+    def _draw_sticker(self, row):
+        rng = np.random.default_rng(row["seed"])
+        width, height = self.generation_size(row)
+
+        canvas = Image.new("RGB", (width, height), (255, 255, 255))
+        draw = ImageDraw.Draw(canvas)
+
+        fill = tuple(int(c) for c in rng.integers(0, 200, size=3))
+        outline = tuple(max(c - 60, 0) for c in fill)
+        margin_x = int(width * rng.uniform(0.1, 0.25))
+        margin_y = int(height * rng.uniform(0.1, 0.25))
+        box = (margin_x, margin_y, width - margin_x, height - margin_y)
+
+        if rng.random() < 0.5:
+            draw.ellipse(box, fill=fill, outline=outline, width=max(width // 64, 2))
+        else:
+            draw.rounded_rectangle(
+                box,
+                radius=min(width, height) // 8,
+                fill=fill,
+                outline=outline,
+                width=max(width // 64, 2),
+            )
+
+        return _pil_to_tensor(canvas)
+
+
+BACKENDS = {
+    NodeBackend.name: NodeBackend,
+    StubBackend.name: StubBackend,
+}
+
+
+def _pil_to_tensor(image):
+    """Convert a PIL image to the (1, H, W, C) float tensor ComfyUI uses"""
+    image_array = np.array(image).astype(np.float32) / 255.0
+    return torch.from_numpy(image_array)[None,]
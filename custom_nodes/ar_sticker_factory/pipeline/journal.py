@@ -0,0 +1,202 @@
+"""
+Job Journal
+Append-only, fsync-batched record of bulk run progress for crash-safe resume
+"""
+
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+
+from ..utils.output_store import ContentStore, LocalDirectoryBackend
+from ..utils.png_encoding import encode_png
+
+# Stages in the order an item passes through them
+STAGES = ("planned", "generated", "segmented", "exported")
+
+
+class JobJournal:
+    """
+    Durable progress log for a bulk run
+
+    Each line is one JSON record {"item", "stage", "t", ...}. Replaying the
+    file gives the furthest stage every item reached, its parameters and
+    the hashes of its intermediate artifacts, so a restarted run only
+    repeats the stages that never finished.
+
+    Appends are flushed immediately and fsynced in batches (every
+    sync_every records or sync_interval seconds, whichever comes first);
+    a crash can lose at most that window, which is simply redone on resume.
+    """
+
+    def __init__(self, path, artifact_root=None, sync_every=16, sync_interval=1.0):
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        # Intermediate images are kept beside the journal by content hash
+        artifact_root = artifact_root or os.path.splitext(path)[0] + "_artifacts"
+        self.artifacts = ContentStore(LocalDirectoryBackend(artifact_root))
+
+        self.items = {}
+        self._replay()
+
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+        if self._file.tell() and not self._ends_with_newline():
+            # Terminate a torn line so the next record starts cleanly
+            self._file.write("\n")
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _replay(self):
+        """Rebuild item state from an existing journal"""
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn final line from a crash mid-append
+                    continue
+                self._apply(record)
+
+        print(f"📒 Journal replayed: {len(self.items)} item(s) from {self.path}")
+
+    def _ends_with_newline(self):
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def _apply(self, record):
+        state = self.items.setdefault(
+            record["item"], {"stage": None, "params": None, "artifacts": {}}
+        )
+        stage = record["stage"]
+
+        if "params" in record:
+            state["params"] = record["params"]
+        if "artifact" in record:
+            state["artifacts"][stage] = record["artifact"]
+        if stage == "failed":
+            state["error"] = record.get("error")
+            return
+
+        state.pop("error", None)
+        if state["stage"] is None or STAGES.index(stage) >= STAGES.index(
+            state["stage"]
+        ):
+            state["stage"] = stage
+
+    def record(self, item, stage, **fields):
+        """
+        Append one progress record
+
+        Args:
+            item: Stable item key (fingerprint of the row parameters)
+            stage: One of STAGES, or "failed"
+            **fields: params, artifact and/or error
+        """
+        record = {"item": item, "stage": stage, "t": round(time.time(), 3)}
+        record.update(fields)
+
+        with self._lock:
+            self._file.write(json.dumps(record, default=str) + "\n")
+            self._file.flush()
+            self._unsynced += 1
+
+            due = time.monotonic() - self._last_sync >= self.sync_interval
+            if self._unsynced >= self.sync_every or due:
+                self._sync_locked()
+
+            self._apply(record)
+
+    def sync(self):
+        """Force pending records to disk"""
+        with self._lock:
+            self._sync_locked()
+
+    def _sync_locked(self):
+        if self._unsynced:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._sync_locked()
+                self._file.close()
+
+    def stage(self, item):
+        """Furthest stage an item reached, or None"""
+        state = self.items.get(item)
+        return state["stage"] if state else None
+
+    def params(self, item):
+        state = self.items.get(item)
+        return state["params"] if state else None
+
+    def artifact(self, item, stage):
+        """Journaled artifact record for an item's stage, or None"""
+        state = self.items.get(item)
+        return state["artifacts"].get(stage) if state else None
+
+    def save_image(self, image):
+        """
+        Persist an intermediate image tensor
+
+        Returns:
+            Artifact record with key and sha256
+        """
+        array = (image.squeeze(0).numpy() * 255).round().clip(0, 255)
+        mode = "RGBA" if array.shape[-1] == 4 else "RGB"
+        png_bytes, _ = encode_png(Image.fromarray(array.astype(np.uint8), mode), "fast")
+
+        stored = self.artifacts.put(png_bytes, ".png")
+        return {"key": stored["key"], "sha256": stored["digest"]}
+
+    def load_image(self, artifact):
+        """
+        Load an intermediate image saved by save_image
+
+        Returns:
+            (1, H, W, C) tensor, or None if the artifact is missing or corrupt
+        """
+        if not artifact or not self.artifacts.exists(artifact["key"]):
+            return None
+
+        data = self.artifacts.get(artifact["key"])
+        if hashlib.sha256(data).hexdigest() != artifact["sha256"]:
+            return None
+
+        image_array = np.array(Image.open(io.BytesIO(data))).astype(np.float32) / 255.0
+        return torch.from_numpy(image_array)[None,]
+
+    def summary(self):
+        """Item counts by furthest stage reached"""
+        counts = {}
+        for state in self.items.values():
+            stage = "failed" if state.get("error") else state["stage"]
+            counts[stage] = counts.get(stage, 0) + 1
+        return counts
+
+
+def file_sha256(path):
+    """SHA-256 of a file on disk, streamed"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,667 @@
+"""
+Sticker Pipeline Runner
+Batch many prompt rows through generate → segment → export without a UI
+"""
+
+import csv
+import json
+import math
+import os
+import random
+import re
+import time
+from collections import Counter, OrderedDict
+
+from ..utils.fingerprint import fingerprint_params
+from ..utils.memory_tracking import track_stage
+from ..utils.quality_gate import QualityRejected, rejection, retry_seed
+from ..utils.upscaling import COMFY_MODEL_PREFIX, available_upscalers, estimate_time_saved
+from .backends import BACKENDS
+from .journal import JobJournal, file_sha256
+
+# Rows must agree on these to share one diffusion batch
+BATCH_KEYS = (
+    "width",
+    "height",
+    "num_inference_steps",
+    "guidance_scale",
+    "fast_upscale",
+    "generate_scale",
+)
+
+# Node inputs that are wired from other nodes rather than set as widgets
+_LINK_TYPES = ("IMAGE", "MASK")
+
+# Filenames end up in output paths and Content-Disposition headers
+_FILENAME_PATTERN = re.compile(r"[A-Za-z0-9][A-Za-z0-9._-]{0,127}")
+
+
+def _widget_defaults(node_class):
+    """
+    Read widget names and defaults from a node's INPUT_TYPES
+
+    Returns:
+        OrderedDict of name -> default, in widget order
+    """
+    defaults = OrderedDict()
+    spec = node_class.INPUT_TYPES()
+
+    for section in ("required", "optional"):
+        for name, entry in spec.get(section, {}).items():
+            kind = entry[0]
+            options = entry[1] if len(entry) > 1 else {}
+
+            if kind in _LINK_TYPES or options.get("forceInput"):
+                continue
+
+            if "default" in options:
+                defaults[name] = options["default"]
+            elif isinstance(kind, list):
+                defaults[name] = kind[0]
+
+    return defaults
+
+
+def _pipeline_nodes():
+    from ..nodes.ar_sticker_generator import ARStickerGenerator
+    from ..nodes.sam2_segmenter import SAM2Segmenter
+    from ..nodes.usdz_exporter import USDZExporter
+
+    return OrderedDict(
+        [
+            ("ARStickerGenerator", ARStickerGenerator),
+            ("SAM2Segmenter", SAM2Segmenter),
+            ("USDZExporter", USDZExporter),
+        ]
+    )
+
+
+def default_params():
+    """
+    Default row parameters, taken from the node widget defaults
+
+    The generator's remove_background widget is dropped because the
+    segment stage always runs.
+    """
+    params = {"prompt": ""}
+    for node_class in _pipeline_nodes().values():
+        params.update(_widget_defaults(node_class))
+
+    params.pop("remove_background", None)
+    params.pop("async_export", None)
+    params.pop("output_layout", None)
+    params["write_sidecars"] = False
+    return params
+
+
+def defaults_from_workflow(workflow_path):
+    """
+    Pull row defaults from a saved ComfyUI workflow
+
+    widgets_values are positional, so they are matched against the widget
+    order of each pipeline node's INPUT_TYPES. Nodes of other types are
+    ignored.
+
+    Args:
+        workflow_path: Path to a workflow JSON with a "nodes" list
+
+    Returns:
+        Dictionary of parameter overrides
+    """
+    with open(workflow_path, "r") as f:
+        workflow = json.load(f)
+
+    overrides = {}
+    nodes = _pipeline_nodes()
+
+    for node in workflow.get("nodes", []):
+        node_class = nodes.get(node.get("type"))
+        values = node.get("widgets_values")
+        if node_class is None or not values:
+            continue
+
+        names = list(_widget_defaults(node_class).keys())
+        overrides.update(zip(names, values))
+
+    overrides.pop("remove_background", None)
+    return overrides
+
+
+def load_rows(path):
+    """
+    Load prompt rows from a CSV, JSONL or plain text file
+
+    CSV files need a header row; plain text files hold one prompt per line.
+    """
+    with open(path, "r", newline="") as f:
+        if path.endswith(".csv"):
+            return [dict(row) for row in csv.DictReader(f)]
+        if path.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        return [{"prompt": line.strip()} for line in f if line.strip()]
+
+
+def _coerce(value, default):
+    """Coerce a CSV string to the type of the parameter's default"""
+    if not isinstance(value, str) or isinstance(default, str):
+        return value
+    if isinstance(default, bool):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    if isinstance(default, int):
+        return int(float(value))
+    if isinstance(default, float):
+        return float(value)
+    return value
+
+
+def param_specs():
+    """
+    Widget types and options of every row parameter
+
+    Returns:
+        OrderedDict of name -> (kind, options) from the pipeline nodes'
+        INPUT_TYPES; kind is a type name or a list of choices
+    """
+    specs = OrderedDict()
+    for node_class in _pipeline_nodes().values():
+        spec = node_class.INPUT_TYPES()
+        for section in ("required", "optional"):
+            for name, entry in spec.get(section, {}).items():
+                if entry[0] in _LINK_TYPES:
+                    continue
+                specs.setdefault(name, (entry[0], entry[1] if len(entry) > 1 else {}))
+    return specs
+
+
+def validate_row(row, specs):
+    """
+    Check a normalized row against the node widget types and ranges
+
+    Args:
+        row: Row from normalize_row
+        specs: param_specs() result
+
+    Raises:
+        ValueError: Naming every invalid parameter
+    """
+    problems = []
+    for name, (kind, options) in specs.items():
+        if name in row:
+            problem = _check_param(kind, options, row[name])
+            if problem:
+                problems.append(f"{name} {problem}")
+
+    filename = row.get("filename")
+    if isinstance(filename, str) and not _FILENAME_PATTERN.fullmatch(filename):
+        problems.append(
+            "filename must be 1-128 letters, digits, '.', '_' or '-', "
+            "starting with a letter or digit"
+        )
+
+    upscaler = row.get("upscaler")
+    if (
+        isinstance(upscaler, str)
+        and upscaler not in available_upscalers()
+        and not upscaler.startswith(COMFY_MODEL_PREFIX)
+    ):
+        problems.append(
+            f"upscaler must be one of {', '.join(available_upscalers())} "
+            f"or '{COMFY_MODEL_PREFIX}<model file>'"
+        )
+
+    if problems:
+        raise ValueError("; ".join(problems))
+
+
+def _check_param(kind, options, value):
+    """Describe what is wrong with one parameter value, or return None"""
+    if isinstance(kind, list):
+        if value not in kind:
+            return f"must be one of {', '.join(map(str, kind))}"
+        return None
+    if kind == "BOOLEAN":
+        return None if isinstance(value, bool) else "must be a boolean"
+    if kind == "STRING":
+        return None if isinstance(value, str) else "must be a string"
+    if kind in ("INT", "FLOAT"):
+        number_types = (int,) if kind == "INT" else (int, float)
+        if isinstance(value, bool) or not isinstance(value, number_types):
+            return "must be an integer" if kind == "INT" else "must be a number"
+        if not math.isfinite(value):
+            return "must be finite"
+        if "min" in options and value < options["min"]:
+            return f"must be at least {options['min']}"
+        if "max" in options and value > options["max"]:
+            return f"must be at most {options['max']}"
+    return None
+
+
+def _row_filename(base, key):
+    """Default filename made unique with the row key"""
+    suffix = f"_{key[:12]}"
+    return base[: 128 - len(suffix)] + suffix
+
+
+def normalize_row(row, defaults):
+    """
+    Fill a row from defaults, coercing string values to the default's type
+
+    Empty values fall back to the default (except an empty prompt).
+    """
+    normalized = dict(defaults)
+    for key, value in row.items():
+        if value in (None, "") and key != "prompt":
+            continue
+        try:
+            normalized[key] = _coerce(value, defaults.get(key))
+        except ValueError:
+            raise ValueError(f"{key} could not be read from {value!r}") from None
+
+    return normalized
+
+
+class StickerPipeline:
+    """
+    Headless runner for many stickers
+
+    Rows are filled from the node defaults (optionally overridden by a
+    workflow), identical rows are produced once, and rows with matching
+    dimensions and sampler settings are generated in batches.
+
+    Pass a journal (path or JobJournal) to make long runs resumable.
+    """
+
+    def __init__(
+        self,
+        backend="nodes",
+        batch_size=4,
+        output_layout="content_addressed",
+        defaults=None,
+        journal=None,
+    ):
+        self.backend = BACKENDS[backend]() if isinstance(backend, str) else backend
+        self.batch_size = max(1, int(batch_size))
+        self.output_layout = output_layout
+        self.defaults = default_params()
+        self.defaults.update(defaults or {})
+        self.param_specs = param_specs()
+        self.journal = JobJournal(journal) if isinstance(journal, str) else journal
+
+    def normalize(self, row):
+        """
+        Fill a row from the defaults and resolve its types
+
+        A seed of -1 is kept here and only resolved once per unique row,
+        so duplicate rows still collapse to one sticker.
+        """
+        return normalize_row(row, self.defaults)
+
+    def check_rows(self, rows):
+        """
+        Normalize and validate every row before any work is scheduled
+
+        A row without its own filename gets one derived from its key, so
+        rows sharing the default filename don't overwrite each other in
+        the flat layout.
+
+        Returns:
+            List of (key, normalized row) in input order
+
+        Raises:
+            ValueError: Naming every invalid row, or flat-layout rows with
+                different parameters sharing a filename
+        """
+        checked = []
+        problems = []
+        owners = {}
+        for number, row in enumerate(rows, 1):
+            try:
+                normalized = self.normalize(row)
+                validate_row(normalized, self.param_specs)
+            except ValueError as e:
+                problems.append(f"row {number}: {str(e)}")
+                continue
+
+            key = fingerprint_params(**normalized)
+            if row.get("filename") in (None, ""):
+                normalized["filename"] = _row_filename(normalized["filename"], key)
+
+            owner = owners.setdefault(normalized["filename"], (number, key))
+            if self.output_layout == "flat" and owner[1] != key:
+                problems.append(
+                    f"row {number}: filename {normalized['filename']!r} is already "
+                    f"used by row {owner[0]} with different parameters"
+                )
+            checked.append((key, normalized))
+
+        if problems:
+            raise ValueError("Invalid rows:\n  " + "\n  ".join(problems))
+        return checked
+
+    def run(self, rows):
+        """
+        Produce a sticker for every row
+
+        With a journal, items already exported are skipped and items that
+        stopped after generation or segmentation resume from their saved
+        intermediate image.
+
+        Args:
+            rows: Iterable of row dictionaries (see load_rows)
+
+        Returns:
+            (results, report) where results align with the input rows and
+            report holds per-stage timings and throughput
+
+        Raises:
+            ValueError: A row is invalid (see check_rows); nothing was run
+        """
+        run_start = time.time()
+        timings = {"generate": 0.0, "segment": 0.0, "upscale": 0.0, "export": 0.0}
+        self._peaks = {}
+
+        # Deduplicate identical rows before any work is scheduled
+        unique = OrderedDict()
+        row_keys = []
+        for key, normalized in self.check_rows(rows):
+            if key not in unique:
+                journaled = self.journal.params(key) if self.journal else None
+                if journaled:
+                    # Keep the seed the interrupted run resolved
+                    normalized = journaled
+                else:
+                    if normalized["seed"] == -1:
+                        normalized["seed"] = random.randint(0, 2**32 - 1)
+                    if self.journal:
+                        self.journal.record(key, "planned", params=normalized)
+                unique[key] = normalized
+            row_keys.append(key)
+
+        outcomes = {}
+        resumed = 0
+        to_generate = []
+        for key, normalized in unique.items():
+            outcome = self._resume(key, normalized, timings)
+            if outcome is None:
+                to_generate.append(key)
+            else:
+                outcomes[key] = outcome
+                resumed += 1
+
+        # Group compatible rows, keeping input order within each batch
+        groups = OrderedDict()
+        for key in to_generate:
+            group_key = tuple(unique[key].get(name) for name in BATCH_KEYS)
+            groups.setdefault(group_key, []).append(key)
+
+        batches = []
+        for keys in groups.values():
+            for start in range(0, len(keys), self.batch_size):
+                batches.append(keys[start : start + self.batch_size])
+
+        for batch_index, keys in enumerate(batches):
+            batch_rows = [unique[key] for key in keys]
+            print(
+                f"🎨 Batch {batch_index + 1}/{len(batches)}: {len(keys)} sticker(s)"
+            )
+
+            try:
+                with track_stage("generate") as generate_usage:
+                    images = self.backend.generate(batch_rows)
+                self._account(timings, generate_usage)
+            except Exception as e:
+                print(f"❌ Error generating batch {batch_index + 1}: {str(e)}")
+                for key in keys:
+                    outcomes[key] = self._fail(key, e)
+                continue
+
+            for key, row, image in zip(keys, batch_rows, images):
+                if self.journal:
+                    self.journal.record(
+                        key, "generated", artifact=self.journal.save_image(image)
+                    )
+                outcomes[key] = self._finish(
+                    key,
+                    row,
+                    image,
+                    timings,
+                    generate_s=generate_usage["elapsed_s"] / len(keys),
+                )
+                outcomes[key].setdefault("memory", {})["generate"] = generate_usage
+
+        if self.journal:
+            self.journal.sync()
+
+        elapsed = time.time() - run_start
+        results = []
+        for key in row_keys:
+            result = dict(outcomes[key])
+            # A sticker regenerated by the quality gate reports its new seed
+            result.setdefault("seed", unique[key]["seed"])
+            result["prompt"] = unique[key]["prompt"]
+            results.append(result)
+
+        completed = sum(1 for key in unique if outcomes[key]["status"] == "ok")
+        rejected = sum(1 for key in unique if outcomes[key]["status"] == "rejected")
+        reasons = Counter(
+            reason
+            for key in unique
+            for entry in outcomes[key].get("rejections", ())
+            for reason in entry["reasons"]
+        )
+        report = {
+            "backend": self.backend.name,
+            "rows": len(row_keys),
+            "unique": len(unique),
+            "deduplicated": len(row_keys) - len(unique),
+            "resumed": resumed,
+            "batches": len(batches),
+            "completed": completed,
+            "failed": len(unique) - completed - rejected,
+            "rejected": rejected,
+            "rejection_reasons": dict(reasons),
+            "elapsed_s": round(elapsed, 3),
+            "stickers_per_s": round(completed / elapsed, 3) if elapsed else 0.0,
+            "stage_s": {name: round(value, 3) for name, value in timings.items()},
+            "stage_peak_mb": self._peaks,
+        }
+        saved = [
+            outcomes[key]["fast_upscale"]["estimated_saved_s"]
+            for key in unique
+            if (outcomes[key].get("fast_upscale") or {}).get("estimated_saved_s")
+            is not None
+        ]
+        if saved:
+            report["upscale_saved_s"] = round(sum(saved), 3)
+
+        print(
+            f"✅ {completed}/{len(unique)} stickers in {elapsed:.2f}s "
+            f"({report['stickers_per_s']:.2f}/s, {report['deduplicated']} duplicate rows, "
+            f"{resumed} resumed, {rejected} rejected)"
+        )
+        if saved:
+            print(
+                f"⚡ Fast upscale saved ~{report['upscale_saved_s']:.2f}s of generation "
+                f"across {len(saved)} sticker(s)"
+            )
+        return results, report
+
+    def _resume(self, key, row, timings):
+        """
+        Pick an item up from the journal
+
+        Returns:
+            The item's outcome if the journal let it skip generation,
+            otherwise None (the item still needs generating)
+        """
+        if self.journal is None:
+            return None
+
+        stage = self.journal.stage(key)
+
+        if stage == "exported":
+            exported = self.journal.artifact(key, "exported")
+            path = exported["path"]
+            if os.path.exists(path) and file_sha256(path) == exported["sha256"]:
+                return {
+                    "status": "ok",
+                    "path": path,
+                    "format": exported["format"],
+                    "resumed": True,
+                }
+
+        if stage in ("segmented", "exported"):
+            image = self.journal.load_image(self.journal.artifact(key, "segmented"))
+            if image is not None:
+                return self._finish(key, row, image, timings, segmented=True)
+
+        if stage in ("generated", "segmented", "exported"):
+            image = self.journal.load_image(self.journal.artifact(key, "generated"))
+            if image is not None:
+                return self._finish(key, row, image, timings)
+
+        return None
+
+    def _finish(self, key, row, image, timings, segmented=False, generate_s=None):
+        """
+        Segment (unless already done), upscale in fast_upscale mode, and
+        export one image
+
+        generate_s is this image's share of its batch's generate time, used
+        to estimate what fast_upscale saved.
+        """
+        memory = {}
+        upscaled = None
+        rejections = []
+        try:
+            if not segmented:
+                image, row, rejections = self._segment_checked(
+                    key, row, image, timings, memory
+                )
+
+                if row.get("fast_upscale"):
+                    low_size = (image.shape[2], image.shape[1])
+                    with track_stage("upscale") as memory["upscale"]:
+                        image = self.backend.upscale(image, row)
+                    self._account(timings, memory["upscale"])
+                    upscaled = self._upscale_summary(
+                        low_size, image, memory["upscale"]["elapsed_s"], generate_s
+                    )
+
+                if self.journal:
+                    self.journal.record(
+                        key, "segmented", artifact=self.journal.save_image(image)
+                    )
+
+            with track_stage("export") as memory["export"]:
+                output_path, format_type = self.backend.export(
+                    image, row, self.output_layout
+                )
+            self._account(timings, memory["export"])
+
+            if self.journal:
+                self.journal.record(
+                    key,
+                    "exported",
+                    artifact={
+                        "path": output_path,
+                        "format": format_type,
+                        "sha256": file_sha256(output_path),
+                    },
+                )
+
+            outcome = {
+                "status": "ok",
+                "path": output_path,
+                "format": format_type,
+                "memory": memory,
+            }
+            if upscaled is not None:
+                outcome["fast_upscale"] = upscaled
+            if rejections:
+                outcome["seed"] = row["seed"]
+                outcome["rejections"] = rejections
+            return outcome
+
+        except QualityRejected as e:
+            print(f"🚫 Rejected sticker '{row['prompt'][:40]}': {str(e)}")
+            outcome = self._fail(key, e)
+            outcome.update(status="rejected", rejections=e.rejections)
+            return outcome
+
+        except Exception as e:
+            print(f"❌ Error finishing sticker '{row['prompt'][:40]}': {str(e)}")
+            return self._fail(key, e)
+
+    def _segment_checked(self, key, row, image, timings, memory):
+        """
+        Segment an image and run the quality gate on it
+
+        A rejected sticker is regenerated with a new seed, up to the row's
+        quality_retries, before any upscale or export work is spent on it.
+
+        Returns:
+            (segmented image, row with the seed used, rejected attempts)
+
+        Raises:
+            QualityRejected: Every attempt was rejected
+        """
+        rejections = []
+        while True:
+            with track_stage("segment") as memory["segment"]:
+                segmented = self.backend.segment(image, row)
+            self._account(timings, memory["segment"])
+
+            verdict = self.backend.check_quality(segmented, row)
+            if verdict is None or verdict["passed"]:
+                return segmented, row, rejections
+
+            rejections.append(rejection(row["seed"], verdict))
+            if len(rejections) > row.get("quality_retries", 0):
+                raise QualityRejected(rejections)
+
+            seed = retry_seed(rejections[0]["seed"], len(rejections))
+            print(
+                f"🚫 Quality gate rejected seed {row['seed']} "
+                f"({', '.join(verdict['reasons'])}); retrying with seed {seed}"
+            )
+            row = dict(row, seed=seed)
+            with track_stage("generate") as usage:
+                image = self.backend.generate([row])[0]
+            self._account(timings, usage)
+
+            if self.journal:
+                self.journal.record(
+                    key,
+                    "generated",
+                    params=row,
+                    artifact=self.journal.save_image(image),
+                )
+
+    def _upscale_summary(self, low_size, image, upscale_s, generate_s):
+        """Sizes, upscale time and estimated time saved for one sticker"""
+        size = (image.shape[2], image.shape[1])
+        summary = {
+            "generated": list(low_size),
+            "size": list(size),
+            "upscale_s": upscale_s,
+            "estimated_saved_s": None,
+        }
+        if generate_s is not None and low_size != size:
+            _, saved = estimate_time_saved(generate_s, upscale_s, low_size, size)
+            summary["estimated_saved_s"] = round(saved, 3)
+        return summary
+
+    def _account(self, timings, usage):
+        """Add a stage's time and keep its largest memory peaks"""
+        stage = usage["stage"]
+        timings[stage] += usage["elapsed_s"]
+        peaks = self._peaks.setdefault(stage, {})
+        for field in ("rss_peak_mb", "rss_peak_delta_mb", "py_peak_mb", "cuda_peak_mb"):
+            if usage.get(field) is not None:
+                peaks[field] = max(peaks.get(field, 0.0), usage[field])
+
+    def _fail(self, key, error):
+        if self.journal:
+            self.journal.record(key, "failed", error=str(error))
+        return {"status": "error", "error": str(error)}
@@ -0,0 +1,258 @@
+"""
+Fair Scheduler
+Priority classes, weighted fair queuing by tenant and per-tenant caps
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+
+# Served strictly in this order; within a class tenants share fairly
+PRIORITY_CLASSES = ("interactive", "batch", "backfill")
+DEFAULT_PRIORITY = "batch"
+DEFAULT_TENANT = "default"
+
+# Recent waits kept per class for percentile reporting
+_WAIT_WINDOW = 2048
+
+
+class QueueFull(Exception):
+    """Raised when the scheduler holds max_size waiting items"""
+
+
+class FairScheduler:
+    """
+    Job queue that replaces FIFO ordering
+
+    - Classes are strict: an interactive item is always dequeued before any
+      batch item, and batch before backfill.
+    - Within a class, tenants are served by weighted fair queuing: each item
+      gets a virtual finish time of max(class clock, tenant's last finish)
+      + cost / weight, and the smallest eligible finish time goes next. A
+      tenant submitting 2,000 items advances its own clock, not everyone's.
+    - A tenant at its concurrency cap is skipped until one of its running
+      items is marked done with task_done.
+    """
+
+    def __init__(
+        self,
+        max_size=1024,
+        tenant_weights=None,
+        tenant_limits=None,
+        default_tenant_limit=4,
+    ):
+        self.max_size = max_size
+        self.tenant_weights = dict(tenant_weights or {})
+        self.tenant_limits = dict(tenant_limits or {})
+        self.default_tenant_limit = default_tenant_limit
+
+        # class -> tenant -> deque of waiting entries
+        self._waiting = {name: {} for name in PRIORITY_CLASSES}
+        self._clock = {name: 0.0 for name in PRIORITY_CLASSES}
+        self._last_finish = {name: {} for name in PRIORITY_CLASSES}
+        self._size = 0
+
+        self._running = {}
+        self._running_items = {}
+        self._waits = {name: deque(maxlen=_WAIT_WINDOW) for name in PRIORITY_CLASSES}
+        self._dequeued = {name: 0 for name in PRIORITY_CLASSES}
+        self._changed = asyncio.Event()
+
+    def put_nowait(self, item, tenant=DEFAULT_TENANT, priority=DEFAULT_PRIORITY, cost=1.0):
+        """
+        Queue an item
+
+        Args:
+            item: Anything; returned unchanged by get()
+            tenant: Fair-share key, e.g. customer or API key
+            priority: One of PRIORITY_CLASSES
+            cost: Relative work, e.g. the number of stickers it produces
+
+        Raises:
+            ValueError: Unknown priority class
+            QueueFull: max_size items are already waiting
+        """
+        if priority not in self._waiting:
+            raise ValueError(
+                f"priority must be one of {', '.join(PRIORITY_CLASSES)}, got {priority!r}"
+            )
+        if self._size >= self.max_size:
+            raise QueueFull(f"{self._size} items waiting")
+
+        weight = self.tenant_weights.get(tenant, 1.0)
+        start = max(self._clock[priority], self._last_finish[priority].get(tenant, 0.0))
+        finish = start + cost / weight
+        self._last_finish[priority][tenant] = finish
+
+        entry = (finish, item, tenant, time.monotonic())
+        self._waiting[priority].setdefault(tenant, deque()).append(entry)
+        self._size += 1
+        self._notify()
+
+    async def get(self):
+        """Wait for and return the next item to run"""
+        while True:
+            item = self.get_nowait()
+            if item is not None:
+                return item
+            changed = self._changed
+            await changed.wait()
+
+    def get_nowait(self):
+        """Return the next eligible item, or None"""
+        for priority in PRIORITY_CLASSES:
+            tenants = self._waiting[priority]
+
+            best = None
+            for tenant, entries in tenants.items():
+                if self._running.get(tenant, 0) >= self._limit(tenant):
+                    continue
+                if best is None or entries[0][0] < tenants[best][0][0]:
+                    best = tenant
+
+            if best is None:
+                continue
+
+            finish, item, tenant, enqueued = tenants[best].popleft()
+            if not tenants[best]:
+                del tenants[best]
+            self._size -= 1
+
+            self._clock[priority] = finish
+            self._running[tenant] = self._running.get(tenant, 0) + 1
+            self._running_items[id(item)] = tenant
+            self._waits[priority].append(time.monotonic() - enqueued)
+            self._dequeued[priority] += 1
+            return item
+
+        return None
+
+    def task_done(self, item):
+        """Release the tenant slot held by an item returned from get()"""
+        tenant = self._running_items.pop(id(item), None)
+        if tenant is None:
+            return
+        self._running[tenant] -= 1
+        if not self._running[tenant]:
+            del self._running[tenant]
+        self._notify()
+
+    def _limit(self, tenant):
+        return self.tenant_limits.get(tenant, self.default_tenant_limit)
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def qsize(self):
+        return self._size
+
+    def depth_by_class(self):
+        """Waiting items per priority class"""
+        return {
+            priority: sum(len(entries) for entries in tenants.values())
+            for priority, tenants in self._waiting.items()
+        }
+
+    def stats(self):
+        """
+        Queue wait time per priority class
+
+        Returns:
+            Dict of class -> waiting, dequeued and wait percentiles (ms)
+            over the most recent dequeues
+        """
+        depth = self.depth_by_class()
+        stats = {}
+        for priority in PRIORITY_CLASSES:
+            waits = sorted(self._waits[priority])
+            stats[priority] = {
+                "waiting": depth[priority],
+                "dequeued": self._dequeued[priority],
+                "wait_ms_mean": _ms(sum(waits) / len(waits)) if waits else 0.0,
+                "wait_ms_p50": _ms(_percentile(waits, 0.50)),
+                "wait_ms_p95": _ms(_percentile(waits, 0.95)),
+                "wait_ms_max": _ms(waits[-1]) if waits else 0.0,
+            }
+        stats["running_by_tenant"] = dict(self._running)
+        return stats
+
+
+class StageGate:
+    """
+    Concurrency limit for one stage that admits waiters by priority class
+
+    A plain semaphore wakes waiters first-come-first-served, which would let
+    queued batch items hold up an interactive item that has already been
+    scheduled. Waiters here are ordered by class, then arrival.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._active = 0
+        self._waiters = []
+        self._sequence = itertools.count()
+
+    def slot(self, priority=DEFAULT_PRIORITY):
+        """Async context manager holding one slot for the block"""
+        return _GateSlot(self, PRIORITY_CLASSES.index(priority))
+
+    async def _acquire(self, rank):
+        if self._active < self.limit and not self._waiters:
+            self._active += 1
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        entry = [rank, next(self._sequence), waiter]
+        heapq.heappush(self._waiters, entry)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Slot was handed over just as we were cancelled
+                self._release()
+            elif entry in self._waiters:
+                # _release may already have discarded the cancelled waiter
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            raise
+
+    def _release(self):
+        while self._waiters:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                # Hand the slot straight to the next waiter
+                waiter.set_result(None)
+                return
+        self._active -= 1
+
+    def waiting(self):
+        return len(self._waiters)
+
+    def active(self):
+        return self._active
+
+
+class _GateSlot:
+    def __init__(self, gate, rank):
+        self.gate = gate
+        self.rank = rank
+
+    async def __aenter__(self):
+        await self.gate._acquire(self.rank)
+
+    async def __aexit__(self, *exc_info):
+        self.gate._release()
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1)
@@ -0,0 +1,760 @@
+"""
+Sticker Service
+Asyncio HTTP API: prompt in, sticker out, without the ComfyUI graph
+"""
+
+import asyncio
+import contextvars
+import functools
+import json
+import random
+import re
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from http import HTTPStatus
+from urllib.parse import quote, urlsplit
+
+from .admission import AdmissionController, Overloaded
+from .backends import BACKENDS
+from .runner import default_params, normalize_row, param_specs, validate_row
+from ..utils.memory_tracking import run_tracked
+from ..utils.profiling import profile_request
+from ..utils.quality_gate import QualityRejected, rejection, retry_seed
+from ..utils.weight_loading import get_load_report
+from .scheduler import (
+    DEFAULT_PRIORITY,
+    DEFAULT_TENANT,
+    PRIORITY_CLASSES,
+    FairScheduler,
+    QueueFull,
+    StageGate,
+)
+
+# Stages every job runs through, in order
+STAGES = ("generate", "segment", "export")
+
+# Concurrent jobs allowed inside each stage; model stages share one
+# loaded model so they default to one at a time
+DEFAULT_STAGE_LIMITS = {"generate": 1, "segment": 1, "export": 4}
+
+# Largest accepted request body
+MAX_BODY_BYTES = 64 * 1024
+
+
+class Job:
+    """
+    One sticker request and its progress events
+
+    Events are appended as stages start and finish; stream readers wait on
+    the current change event and are woken by the next append.
+    """
+
+    def __init__(
+        self,
+        params,
+        tenant=DEFAULT_TENANT,
+        priority=DEFAULT_PRIORITY,
+        deadline=None,
+        profile=False,
+    ):
+        self.id = uuid.uuid4().hex
+        self.params = params
+        self.tenant = tenant
+        self.priority = priority
+        self.deadline = deadline
+        self.profile = profile
+        self.profile_paths = None
+        self.rejections = []
+        self.status = "queued"
+        self.events = []
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.changed = asyncio.Event()
+
+    def emit(self, **event):
+        event["t"] = round(time.time(), 3)
+        self.events.append(event)
+
+        # Wake current readers and give later readers a fresh event
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    def finish(self, status, **event):
+        """Mark the job finished, then emit its final event"""
+        self.status = status
+        self.finished = time.time()
+        self.emit(stage=status, status=status, **event)
+
+    def snapshot(self):
+        """JSON-serializable view of the job"""
+        snapshot = {
+            "id": self.id,
+            "status": self.status,
+            "tenant": self.tenant,
+            "priority": self.priority,
+            "prompt": self.params["prompt"],
+            "seed": self.params["seed"],
+            "events": self.events,
+            "created": round(self.created, 3),
+        }
+        if self.finished is not None:
+            snapshot["elapsed_s"] = round(self.finished - self.created, 3)
+        if self.error:
+            snapshot["error"] = self.error
+        if self.result:
+            snapshot["result"] = _result_summary(self)
+        if self.profile_paths:
+            snapshot["profile"] = self.profile_paths
+        if self.rejections:
+            snapshot["rejections"] = self.rejections
+        return snapshot
+
+
+class StickerService:
+    """
+    HTTP front end and job queue around a pipeline backend
+
+    Endpoints:
+        POST /jobs               submit a row (JSON), returns 202 with the job id
+        GET  /jobs/{id}          job status and stage events
+        GET  /jobs/{id}/stream   NDJSON stage events as they happen
+        GET  /jobs/{id}/result   the sticker file once the job is done
+        GET  /health             queue depth, stage limits and wait times
+        GET  /ready              200 once models are loaded, 503 before
+        GET  /metrics            Prometheus metrics for autoscaling
+
+    A fixed set of worker tasks pulls jobs from a FairScheduler: rows may
+    carry a "tenant" and a "priority" (interactive, batch or backfill).
+    Each stage runs in a thread pool behind a priority-ordered StageGate,
+    so a slow export never holds the GPU, interactive jobs overtake queued
+    batch work at every stage, and models stay loaded between jobs.
+
+    Rows may also carry "deadline_s". The AdmissionController defers or
+    rejects a job up front (503) when its deadline can't be met, and a
+    queued job whose deadline has passed is dropped before it reaches the
+    GPU. max_depth sheds load by queue depth regardless of deadlines.
+
+    With a WorkerPool, whole jobs run in device-pinned worker processes
+    instead of the in-process stages; their stage events are forwarded to
+    the job and feed the admission estimates the same way.
+
+    With warm_standby the backend's models are preloaded in the background
+    as soon as the service starts; /ready stays 503 until they are loaded
+    (or, with a pool, until every worker is ready).
+
+    A row with "profile": true, or a profile_rate share of jobs, is run
+    under utils.profiling; the job snapshot lists the trace files.
+    """
+
+    def __init__(
+        self,
+        backend="nodes",
+        stage_limits=None,
+        workers=4,
+        max_queue=256,
+        max_jobs=1024,
+        persist=False,
+        tenant_weights=None,
+        tenant_limits=None,
+        default_tenant_limit=4,
+        max_depth=None,
+        stage_estimates=None,
+        pool=None,
+        warm_standby=False,
+        profile_rate=0.0,
+    ):
+        self.pool = pool
+        self.warm_standby = warm_standby
+        self.warm = not warm_standby or pool is not None
+        self.profile_rate = profile_rate
+        if pool is not None:
+            # Every worker process runs all stages; models live there
+            self.backend = None
+            stage_limits = {stage: pool.size for stage in STAGES}
+            workers = pool.capacity()
+        else:
+            self.backend = BACKENDS[backend]() if isinstance(backend, str) else backend
+        self.defaults = default_params()
+        self.param_specs = param_specs()
+        self.stage_limits = dict(DEFAULT_STAGE_LIMITS, **(stage_limits or {}))
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_jobs = max_jobs
+        self.persist = persist
+        self.scheduler_options = dict(
+            tenant_weights=tenant_weights,
+            tenant_limits=tenant_limits,
+            default_tenant_limit=default_tenant_limit,
+        )
+
+        self.admission = AdmissionController(
+            self.stage_limits, stage_estimates, max_depth=max_depth
+        )
+
+        self.jobs = OrderedDict()
+        self.running = 0
+        self.scheduler = None
+        self._gates = None
+        self._worker_tasks = []
+        self._server = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=sum(self.stage_limits.values()),
+            thread_name_prefix="sticker-stage",
+        )
+
+    async def start(self, host="127.0.0.1", port=8189):
+        """Start the workers and listen for HTTP requests"""
+        self.scheduler = FairScheduler(max_size=self.max_queue, **self.scheduler_options)
+        self._gates = {
+            stage: StageGate(limit) for stage, limit in self.stage_limits.items()
+        }
+        self._worker_tasks = [
+            asyncio.create_task(self._worker()) for _ in range(self.workers)
+        ]
+        if not self.warm:
+            self._worker_tasks.append(asyncio.create_task(self._preload()))
+        self._server = await asyncio.start_server(self._handle, host, port)
+
+        address = self._server.sockets[0].getsockname()
+        print(f"🚀 Sticker service listening on http://{address[0]}:{address[1]}")
+        if self.pool is not None:
+            print(f"⚙️  Backend: {self.pool.backend_name} in {self.pool.size} worker process(es)")
+        else:
+            print(f"⚙️  Backend: {self.backend.name}, stage limits: {self.stage_limits}")
+        return self._server
+
+    async def _preload(self):
+        loop = asyncio.get_running_loop()
+        try:
+            models = await loop.run_in_executor(self._executor, self.backend.preload)
+        except Exception as e:
+            print(f"❌ Error in warm standby: {str(e)}")
+            get_load_report().add_failure("warm_standby", str(e))
+            return
+        failed = sorted(name for name, model in models.items() if model is None)
+        if failed:
+            # /ready stays 503; /health carries the load report
+            print(f"❌ Warm standby failed for {', '.join(failed)}; not marking ready")
+            return
+        self.warm = True
+        print("✅ Warm standby complete")
+
+    def ready(self):
+        """True once models are loaded and jobs will run without a cold start"""
+        if self.pool is not None:
+            return self.pool.ready()
+        return self.warm
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._executor.shutdown(wait=False)
+        if self.pool is not None:
+            self.pool.shutdown()
+
+    def submit(self, row):
+        """
+        Queue a job for a row
+
+        Raises:
+            ValueError: Unknown priority class, bad deadline, or parameters
+                outside the node widget types and ranges
+            Overloaded: Admission control deferred or rejected the job
+            QueueFull: The scheduler is at max_queue
+        """
+        row = dict(row)
+        tenant = str(row.pop("tenant", None) or DEFAULT_TENANT)
+        priority = row.pop("priority", None) or DEFAULT_PRIORITY
+        deadline_s = row.pop("deadline_s", None)
+        profile = row.pop("profile", None)
+        profile = _truthy(profile) or (
+            self.profile_rate > 0 and random.random() < self.profile_rate
+        )
+        deadline_s = float(deadline_s) if deadline_s not in (None, "") else None
+
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"priority must be one of {', '.join(PRIORITY_CLASSES)}")
+
+        # Bad parameters fail here with a 400, not later in a worker
+        params = normalize_row(row, self.defaults)
+        validate_row(params, self.param_specs)
+
+        decision = self.admission.decide(
+            self._jobs_ahead(priority), self.scheduler.qsize(), deadline_s
+        )
+        if decision["action"] != "admit":
+            raise Overloaded(decision)
+
+        if params["seed"] == -1:
+            params["seed"] = random.randint(0, 2**32 - 1)
+
+        deadline = time.time() + deadline_s if deadline_s is not None else None
+        job = Job(
+            params, tenant=tenant, priority=priority, deadline=deadline, profile=profile
+        )
+        self.scheduler.put_nowait(job, tenant=tenant, priority=priority)
+        self._remember(job)
+        job.emit(
+            stage="queued",
+            status="queued",
+            waiting=self.scheduler.depth_by_class()[priority],
+            eta_s=decision["eta_s"],
+        )
+        return job
+
+    def _jobs_ahead(self, priority):
+        """Running jobs plus those waiting in this class or a higher one"""
+        depth = self.scheduler.depth_by_class()
+        rank = PRIORITY_CLASSES.index(priority)
+        return self.running + sum(depth[name] for name in PRIORITY_CLASSES[: rank + 1])
+
+    def _remember(self, job):
+        self.jobs[job.id] = job
+
+        # Forget the oldest finished jobs beyond max_jobs
+        while len(self.jobs) > self.max_jobs:
+            oldest = next(
+                (key for key, old in self.jobs.items() if old.finished is not None),
+                None,
+            )
+            if oldest is None:
+                break
+            del self.jobs[oldest]
+
+    async def _worker(self):
+        while True:
+            job = await self.scheduler.get()
+            self.running += 1
+            try:
+                await self._run_job(job)
+            finally:
+                self.running -= 1
+                self.scheduler.task_done(job)
+
+    async def _run_job(self, job):
+        if job.deadline is not None and (
+            time.time() + self.admission.service_time() > job.deadline
+        ):
+            # Don't spend GPU time on a result nobody is waiting for
+            self.admission.record_expired()
+            job.error = "Deadline passed while queued"
+            job.finish("expired", error=job.error)
+            return
+
+        job.status = "running"
+
+        if self.pool is not None:
+            await self._run_pooled(job)
+        elif job.profile:
+            with profile_request(job.id, job.params) as session:
+                await self._run_stages(job)
+            job.profile_paths = session.paths
+        else:
+            await self._run_stages(job)
+
+    async def _run_stages(self, job):
+        row = job.params
+        try:
+            while True:
+                images = await self._stage(job, "generate", self.backend.generate, [row])
+                # The quality gate, and upscaling for fast_upscale stickers,
+                # run within the segment stage
+                image, verdict = await self._stage(
+                    job, "segment", self.backend.segment_checked, images[0], row
+                )
+                if verdict is None or verdict["passed"]:
+                    break
+                row = self._reject_attempt(job, row, verdict)
+
+            job.result = await self._stage(
+                job,
+                "export",
+                self.backend.export_payload,
+                image,
+                row,
+                write_to_disk=self.persist,
+            )
+            job.finish("done", result=f"/jobs/{job.id}/result", **_result_summary(job))
+
+        except QualityRejected as e:
+            print(f"🚫 Sticker job {job.id} rejected: {str(e)}")
+            job.error = str(e)
+            job.finish("rejected", error=str(e))
+
+        except Exception as e:
+            print(f"❌ Error in sticker job {job.id}: {str(e)}")
+            job.error = str(e)
+            job.finish("failed", error=str(e))
+
+    def _reject_attempt(self, job, row, verdict):
+        """
+        Record an attempt the quality gate rejected
+
+        Returns:
+            The row to retry with, carrying a new seed
+
+        Raises:
+            QualityRejected: The row's quality_retries are used up
+        """
+        job.rejections.append(rejection(row["seed"], verdict))
+        job.emit(stage="quality", status="rejected", **job.rejections[-1])
+        if len(job.rejections) > row.get("quality_retries", 0):
+            raise QualityRejected(job.rejections)
+
+        seed = retry_seed(job.rejections[0]["seed"], len(job.rejections))
+        job.params = dict(row, seed=seed)
+        return job.params
+
+    async def _run_pooled(self, job):
+        """Run the whole job in a worker process, relaying its stage events"""
+        loop = asyncio.get_running_loop()
+
+        def forward(event):
+            loop.call_soon_threadsafe(self._pool_event, job, event)
+
+        try:
+            future = self.pool.submit(
+                job.params,
+                on_event=forward,
+                write_to_disk=self.persist,
+                profile_id=job.id if job.profile else None,
+            )
+            result = await asyncio.wrap_future(future)
+            job.profile_paths = result.get("profile")
+            # Quality gate retries happen in the worker; adopt the seed used
+            job.rejections = result.get("rejections", [])
+            job.params = dict(job.params, seed=result["seed"])
+            if result.get("status") == "rejected":
+                print(f"🚫 Sticker job {job.id} rejected: {result['error']}")
+                job.error = result["error"]
+                job.finish("rejected", error=result["error"])
+                return
+
+            job.result = result
+            job.finish("done", result=f"/jobs/{job.id}/result", **_result_summary(job))
+
+        except Exception as e:
+            print(f"❌ Error in sticker job {job.id}: {str(e)}")
+            job.error = str(e)
+            job.finish("failed", error=str(e))
+
+    def _pool_event(self, job, event):
+        if job.finished is not None:
+            return
+        if event["status"] == "done":
+            self.admission.observe(event["stage"], event["elapsed_ms"] / 1000)
+        job.emit(**event)
+
+    async def _stage(self, job, stage, fn, *args, **kwargs):
+        """Run one blocking stage in the pool under its concurrency limit"""
+        wait_start = time.perf_counter()
+        async with self._gates[stage].slot(job.priority):
+            stage_start = time.perf_counter()
+            job.emit(
+                stage=stage,
+                status="started",
+                wait_ms=round((stage_start - wait_start) * 1000, 1),
+            )
+
+            loop = asyncio.get_running_loop()
+            # Carry the job's profile session into the stage thread
+            context = contextvars.copy_context()
+            with self.admission.track(stage):
+                value, usage = await loop.run_in_executor(
+                    self._executor,
+                    functools.partial(context.run, run_tracked, stage, fn, *args, **kwargs),
+                )
+
+            job.emit(
+                stage=stage,
+                status="done",
+                elapsed_ms=round((time.perf_counter() - stage_start) * 1000, 1),
+                memory=usage,
+            )
+            return value
+
+    async def _handle(self, reader, writer):
+        """Serve one HTTP/1.1 request per connection"""
+        try:
+            request_line = await reader.readline()
+            if not request_line:
+                return
+
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            length = int(headers.get("content-length") or 0)
+            if length > MAX_BODY_BYTES:
+                await self._respond(writer, 413, {"error": "Request body too large"})
+                return
+            body = await reader.readexactly(length) if length else b""
+
+            await self._route(method.upper(), urlsplit(target).path, body, writer)
+
+        except (ValueError, asyncio.IncompleteReadError):
+            with suppress(ConnectionError):
+                await self._respond(writer, 400, {"error": "Malformed request"})
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            with suppress(ConnectionError):
+                await writer.wait_closed()
+
+    async def _route(self, method, path, body, writer):
+        parts = [part for part in path.split("/") if part]
+
+        if parts == ["health"] and method == "GET":
+            await self._respond(writer, 200, self.health())
+            return
+
+        if parts == ["ready"] and method == "GET":
+            ready = self.ready()
+            await self._respond(writer, 200 if ready else 503, {"ready": ready})
+            return
+
+        if parts == ["metrics"] and method == "GET":
+            await self._respond(
+                writer,
+                200,
+                self.metrics().encode("utf-8"),
+                content_type="text/plain; version=0.0.4",
+            )
+            return
+
+        if parts == ["jobs"]:
+            if method != "POST":
+                await self._respond(writer, 405, {"error": "Use POST to submit"})
+                return
+            await self._create_job(body, writer)
+            return
+
+        if len(parts) in (2, 3) and parts[0] == "jobs":
+            job = self.jobs.get(parts[1])
+            if job is None:
+                await self._respond(writer, 404, {"error": "Unknown job"})
+            elif method != "GET":
+                await self._respond(writer, 405, {"error": "Use GET"})
+            elif len(parts) == 2:
+                await self._respond(writer, 200, job.snapshot())
+            elif parts[2] == "stream":
+                await self._stream(job, writer)
+            elif parts[2] == "result":
+                await self._send_result(job, writer)
+            else:
+                await self._respond(writer, 404, {"error": "Not found"})
+            return
+
+        await self._respond(writer, 404, {"error": "Not found"})
+
+    async def _create_job(self, body, writer):
+        try:
+            row = json.loads(body or b"{}")
+            if isinstance(row, str):
+                row = {"prompt": row}
+            if not isinstance(row, dict) or not row.get("prompt"):
+                raise ValueError("a prompt is required")
+        except ValueError as e:
+            await self._respond(writer, 400, {"error": f"Invalid job: {str(e)}"})
+            return
+
+        try:
+            job = self.submit(row)
+        except ValueError as e:
+            await self._respond(writer, 400, {"error": f"Invalid job: {str(e)}"})
+            return
+        except Overloaded as e:
+            retry_after = e.decision["retry_after_s"]
+            await self._respond(
+                writer,
+                503,
+                {"error": str(e), "admission": e.decision},
+                headers={"Retry-After": str(retry_after)} if retry_after else None,
+            )
+            return
+        except QueueFull:
+            await self._respond(
+                writer, 503, {"error": "Queue full"}, headers={"Retry-After": "5"}
+            )
+            return
+
+        await self._respond(
+            writer,
+            202,
+            {
+                "id": job.id,
+                "status": job.status,
+                "seed": job.params["seed"],
+                "links": {
+                    "status": f"/jobs/{job.id}",
+                    "stream": f"/jobs/{job.id}/stream",
+                    "result": f"/jobs/{job.id}/result",
+                },
+            },
+            headers={"Location": f"/jobs/{job.id}"},
+        )
+
+    async def _stream(self, job, writer):
+        """Send stage events as chunked NDJSON until the job finishes"""
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: application/x-ndjson\r\n"
+            b"Transfer-Encoding: chunked\r\n"
+            b"Cache-Control: no-cache\r\n"
+            b"Connection: close\r\n\r\n"
+        )
+
+        sent = 0
+        while True:
+            changed = job.changed
+            while sent < len(job.events):
+                line = json.dumps(job.events[sent]).encode("utf-8") + b"\n"
+                writer.write(b"%x\r\n%s\r\n" % (len(line), line))
+                sent += 1
+            await writer.drain()
+
+            if job.finished is not None and sent == len(job.events):
+                break
+            await changed.wait()
+
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def _send_result(self, job, writer):
+        if job.status == "failed":
+            await self._respond(writer, 500, {"status": job.status, "error": job.error})
+            return
+        if job.status == "expired":
+            await self._respond(writer, 410, {"status": job.status, "error": job.error})
+            return
+        if job.status == "rejected":
+            await self._respond(
+                writer,
+                422,
+                {"status": job.status, "error": job.error, "rejections": job.rejections},
+            )
+            return
+        if job.status != "done":
+            await self._respond(writer, 202, {"status": job.status})
+            return
+
+        result = job.result
+        await self._respond(
+            writer,
+            200,
+            result["payload"],
+            content_type=result["content_type"],
+            headers={
+                "Content-Disposition": _content_disposition(
+                    f'{job.params["filename"]}.{result["format"]}'
+                ),
+                "X-Sticker-Format": result["format"],
+            },
+        )
+
+    async def _respond(self, writer, status, body, content_type=None, headers=None):
+        if isinstance(body, (bytes, bytearray, memoryview)):
+            content_type = content_type or "application/octet-stream"
+        else:
+            body = json.dumps(body).encode("utf-8")
+            content_type = content_type or "application/json"
+
+        status = HTTPStatus(status)
+        lines = [
+            f"HTTP/1.1 {status.value} {status.phrase}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(body)}",
+            "Connection: close",
+        ]
+        lines.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        writer.write(body)
+        await writer.drain()
+
+    def health(self):
+        """Queue depth, job counts, stage limits and per-class wait times"""
+        counts = {}
+        for job in self.jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+
+        health = {
+            "status": "ok",
+            "backend": self.pool.backend_name if self.pool else self.backend.name,
+            "queue_depth": self.scheduler.qsize() if self.scheduler else 0,
+            "jobs": counts,
+            "stage_limits": self.stage_limits,
+            "scheduler": self.scheduler.stats() if self.scheduler else {},
+            "admission": self.admission.snapshot(),
+            "ready": self.ready(),
+            "cold_start": get_load_report().summary(),
+        }
+        if self.pool is not None:
+            health["pool"] = self.pool.stats()
+        return health
+
+    def metrics(self):
+        """Prometheus text for queue depth, ETA, stage times and admissions"""
+        return self.admission.prometheus_metrics(
+            self.scheduler.depth_by_class(),
+            self.scheduler.stats(),
+            self._jobs_ahead(DEFAULT_PRIORITY),
+        )
+
+
+def _content_disposition(filename):
+    """
+    Attachment header value for a filename (RFC 6266)
+
+    The quoted filename keeps only safe ASCII characters and filename*
+    carries the full name percent-encoded, so no input can break out of
+    the header.
+    """
+    fallback = re.sub(r"[^A-Za-z0-9._-]", "_", filename)
+    encoded = quote(filename, safe="")
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{encoded}"
+
+
+def _truthy(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes")
+    return bool(value)
+
+
+def _result_summary(job):
+    result = job.result
+    return {
+        "format": result["format"],
+        "content_type": result["content_type"],
+        "bytes": result["bytes"],
+        "width": result["width"],
+        "height": result["height"],
+        "path": result["path"],
+    }
+
+
+async def serve(host="127.0.0.1", port=8189, **service_options):
+    """Run a StickerService until cancelled"""
+    service = StickerService(**service_options)
+    server = await service.start(host, port)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
@@ -0,0 +1,247 @@
+"""
+Shared Frames
+Shared-memory ring of uint8 frame slots for passing images between processes
+"""
+
+import multiprocessing
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+import numpy as np
+import torch
+from PIL import Image
+
+# Largest frame a slot holds by default: 2048² RGBA
+DEFAULT_MAX_SIDE = 2048
+DEFAULT_CHANNELS = 4
+
+# What gets sent between processes instead of pixels: a few ints
+FrameHandle = namedtuple(
+    "FrameHandle", ["slot", "generation", "kind", "height", "width", "channels"]
+)
+
+
+class StaleFrame(Exception):
+    """Raised when a handle's slot has been released and reused"""
+
+
+class FrameRing:
+    """
+    Fixed pool of frame slots in one shared-memory block
+
+    A 2048² IMAGE pickled between processes is a 48 MB float32 tensor (64 MB
+    with alpha); a slot holds the same frame as 16 MB of uint8 and only the
+    FrameHandle crosses the process boundary. Readers get a numpy view of
+    the slot without copying, or the IMAGE / MASK tensor the nodes expect.
+
+    Slots are reference counted. put_* returns a handle holding one
+    reference; retain adds one per extra consumer and release drops one.
+    The slot is reused once the count reaches zero, and the per-slot
+    generation makes a handle to a reused slot raise StaleFrame instead of
+    silently reading another frame.
+
+    Create the ring in the parent and pass it to worker processes as a
+    Process argument; it attaches to the same block on the other side.
+    The creator calls unlink() once every process is done with it.
+    """
+
+    def __init__(
+        self,
+        slots=8,
+        max_height=DEFAULT_MAX_SIDE,
+        max_width=DEFAULT_MAX_SIDE,
+        max_channels=DEFAULT_CHANNELS,
+        context=None,
+    ):
+        context = context or multiprocessing.get_context()
+        self.slots = slots
+        self.max_height = max_height
+        self.max_width = max_width
+        self.max_channels = max_channels
+        self.slot_bytes = max_height * max_width * max_channels
+
+        self._memory = shared_memory.SharedMemory(create=True, size=slots * self.slot_bytes)
+        # refcount per slot, then generation per slot, under one lock
+        self._state = context.Array("q", slots * 2)
+        self._freed = context.Condition(self._state.get_lock())
+        self._owner = True
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_memory"] = self._memory.name
+        state["_owner"] = False
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._memory = shared_memory.SharedMemory(name=state["_memory"])
+
+    def put(self, pixels, kind="raw", timeout=None):
+        """
+        Copy a (H, W, C) or (H, W) uint8 array into a free slot
+
+        Args:
+            pixels: uint8 array no larger than the slot
+            kind: Label stored in the handle ("image", "mask" or "raw")
+            timeout: Seconds to wait for a free slot; None waits forever
+
+        Returns:
+            FrameHandle holding one reference
+
+        Raises:
+            ValueError: The frame doesn't fit a slot
+            TimeoutError: No slot was released in time
+        """
+        pixels = np.asarray(pixels)
+        if pixels.dtype != np.uint8:
+            raise ValueError(f"Frames must be uint8, got {pixels.dtype}")
+        height, width = pixels.shape[:2]
+        channels = pixels.shape[2] if pixels.ndim == 3 else 1
+        if pixels.ndim not in (2, 3) or height * width * channels > self.slot_bytes:
+            raise ValueError(
+                f"Frame {tuple(pixels.shape)} doesn't fit a "
+                f"{self.max_height}x{self.max_width}x{self.max_channels} slot"
+            )
+
+        slot, generation = self._acquire(timeout)
+        handle = FrameHandle(slot, generation, kind, height, width, channels)
+        self._slot_array(handle)[...] = pixels.reshape(self._shape(handle))
+        return handle
+
+    def put_image(self, image, timeout=None):
+        """
+        Store an IMAGE tensor (1, H, W, C) float 0-1, or a PIL image
+
+        Returns:
+            FrameHandle of kind "image"
+        """
+        if isinstance(image, Image.Image):
+            pixels = np.asarray(image)
+        else:
+            pixels = _to_uint8(image.squeeze(0) if image.ndim == 4 else image)
+        return self.put(pixels, kind="image", timeout=timeout)
+
+    def put_mask(self, mask, timeout=None):
+        """
+        Store a MASK tensor (1, H, W) or (H, W) float 0-1
+
+        Returns:
+            FrameHandle of kind "mask"
+        """
+        if mask.ndim == 3:
+            mask = mask.squeeze(0)
+        return self.put(_to_uint8(mask), kind="mask", timeout=timeout)
+
+    def view(self, handle):
+        """
+        Zero-copy uint8 view of a frame
+
+        The view is only valid while the caller holds a reference.
+
+        Raises:
+            StaleFrame: The slot was released and reused
+        """
+        self._check(handle)
+        return self._slot_array(handle)
+
+    def get_image(self, handle):
+        """Copy a frame out as an IMAGE tensor (1, H, W, C) float32"""
+        pixels = self.view(handle)
+        if pixels.ndim == 2:
+            pixels = pixels[..., None]
+        return torch.from_numpy(pixels.astype(np.float32) / 255.0)[None,]
+
+    def get_mask(self, handle):
+        """Copy a frame out as a MASK tensor (1, H, W) float32"""
+        pixels = self.view(handle)
+        if pixels.ndim == 3:
+            pixels = pixels[..., -1]
+        return torch.from_numpy(pixels.astype(np.float32) / 255.0)[None,]
+
+    def get_pil(self, handle):
+        """Copy a frame out as a PIL image"""
+        return Image.fromarray(np.array(self.view(handle)))
+
+    def retain(self, handle, count=1):
+        """Add references, e.g. one per extra stage that will read the frame"""
+        with self._freed:
+            self._check_locked(handle)
+            self._state[handle.slot] += count
+
+    def release(self, handle):
+        """Drop one reference; the slot is reused when none are left"""
+        with self._freed:
+            self._check_locked(handle)
+            self._state[handle.slot] -= 1
+            if self._state[handle.slot] == 0:
+                self._freed.notify()
+
+    def in_use(self):
+        """Slots currently holding a frame"""
+        with self._freed:
+            return sum(1 for slot in range(self.slots) if self._state[slot] > 0)
+
+    def close(self):
+        """Detach this process from the shared block"""
+        self._memory.close()
+
+    def unlink(self):
+        """Free the shared block; call once, from the creating process"""
+        self._memory.close()
+        if self._owner:
+            self._memory.unlink()
+
+    def _acquire(self, timeout):
+        with self._freed:
+            slot = self._free_slot()
+            if slot is None:
+                self._freed.wait_for(
+                    lambda: self._free_slot() is not None, timeout=timeout
+                )
+                slot = self._free_slot()
+                if slot is None:
+                    raise TimeoutError(f"All {self.slots} frame slots are in use")
+
+            self._state[slot] = 1
+            self._state[self.slots + slot] += 1
+            return slot, self._state[self.slots + slot]
+
+    def _free_slot(self):
+        for slot in range(self.slots):
+            if self._state[slot] == 0:
+                return slot
+        return None
+
+    def _check(self, handle):
+        with self._freed:
+            self._check_locked(handle)
+
+    def _check_locked(self, handle):
+        if (
+            self._state[handle.slot] <= 0
+            or self._state[self.slots + handle.slot] != handle.generation
+        ):
+            raise StaleFrame(f"Frame slot {handle.slot} was released")
+
+    def _shape(self, handle):
+        if handle.channels == 1 and handle.kind != "image":
+            return (handle.height, handle.width)
+        return (handle.height, handle.width, handle.channels)
+
+    def _slot_array(self, handle):
+        shape = self._shape(handle)
+        return np.ndarray(
+            shape,
+            dtype=np.uint8,
+            buffer=self._memory.buf,
+            offset=handle.slot * self.slot_bytes,
+        )
+
+
+def _to_uint8(values):
+    """Float 0-1 tensor or array to uint8, rounded so round trips are exact"""
+    if isinstance(values, torch.Tensor):
+        values = values.detach().cpu().numpy()
+    if values.dtype == np.uint8:
+        return values
+    return (np.clip(values, 0.0, 1.0) * 255.0 + 0.5).astype(np.uint8)
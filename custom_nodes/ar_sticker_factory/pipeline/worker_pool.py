@@ -0,0 +1,600 @@
+"""
+Worker Pool
+One device-pinned process per GPU (or N CPU processes), with routing and restarts
+"""
+
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import suppress
+
+from .shared_frames import DEFAULT_MAX_SIDE, FrameRing
+
+# Model every row needs unless it names another
+DEFAULT_MODEL_KEY = "sdxl"
+
+# How long a worker waits for a free frame slot before exporting itself
+FRAME_WAIT_S = 1.0
+
+
+def detect_devices():
+    """
+    GPU indices available to this process
+
+    Honors CUDA_VISIBLE_DEVICES when set, otherwise asks torch.
+
+    Returns:
+        List of device ids as strings; empty when there is no GPU
+    """
+    visible = os.environ.get("CUDA_VISIBLE_DEVICES")
+    if visible is not None:
+        return [device.strip() for device in visible.split(",") if device.strip()]
+
+    try:
+        import torch
+
+        return [str(index) for index in range(torch.cuda.device_count())]
+    except Exception:
+        return []
+
+
+def _worker_main(
+    worker_id, device, backend_name, cpu_threads, preload, ring, requests, responses
+):
+    """
+    Worker process entry point
+
+    Pins the process to one GPU before CUDA is initialized, so the nodes'
+    "cuda" device and every model they load land on that GPU. CPU workers
+    hide all GPUs and split the CPU threads between them. With preload the
+    worker loads its models before reporting ready. With a frame ring the
+    segmented sticker is handed to the parent by slot handle for export.
+    """
+    os.environ["CUDA_VISIBLE_DEVICES"] = "" if device == "cpu" else device
+
+    import torch
+
+    from ..utils.memory_tracking import run_tracked
+    from ..utils.profiling import profile_request
+    from ..utils.quality_gate import QualityRejected, rejection, retry_seed
+    from ..utils.tiling import to_uint8
+    from .backends import BACKENDS
+
+    if device == "cpu" and cpu_threads:
+        torch.set_num_threads(cpu_threads)
+
+    backend = BACKENDS[backend_name]()
+    resident = set()
+    if preload:
+        models = backend.preload()
+        resident.update(name for name, model in models.items() if model is not None)
+    responses.put(("ready", worker_id, os.getpid(), sorted(resident)))
+
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+
+        job_id, row, model_key, write_to_disk, profile_id = request
+
+        def emit(stage, status, **fields):
+            responses.put(("event", worker_id, job_id, dict(stage=stage, status=status, **fields)))
+
+        rejections = []
+        handle = None
+        try:
+            with profile_request(profile_id, row, enabled=profile_id is not None) as session:
+                while True:
+                    stage_start = time.perf_counter()
+                    emit("generate", "started", device=device)
+                    images, usage = run_tracked("generate", backend.generate, [row])
+                    resident.add(model_key)
+                    emit("generate", "done", elapsed_ms=_elapsed_ms(stage_start), memory=usage)
+
+                    stage_start = time.perf_counter()
+                    emit("segment", "started")
+                    (image, verdict), usage = run_tracked(
+                        "segment", backend.segment_checked, images[0], row
+                    )
+                    emit("segment", "done", elapsed_ms=_elapsed_ms(stage_start), memory=usage)
+                    if verdict is None or verdict["passed"]:
+                        break
+
+                    # Rejected before export; retry with a new seed
+                    rejections.append(rejection(row["seed"], verdict))
+                    emit("quality", "rejected", **rejections[-1])
+                    if len(rejections) > row.get("quality_retries", 0):
+                        raise QualityRejected(rejections)
+                    row = dict(row, seed=retry_seed(rejections[0]["seed"], len(rejections)))
+
+                # Profiled jobs export here so the profile covers every stage
+                if ring is not None and session is None:
+                    # The exporter's own uint8 conversion, so the parent's
+                    # export is byte-identical to exporting here
+                    handle = _put_frame(ring, to_uint8(image))
+
+                if handle is None:
+                    stage_start = time.perf_counter()
+                    emit("export", "started")
+                    result, usage = run_tracked(
+                        "export", backend.export_payload, image, row, write_to_disk=write_to_disk
+                    )
+                    result["payload"] = bytes(result["payload"])
+                    emit("export", "done", elapsed_ms=_elapsed_ms(stage_start), memory=usage)
+
+            if handle is not None:
+                frame = {"handle": handle, "row": row, "rejections": rejections}
+                responses.put(("frame", worker_id, job_id, frame, sorted(resident)))
+                continue
+
+            if session is not None:
+                result["profile"] = session.paths
+            result.update(seed=row["seed"], rejections=rejections)
+            responses.put(("ok", worker_id, job_id, result, sorted(resident)))
+
+        except QualityRejected as e:
+            # The worker did its job; the sticker just didn't pass
+            result = {
+                "status": "rejected",
+                "error": str(e),
+                "seed": row["seed"],
+                "rejections": e.rejections,
+            }
+            responses.put(("ok", worker_id, job_id, result, sorted(resident)))
+
+        except Exception as e:
+            print(f"❌ Error in worker {worker_id} ({device}): {str(e)}")
+            responses.put(("error", worker_id, job_id, str(e), sorted(resident)))
+
+
+def _emit(job, event):
+    if job["on_event"] is None:
+        return
+    try:
+        job["on_event"](event)
+    except Exception as e:
+        print(f"⚠️ Worker pool event callback failed: {str(e)}")
+
+
+def _put_frame(ring, pixels):
+    """Copy a frame into the ring, or None when it doesn't fit or no slot frees up"""
+    try:
+        return ring.put(pixels, kind="image", timeout=FRAME_WAIT_S)
+    except (ValueError, TimeoutError):
+        return None
+
+
+def _elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+class _Worker:
+    """Parent-side record of one worker process"""
+
+    def __init__(self, worker_id, device):
+        self.id = worker_id
+        self.device = device
+        self.process = None
+        self.requests = None
+        self.pid = None
+        self.ready = False
+        self.inflight = {}
+        self.resident = set()
+        self.completed = 0
+        self.failed = 0
+        self.restarts = 0
+
+
+class WorkerPool:
+    """
+    Run whole sticker jobs across device-pinned worker processes
+
+    One worker is started per visible GPU, or cpu_workers CPU workers when
+    there is none. Each keeps its own models loaded. A job is routed to a
+    ready worker that already has its model resident and, among those, the
+    one with the fewest jobs in flight; jobs wait in the parent when every
+    worker is at max_inflight. A worker that dies is restarted and its
+    in-flight jobs are retried elsewhere up to max_retries times. With
+    preload, workers load their models before taking jobs.
+
+    With frame_handoff, workers only generate and segment. The segmented
+    sticker goes back through a shared-memory FrameRing as a slot handle,
+    and the parent exports it on export_workers threads, so the CPU-bound
+    encode no longer holds a device worker. A frame larger than
+    frame_max_side, or one that finds the ring full for FRAME_WAIT_S, is
+    exported in the worker as before, and so are profiled jobs.
+
+    Processes are spawned (CUDA can't be used after fork); pass
+    start_method="fork" only for CPU-only runs.
+    """
+
+    def __init__(
+        self,
+        backend="nodes",
+        devices=None,
+        cpu_workers=2,
+        max_inflight=2,
+        max_retries=1,
+        start_method="spawn",
+        poll_interval=0.5,
+        preload=False,
+        frame_handoff=False,
+        export_workers=2,
+        frame_max_side=DEFAULT_MAX_SIDE,
+    ):
+        self.backend_name = backend
+        self.preload = preload
+        self.max_inflight = max_inflight
+        self.max_retries = max_retries
+        self.poll_interval = poll_interval
+
+        devices = detect_devices() if devices is None else list(devices)
+        if not devices:
+            devices = ["cpu"] * max(1, cpu_workers)
+        cpu_count = sum(1 for device in devices if device == "cpu")
+        self._cpu_threads = max(1, (os.cpu_count() or 1) // cpu_count) if cpu_count else 0
+
+        self._context = multiprocessing.get_context(start_method)
+        self._responses = self._context.Queue()
+        self._workers = [_Worker(index, device) for index, device in enumerate(devices)]
+        self.size = len(self._workers)
+        self._pending = deque()
+        self._jobs = {}
+        self._job_ids = itertools.count()
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self._ring = None
+        self._exporter = None
+        self._export_backend = None
+        self._export_lock = threading.Lock()
+        if frame_handoff:
+            # One slot per job that can be in flight, plus one per export thread
+            self._ring = FrameRing(
+                slots=self.capacity() + export_workers,
+                max_height=frame_max_side,
+                max_width=frame_max_side,
+                context=self._context,
+            )
+            self._exporter = ThreadPoolExecutor(
+                max_workers=export_workers, thread_name_prefix="pool-export"
+            )
+
+        for worker in self._workers:
+            self._start_worker(worker)
+
+        self._collector = threading.Thread(
+            target=self._collect, name="worker-pool-collector", daemon=True
+        )
+        self._monitor = threading.Thread(
+            target=self._watch, name="worker-pool-monitor", daemon=True
+        )
+        self._collector.start()
+        self._monitor.start()
+
+        print(f"🧵 Worker pool: {len(self._workers)} worker(s) on {', '.join(devices)}")
+
+    def _start_worker(self, worker):
+        worker.requests = self._context.Queue()
+        worker.ready = False
+        worker.resident = set()
+        worker.process = self._context.Process(
+            target=_worker_main,
+            args=(
+                worker.id,
+                worker.device,
+                self.backend_name,
+                self._cpu_threads,
+                self.preload,
+                self._ring,
+                worker.requests,
+                self._responses,
+            ),
+            name=f"sticker-worker-{worker.id}",
+            daemon=True,
+        )
+        worker.process.start()
+        worker.pid = worker.process.pid
+
+    def capacity(self):
+        """Jobs the pool runs concurrently"""
+        return self.size * self.max_inflight
+
+    def ready(self):
+        """True once every worker has started (and preloaded, if asked)"""
+        with self._lock:
+            return all(worker.ready for worker in self._workers)
+
+    def submit(
+        self,
+        row,
+        model_key=DEFAULT_MODEL_KEY,
+        on_event=None,
+        write_to_disk=False,
+        profile_id=None,
+    ):
+        """
+        Queue one normalized row
+
+        Args:
+            row: Normalized row (see pipeline.runner.normalize_row)
+            model_key: Model the job needs, used for residency routing
+            on_event: Optional callback receiving stage event dictionaries;
+                called from the pool's collector thread
+            write_to_disk: Also store the export in the content-addressed store
+            profile_id: Profile the job in the worker under this request id
+
+        Returns:
+            concurrent.futures.Future resolving to the export_payload result
+            (payload as bytes) plus the worker and device that ran it
+        """
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Worker pool is shut down")
+            job_id = next(self._job_ids)
+            self._jobs[job_id] = {
+                "row": row,
+                "model_key": model_key,
+                "future": future,
+                "on_event": on_event,
+                "write_to_disk": write_to_disk,
+                "profile_id": profile_id,
+                "attempts": 0,
+            }
+            self._pending.append(job_id)
+            self._dispatch_locked()
+        return future
+
+    def _route_locked(self, model_key):
+        """Best ready worker with a free slot, or None"""
+        candidates = [
+            worker
+            for worker in self._workers
+            if worker.ready and len(worker.inflight) < self.max_inflight
+        ]
+        if not candidates:
+            return None
+        return min(
+            candidates,
+            key=lambda worker: (model_key not in worker.resident, len(worker.inflight)),
+        )
+
+    def _dispatch_locked(self):
+        while self._pending:
+            job_id = self._pending[0]
+            job = self._jobs.get(job_id)
+            if job is None:
+                self._pending.popleft()
+                continue
+
+            worker = self._route_locked(job["model_key"])
+            if worker is None:
+                return
+
+            self._pending.popleft()
+            job["attempts"] += 1
+            worker.inflight[job_id] = job
+            worker.requests.put(
+                (job_id, job["row"], job["model_key"], job["write_to_disk"], job["profile_id"])
+            )
+
+    def _collect(self):
+        """
+        Apply worker responses: readiness, stage events and results
+
+        After shutdown, keeps draining until no job is in flight; shutdown
+        fails whatever is left once its timeout passes.
+        """
+        while True:
+            try:
+                message = self._responses.get(timeout=self.poll_interval)
+            except queue.Empty:
+                if self._closed and not self._inflight_count():
+                    return
+                continue
+            except (EOFError, OSError):
+                return
+
+            kind, worker_id = message[0], message[1]
+            worker = self._workers[worker_id]
+
+            if kind == "ready":
+                with self._lock:
+                    worker.pid = message[2]
+                    worker.resident = set(message[3])
+                    worker.ready = True
+                    self._dispatch_locked()
+                print(f"✅ Worker {worker_id} ready on {worker.device} (pid {worker.pid})")
+                continue
+
+            job_id = message[2]
+            if kind == "event":
+                job = worker.inflight.get(job_id)
+                if job:
+                    _emit(job, dict(message[3], worker=worker_id))
+                continue
+
+            with self._lock:
+                # None for a late reply from a worker that was since
+                # restarted; the job has been retried elsewhere
+                job = worker.inflight.pop(job_id, None)
+                worker.resident = set(message[4])
+                if job is not None:
+                    self._jobs.pop(job_id, None)
+                    if kind in ("ok", "frame"):
+                        worker.completed += 1
+                    else:
+                        worker.failed += 1
+                self._dispatch_locked()
+
+            if job is None or job["future"].done():
+                if kind == "frame":
+                    self._ring.release(message[3]["handle"])
+                continue
+            if kind == "frame":
+                self._exporter.submit(self._export_frame, job, worker, message[3])
+            elif kind == "ok":
+                result = message[3]
+                result.update(worker=worker_id, device=worker.device)
+                job["future"].set_result(result)
+            else:
+                job["future"].set_exception(RuntimeError(message[3]))
+
+    def _export_frame(self, job, worker, frame):
+        """Export a segmented frame a worker handed over by slot handle"""
+        from ..utils.memory_tracking import run_tracked
+
+        row = frame["row"]
+        try:
+            stage_start = time.perf_counter()
+            _emit(job, {"stage": "export", "status": "started", "worker": worker.id})
+            try:
+                image = self._ring.get_image(frame["handle"])
+            finally:
+                self._ring.release(frame["handle"])
+
+            result, usage = run_tracked(
+                "export",
+                self._get_export_backend().export_payload,
+                image,
+                row,
+                write_to_disk=job["write_to_disk"],
+            )
+            result["payload"] = bytes(result["payload"])
+            _emit(
+                job,
+                {
+                    "stage": "export",
+                    "status": "done",
+                    "worker": worker.id,
+                    "elapsed_ms": _elapsed_ms(stage_start),
+                    "memory": usage,
+                },
+            )
+        except Exception as e:
+            print(f"❌ Error exporting frame from worker {worker.id}: {str(e)}")
+            job["future"].set_exception(RuntimeError(str(e)))
+            return
+
+        result.update(
+            seed=row["seed"],
+            rejections=frame["rejections"],
+            worker=worker.id,
+            device=worker.device,
+        )
+        job["future"].set_result(result)
+
+    def _get_export_backend(self):
+        with self._export_lock:
+            if self._export_backend is None:
+                from .backends import BACKENDS
+
+                self._export_backend = BACKENDS[self.backend_name]()
+            return self._export_backend
+
+    def _watch(self):
+        """Restart workers that exited and retry their in-flight jobs"""
+        while not self._closed:
+            time.sleep(self.poll_interval)
+            for worker in self._workers:
+                if self._closed or worker.process.is_alive():
+                    continue
+
+                exit_code = worker.process.exitcode
+                failed = []
+                with self._lock:
+                    for job_id, job in worker.inflight.items():
+                        if job["attempts"] <= self.max_retries:
+                            self._pending.appendleft(job_id)
+                        else:
+                            self._jobs.pop(job_id, None)
+                            failed.append(job)
+                    worker.inflight = {}
+                    worker.restarts += 1
+                    self._start_worker(worker)
+                    # Other workers may be idle; don't wait for this one
+                    self._dispatch_locked()
+
+                print(
+                    f"⚠️ Worker {worker.id} on {worker.device} exited "
+                    f"(code {exit_code}); restarted"
+                )
+                for job in failed:
+                    if not job["future"].done():
+                        job["future"].set_exception(
+                            RuntimeError(f"Worker crashed (exit code {exit_code})")
+                        )
+
+    def stats(self):
+        """Per-worker device, liveness, load, residency and counters"""
+        with self._lock:
+            return {
+                "workers": [
+                    {
+                        "id": worker.id,
+                        "device": worker.device,
+                        "pid": worker.pid,
+                        "alive": worker.process.is_alive(),
+                        "ready": worker.ready,
+                        "inflight": len(worker.inflight),
+                        "resident": sorted(worker.resident),
+                        "completed": worker.completed,
+                        "failed": worker.failed,
+                        "restarts": worker.restarts,
+                    }
+                    for worker in self._workers
+                ],
+                "pending": len(self._pending),
+                "frames_in_use": self._ring.in_use() if self._ring is not None else None,
+            }
+
+    def _inflight_count(self):
+        with self._lock:
+            return sum(len(worker.inflight) for worker in self._workers)
+
+    def shutdown(self, timeout=10.0):
+        """
+        Stop every worker
+
+        Jobs still waiting are cancelled. Jobs already running finish if
+        their workers get through them within timeout; any still in flight
+        after that fail with RuntimeError.
+        """
+        with self._lock:
+            self._closed = True
+            for job_id in self._pending:
+                self._jobs.pop(job_id)["future"].cancel()
+            self._pending.clear()
+
+        deadline = time.monotonic() + timeout
+        for worker in self._workers:
+            with suppress(ValueError, OSError):
+                worker.requests.put(None)
+        for worker in self._workers:
+            worker.process.join(max(deadline - time.monotonic(), 0))
+            if worker.process.is_alive():
+                worker.process.terminate()
+        # Results the workers sent before exiting are still being applied
+        self._collector.join(max(deadline - time.monotonic(), self.poll_interval * 2))
+
+        with self._lock:
+            leftovers = [job for worker in self._workers for job in worker.inflight.values()]
+            for worker in self._workers:
+                worker.inflight = {}
+            self._jobs.clear()
+        for job in leftovers:
+            if not job["future"].done():
+                job["future"].set_exception(
+                    RuntimeError("Worker pool shut down before the job finished")
+                )
+
+        if self._exporter is not None:
+            # Handed-over frames finish exporting before the ring goes away
+            self._exporter.shutdown(wait=True)
+            self._ring.unlink()
@@ -0,0 +1,28 @@
+"""
+AR Sticker Factory - Node Registration
+ComfyUI node mappings; importing this registers the warm-standby preload
+"""
+
+from .nodes.ar_sticker_generator import ARStickerGenerator
+from .nodes.sam2_segmenter import SAM2Segmenter
+from .nodes.usdz_exporter import USDZExporter
+from .nodes.sticker_pack_bundler import StickerPackBundler
+from .utils.weight_loading import register_warm_standby
+
+# Preload models once the ComfyUI server starts; a no-op in other processes
+register_warm_standby()
+
+# ComfyUI Node Registration
+NODE_CLASS_MAPPINGS = {
+    "ARStickerGenerator": ARStickerGenerator,
+    "SAM2Segmenter": SAM2Segmenter,
+    "USDZExporter": USDZExporter,
+    "StickerPackBundler": StickerPackBundler,
+}
+
+NODE_DISPLAY_NAME_MAPPINGS = {
+    "ARStickerGenerator": "AR Sticker Generator",
+    "SAM2Segmenter": "SAM2 Background Removal",
+    "USDZExporter": "USDZ AR Exporter",
+    "StickerPackBundler": "Sticker Pack Bundler",
+}
@@ -0,0 +1,188 @@
+"""
+Asynchronous Export Writer
+Run export encoding and file writes on a bounded background pool
+"""
+
+import atexit
+import itertools
+import threading
+import time
+import traceback
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+class AsyncExportWriter:
+    """
+    Bounded background pool for export jobs writing to output paths
+
+    submit() blocks once max_pending jobs are queued, so a fast producer
+    cannot pile up unbounded encoded work in memory. Every job gets its own
+    id and record; jobs for the same path run one after another in
+    submission order. Failures are recorded with their traceback and can be
+    read back through status(), jobs() and errors().
+
+    Records of finished jobs are kept for the latest max_history of them;
+    older ones are dropped, so a long-running process doesn't accumulate
+    one record per export.
+    """
+
+    def __init__(self, max_workers=2, max_pending=16, max_history=256):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_history = max_history
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="ar-export"
+        )
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        # Futures of unfinished jobs only
+        self._futures = {}
+        # Latest job id per output path
+        self._latest = {}
+        # Finished job ids, oldest first
+        self._finished = deque()
+        self._next_id = itertools.count(1)
+
+    def submit(self, path, fn, *args, **kwargs):
+        """
+        Queue fn(*args, **kwargs) writing to path, blocking while the pool
+        is full
+
+        A job for a path that already has one in flight starts only after
+        the earlier job finishes, so the two never write it concurrently.
+
+        Returns:
+            The job id, for status lookups
+        """
+        self._slots.acquire()
+        with self._lock:
+            job_id = f"export-{next(self._next_id)}"
+            previous = self._futures.get(self._latest.get(path))
+            self._jobs[job_id] = {
+                "job": job_id,
+                "path": path,
+                "state": "pending",
+                "submitted": time.time(),
+                "result": None,
+                "error": None,
+            }
+            self._latest[path] = job_id
+        try:
+            future = self._executor.submit(self._run, job_id, previous, fn, args, kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._futures[job_id] = future
+        # Runs at once if the job already finished
+        future.add_done_callback(lambda _: self._retire(job_id))
+        return job_id
+
+    def _run(self, job_id, previous, fn, args, kwargs):
+        """Execute a job after the previous job for its path, recording its outcome"""
+        if previous is not None:
+            # Jobs start in submission order, so the previous one is
+            # already running or done and this can't deadlock the pool
+            wait([previous])
+        self._update(job_id, state="running", started=time.time())
+        try:
+            result = fn(*args, **kwargs)
+            self._update(job_id, state="done", result=result, finished=time.time())
+        except Exception as e:
+            print(f"❌ Async export {job_id} failed: {str(e)}")
+            self._update(
+                job_id,
+                state="error",
+                error=str(e),
+                traceback=traceback.format_exc(),
+                finished=time.time(),
+            )
+        finally:
+            self._slots.release()
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def _retire(self, job_id):
+        """Drop a finished job's future and trim the history to max_history"""
+        with self._lock:
+            self._futures.pop(job_id, None)
+            self._finished.append(job_id)
+            while len(self._finished) > self.max_history:
+                oldest = self._finished.popleft()
+                job = self._jobs.pop(oldest)
+                if self._latest.get(job["path"]) == oldest:
+                    del self._latest[job["path"]]
+
+    def status(self, key):
+        """
+        Return a copy of a job record, or None if unknown or dropped from
+        the history
+
+        Args:
+            key: Job id, or an output path for the latest job writing it
+        """
+        with self._lock:
+            job = self._jobs.get(self._latest.get(key, key))
+            return dict(job) if job is not None else None
+
+    def jobs(self, path):
+        """Return copies of every job record for an output path, oldest first"""
+        with self._lock:
+            return [dict(job) for job in self._jobs.values() if job["path"] == path]
+
+    def errors(self):
+        """Return the records of all failed jobs keyed by job id"""
+        with self._lock:
+            return {
+                job_id: dict(job)
+                for job_id, job in self._jobs.items()
+                if job["state"] == "error"
+            }
+
+    def pending(self):
+        """Number of jobs not yet finished"""
+        with self._lock:
+            return sum(
+                1 for job in self._jobs.values() if job["state"] in ("pending", "running")
+            )
+
+    def flush(self, timeout=None):
+        """
+        Wait for all submitted jobs to finish
+
+        Returns:
+            True if everything finished within the timeout
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._lock:
+            futures = list(self._futures.values())
+        for future in futures:
+            remaining = None if deadline is None else max(deadline - time.time(), 0)
+            try:
+                future.result(timeout=remaining)
+            except Exception:
+                return False
+        return True
+
+    def shutdown(self):
+        """Flush outstanding jobs and stop the pool"""
+        self.flush()
+        self._executor.shutdown(wait=True)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_export_writer():
+    """Return the process-wide export writer, creating it on first use"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = AsyncExportWriter()
+            atexit.register(_writer.shutdown)
+        return _writer
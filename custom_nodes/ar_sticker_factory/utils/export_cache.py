@@ -0,0 +1,152 @@
+"""
+Export Cache
+Memoize exports by input fingerprint and verify artifacts before reuse
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+from .manifest_index import get_default_index
+
+
+class ExportCache:
+    """
+    LRU map from export fingerprint to the export result and its artifacts
+
+    An entry is only reused if every file the export wrote (the sticker,
+    OBJ/MTL/texture, sidecars) still exists with the size and modification
+    time recorded when it was written.
+
+    With an index (a ManifestIndex), entries are also saved to its
+    export_memo table and looked up there on a miss, so the memo survives
+    restarts; max_persisted bounds that table.
+    """
+
+    def __init__(self, max_entries=1024, index=None, max_persisted=10000):
+        self.max_entries = max_entries
+        self.index = index
+        self.max_persisted = max_persisted
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+
+    def lookup(self, key):
+        """
+        Return the cached result for key if its artifacts verify, else None
+        """
+        with self._lock:
+            entry = self._entries.get(key) or self._recall(key)
+            if entry is not None and not self._verify(entry):
+                self._entries.pop(key, None)
+                if self.index is not None:
+                    self.index.forget_export(key)
+                self.invalidated += 1
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._remember(key, entry)
+            self.hits += 1
+            return entry["result"]
+
+    def peek(self, key):
+        """
+        Like lookup, but leaves the hit/miss counters and LRU order alone
+
+        Used by IS_CHANGED checks, which are not exports themselves.
+        """
+        with self._lock:
+            entry = self._entries.get(key) or self._recall(key)
+            if entry is None or not self._verify(entry):
+                return None
+            return entry["result"]
+
+    def store(self, key, result, artifact_paths):
+        """
+        Remember result for key, recording its artifacts' current state
+
+        Args:
+            key: Export fingerprint
+            result: Export result tuple
+            artifact_paths: Path, or list of paths, of the files the export
+                wrote; nothing is stored if any of them is missing
+        """
+        if isinstance(artifact_paths, str):
+            artifact_paths = [artifact_paths]
+
+        artifacts = []
+        for path in artifact_paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return
+            artifacts.append(
+                {"path": path, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            )
+
+        with self._lock:
+            self._remember(key, {"result": result, "artifacts": artifacts})
+            if self.index is not None:
+                self.index.remember_export(
+                    key, list(result), artifacts, max_entries=self.max_persisted
+                )
+
+    def _remember(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _recall(self, key):
+        """Load an entry saved by an earlier process, or None"""
+        if self.index is None:
+            return None
+        saved = self.index.recall_export(key)
+        if saved is None:
+            return None
+        result, artifacts = saved
+        return {"result": tuple(result), "artifacts": artifacts}
+
+    def _verify(self, entry):
+        for artifact in entry["artifacts"]:
+            try:
+                stat = os.stat(artifact["path"])
+            except OSError:
+                return False
+            if stat.st_size != artifact["size"] or stat.st_mtime_ns != artifact["mtime_ns"]:
+                return False
+        return True
+
+    def stats(self):
+        """Hit/miss counters and hit rate"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidated": self.invalidated,
+                "entries": len(self._entries),
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_export_cache():
+    """
+    Return the process-wide export cache, creating it on first use
+
+    Its memo is kept in the default manifest index.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ExportCache(index=get_default_index())
+        return _cache
@@ -0,0 +1,79 @@
+"""
+Fingerprint Utilities
+Fast, stable hashes of image buffers and node parameters
+"""
+
+import hashlib
+import json
+import numpy as np
+
+# 128-bit BLAKE2b is fast on large buffers and ample for cache keys
+_DIGEST_SIZE = 16
+
+
+def fingerprint_array(array):
+    """
+    Hash an image buffer together with its shape and dtype
+
+    Args:
+        array: numpy array, torch tensor or PIL Image
+
+    Returns:
+        Hex digest string
+    """
+    if hasattr(array, "tobytes") and hasattr(array, "mode"):
+        # PIL Image
+        header = f"{array.mode}:{array.size}"
+        data = array.tobytes()
+    else:
+        if hasattr(array, "detach"):
+            array = array.detach().cpu().numpy()
+        array = np.ascontiguousarray(array)
+        header = f"{array.dtype}:{array.shape}"
+        data = memoryview(array).cast("B")
+
+    digest = hashlib.blake2b(header.encode("utf-8"), digest_size=_DIGEST_SIZE)
+    digest.update(data)
+    return digest.hexdigest()
+
+
+def fingerprint_params(**params):
+    """
+    Hash keyword parameters independent of their order
+
+    Returns:
+        Hex digest string
+    """
+    encoded = json.dumps(params, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.blake2b(encoded, digest_size=_DIGEST_SIZE).hexdigest()
+
+
+def fingerprint(array, **params):
+    """Combined fingerprint of an image buffer and parameters"""
+    return fingerprint_params(image=fingerprint_array(array), **params)
+
+
+def fingerprint_inputs(**inputs):
+    """
+    Fingerprint node inputs for IS_CHANGED
+
+    Image-like values (tensors, arrays, PIL Images, or lists of them) are
+    replaced by their buffer hash; everything else is hashed as given, so
+    a seed of -1 hashes as -1 rather than as whatever it resolves to.
+
+    Returns:
+        Hex digest string
+    """
+    return fingerprint_params(
+        **{name: _fingerprint_value(value) for name, value in inputs.items()}
+    )
+
+
+def _fingerprint_value(value):
+    if isinstance(value, (list, tuple)):
+        return [_fingerprint_value(item) for item in value]
+    if hasattr(value, "detach") or isinstance(value, np.ndarray):
+        return fingerprint_array(value)
+    if hasattr(value, "tobytes") and hasattr(value, "mode"):
+        return fingerprint_array(value)
+    return value
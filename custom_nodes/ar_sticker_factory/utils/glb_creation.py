@@ -0,0 +1,209 @@
+"""
+GLB Creation Utilities
+Create single-file binary glTF stickers for Android Scene Viewer and the web
+"""
+
+import json
+import os
+import struct
+import numpy as np
+from .png_encoding import encode_png, DEFAULT_PNG_PROFILE
+from .usdz_creation import MATERIAL_PRESETS, TEX_COORDS, _quad_geometry
+
+_GLB_MAGIC = 0x46546C67  # "glTF"
+_GLB_VERSION = 2
+_CHUNK_JSON = 0x4E4F534A  # "JSON"
+_CHUNK_BIN = 0x004E4942  # "BIN\0"
+
+# glTF enums
+_FLOAT = 5126
+_UNSIGNED_SHORT = 5123
+_ARRAY_BUFFER = 34962
+_ELEMENT_ARRAY_BUFFER = 34963
+_CLAMP_TO_EDGE = 33071
+_LINEAR = 9729
+_LINEAR_MIPMAP_LINEAR = 9987
+
+
+def create_glb_from_image(
+    image,
+    output_path,
+    scale=0.1,
+    material_type="matte",
+    ar_behavior="billboard",
+    png_profile=DEFAULT_PNG_PROFILE,
+    stats=None,
+):
+    """
+    Create a self-contained GLB file from PIL Image with an embedded texture
+
+    Uses the same quad geometry and material presets as the USDZ export, with
+    an alpha-blended, double-sided material. The texture is encoded once and
+    stored in the binary chunk.
+
+    Args:
+        image: PIL Image (RGB or RGBA)
+        output_path: Output path for GLB file, or a writable binary buffer
+        scale: Scale factor for AR object (in meters)
+        material_type: Material type (matte, glossy, metallic)
+        ar_behavior: AR behavior (billboard, fixed, physics)
+        png_profile: PNG encoding profile for the texture (fast, balanced, smallest)
+        stats: Optional dict updated with the texture encoding stats
+
+    Returns:
+        Boolean indicating success
+    """
+    try:
+        if image.mode != "RGBA":
+            image = image.convert("RGBA")
+
+        texture, encode_stats = encode_png(image, png_profile)
+        if stats is not None:
+            stats.update(encode_stats)
+
+        width, height = image.size
+        points, normals = _quad_geometry(scale, height / width, ar_behavior)
+        glb = _build_glb(points, normals, texture, material_type)
+
+        if isinstance(output_path, (str, os.PathLike)):
+            with open(output_path, "wb") as f:
+                f.write(glb)
+            print(f"✅ GLB created: {output_path}")
+        else:
+            output_path.write(glb)
+        return True
+
+    except Exception as e:
+        print(f"❌ Error creating GLB: {str(e)}")
+        return False
+
+
+def _front_facing_indices(positions, normals):
+    """
+    Triangle indices for the quad, wound counter-clockwise around its normal
+
+    glTF front faces are counter-clockwise, and the geometric normal has to
+    agree with the NORMAL attribute for lighting and culling. The billboard
+    quad lies in XZ facing +Y and the fixed quad in XY facing +Z, so the
+    same corner order winds opposite ways for the two.
+    """
+    indices = np.array([0, 1, 2, 0, 2, 3], dtype=np.uint16)
+    edge_a = positions[1] - positions[0]
+    edge_b = positions[2] - positions[0]
+    if np.dot(np.cross(edge_a, edge_b), normals[0]) < 0:
+        indices = np.array([0, 2, 1, 0, 3, 2], dtype=np.uint16)
+    return indices
+
+
+def _build_glb(points, normals, texture, material_type):
+    """Assemble the glTF JSON and binary chunks into GLB bytes"""
+    positions = np.array(points, dtype=np.float32)
+    # glTF UV origin is top-left, so the flipped USD coordinates map upright
+    uvs = np.array(TEX_COORDS, dtype=np.float32)
+    indices = _front_facing_indices(positions, np.array(normals, np.float32))
+
+    binary = bytearray()
+    buffer_views = []
+
+    def add_view(data, target=None):
+        binary.extend(b"\0" * (-len(binary) % 4))
+        view = {"buffer": 0, "byteOffset": len(binary), "byteLength": len(data)}
+        if target is not None:
+            view["target"] = target
+        binary.extend(data)
+        buffer_views.append(view)
+        return len(buffer_views) - 1
+
+    position_view = add_view(positions.tobytes(), _ARRAY_BUFFER)
+    normal_view = add_view(np.array(normals, np.float32).tobytes(), _ARRAY_BUFFER)
+    uv_view = add_view(uvs.tobytes(), _ARRAY_BUFFER)
+    index_view = add_view(indices.tobytes(), _ELEMENT_ARRAY_BUFFER)
+    texture_view = add_view(texture)
+    binary.extend(b"\0" * (-len(binary) % 4))
+
+    roughness, metallic = MATERIAL_PRESETS.get(material_type, (1.0, 0.0))
+
+    document = {
+        "asset": {"version": "2.0", "generator": "AR Sticker Factory"},
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [{"name": "Sticker", "mesh": 0}],
+        "meshes": [
+            {
+                "name": "Sticker",
+                "primitives": [
+                    {
+                        "attributes": {"POSITION": 0, "NORMAL": 1, "TEXCOORD_0": 2},
+                        "indices": 3,
+                        "material": 0,
+                    }
+                ],
+            }
+        ],
+        "materials": [
+            {
+                "name": "sticker_material",
+                "pbrMetallicRoughness": {
+                    "baseColorTexture": {"index": 0},
+                    "metallicFactor": metallic,
+                    "roughnessFactor": roughness,
+                },
+                "alphaMode": "BLEND",
+                "doubleSided": True,
+            }
+        ],
+        "textures": [{"sampler": 0, "source": 0}],
+        "samplers": [
+            {
+                "magFilter": _LINEAR,
+                "minFilter": _LINEAR_MIPMAP_LINEAR,
+                "wrapS": _CLAMP_TO_EDGE,
+                "wrapT": _CLAMP_TO_EDGE,
+            }
+        ],
+        "images": [{"bufferView": texture_view, "mimeType": "image/png"}],
+        "accessors": [
+            {
+                "bufferView": position_view,
+                "componentType": _FLOAT,
+                "count": len(positions),
+                "type": "VEC3",
+                "min": positions.min(axis=0).tolist(),
+                "max": positions.max(axis=0).tolist(),
+            },
+            {
+                "bufferView": normal_view,
+                "componentType": _FLOAT,
+                "count": len(normals),
+                "type": "VEC3",
+            },
+            {
+                "bufferView": uv_view,
+                "componentType": _FLOAT,
+                "count": len(uvs),
+                "type": "VEC2",
+            },
+            {
+                "bufferView": index_view,
+                "componentType": _UNSIGNED_SHORT,
+                "count": len(indices),
+                "type": "SCALAR",
+            },
+        ],
+        "bufferViews": buffer_views,
+        "buffers": [{"byteLength": len(binary)}],
+    }
+
+    json_chunk = json.dumps(document, separators=(",", ":")).encode("utf-8")
+    json_chunk += b" " * (-len(json_chunk) % 4)
+
+    total_length = 12 + 8 + len(json_chunk) + 8 + len(binary)
+    return b"".join(
+        [
+            struct.pack("<III", _GLB_MAGIC, _GLB_VERSION, total_length),
+            struct.pack("<II", len(json_chunk), _CHUNK_JSON),
+            json_chunk,
+            struct.pack("<II", len(binary), _CHUNK_BIN),
+            bytes(binary),
+        ]
+    )
@@ -8,8 +8,18 @@ import cv2
 from PIL import Image, ImageFilter
 from scipy import ndimage
 
-
-def process_alpha_channel(mask, padding=10, blur_radius=2):
+from .profiling import profiled
+from .tiling import (
+    enhance_tiled,
+    process_alpha_channel_tiled,
+    tile_size_for,
+    to_uint8,
+    use_tiles,
+)
+
+
+@profiled("process_alpha_channel")
+def process_alpha_channel(mask, padding=10, blur_radius=2, tile_size=0):
     """
     Process mask to create smooth alpha channel for AR stickers
 
@@ -17,11 +27,19 @@ def process_alpha_channel(mask, padding=10, blur_radius=2):
         mask: Binary mask array
         padding: Padding around the mask edges
         blur_radius: Gaussian blur radius for edge smoothing
+        tile_size: Tile side for bounded-memory processing; 0 tiles frames
+            larger than 2048², -1 never tiles
 
     Returns:
         Processed alpha channel as numpy array
     """
     try:
+        if use_tiles(*mask.shape[:2], tile_size):
+            # Same result without frame-sized uint8/float temporaries
+            return process_alpha_channel_tiled(
+                mask, padding, blur_radius, tile_size_for(tile_size)
+            )
+
         # Convert to uint8 if needed
         if mask.dtype != np.uint8:
             mask = (mask * 255).astype(np.uint8)
@@ -79,7 +97,9 @@ def create_feathered_mask(image_size, feather_radius=20):
     return feathered
 
 
-def enhance_sticker_for_ar(image, enhance_contrast=True, enhance_saturation=True):
+def enhance_sticker_for_ar(
+    image, enhance_contrast=True, enhance_saturation=True, tile_size=0
+):
     """
     Enhance image properties for better AR appearance
 
@@ -87,11 +107,21 @@ def enhance_sticker_for_ar(image, enhance_contrast=True, enhance_saturation=True
         image: PIL Image
         enhance_contrast: Whether to enhance contrast
         enhance_saturation: Whether to enhance saturation
+        tile_size: Tile side for bounded-memory processing; 0 tiles images
+            larger than 2048², -1 never tiles
 
     Returns:
         Enhanced PIL Image
     """
     try:
+        if use_tiles(image.height, image.width, tile_size):
+            return enhance_tiled(
+                image,
+                contrast=1.2 if enhance_contrast else None,
+                saturation=1.1 if enhance_saturation else None,
+                tile_size=tile_size_for(tile_size),
+            )
+
         if enhance_contrast:
             from PIL import ImageEnhance
 
@@ -133,3 +163,69 @@ def resize_for_ar(image, max_size=1024):
         image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
 
     return image
+
+
+def trim_to_alpha(image, margin=8, alpha_threshold=0):
+    """
+    Crop an RGBA image to the bounding box of its visible pixels
+
+    Args:
+        image: PIL Image (RGBA)
+        margin: Transparent margin in pixels to keep around the content
+        alpha_threshold: Alpha values at or below this are treated as transparent
+
+    Returns:
+        Tuple of (cropped PIL Image, crop box as (left, top, right, bottom))
+    """
+    width, height = image.size
+    full_box = (0, 0, width, height)
+
+    if image.mode != "RGBA":
+        return image, full_box
+
+    alpha = image.getchannel("A")
+    if alpha_threshold > 0:
+        alpha = alpha.point(lambda value: 255 if value > alpha_threshold else 0)
+
+    bbox = alpha.getbbox()
+    if bbox is None:
+        # Fully transparent frame, nothing sensible to crop to
+        return image, full_box
+
+    left, top, right, bottom = bbox
+    box = (
+        max(left - margin, 0),
+        max(top - margin, 0),
+        min(right + margin, width),
+        min(bottom + margin, height),
+    )
+
+    if box == full_box:
+        return image, full_box
+
+    return image.crop(box), box
+
+
+def tensor_to_rgba(image):
+    """
+    Convert a single ComfyUI IMAGE tensor to an RGBA PIL Image
+
+    Args:
+        image: Tensor of shape (1, H, W, C) or (H, W, C) with values in 0-1
+
+    Returns:
+        RGBA PIL Image
+    """
+    image = image.squeeze(0)
+    if use_tiles(*image.shape[:2]):
+        # Converted in bands so no frame-sized float copy is made
+        image_np = to_uint8(image)
+    else:
+        image_np = (image.numpy() * 255).astype(np.uint8)
+
+    # Handle RGBA if present, ensure transparency
+    if image_np.shape[2] == 4:
+        return Image.fromarray(image_np, "RGBA")
+
+    # Convert RGB to RGBA for AR transparency support
+    return Image.fromarray(image_np, "RGB").convert("RGBA")
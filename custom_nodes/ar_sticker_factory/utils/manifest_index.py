@@ -0,0 +1,258 @@
+"""
+Manifest Index
+Append-only SQLite catalog of every export, replacing per-sticker sidecars
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Environment variable overriding the default index location
+MANIFEST_PATH_ENV = "AR_STICKER_MANIFEST"
+
+# Path recorded for payloads served from memory and never written to disk
+IN_MEMORY_PATH_PREFIX = "memory://"
+
+# Escape character for LIKE patterns built from user strings
+_LIKE_ESCAPE = "\\"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS exports (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created REAL NOT NULL,
+    path TEXT NOT NULL,
+    format TEXT NOT NULL,
+    filename TEXT,
+    prompt TEXT,
+    scale REAL,
+    behavior TEXT,
+    material_type TEXT,
+    width INTEGER,
+    height INTEGER,
+    bytes INTEGER,
+    content_sha256 TEXT,
+    input_fingerprint TEXT,
+    encode_ms REAL,
+    export_ms REAL,
+    metadata TEXT
+);
+CREATE INDEX IF NOT EXISTS exports_created ON exports (created);
+CREATE INDEX IF NOT EXISTS exports_format ON exports (format, created);
+CREATE INDEX IF NOT EXISTS exports_prompt ON exports (prompt);
+CREATE INDEX IF NOT EXISTS exports_sha ON exports (content_sha256);
+CREATE TABLE IF NOT EXISTS export_memo (
+    key TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    result TEXT NOT NULL,
+    artifacts TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS export_memo_created ON export_memo (created);
+"""
+
+_COLUMNS = (
+    "path",
+    "format",
+    "filename",
+    "prompt",
+    "scale",
+    "behavior",
+    "material_type",
+    "width",
+    "height",
+    "bytes",
+    "content_sha256",
+    "input_fingerprint",
+    "encode_ms",
+    "export_ms",
+)
+
+
+class ManifestIndex:
+    """
+    Catalog of exports in a single SQLite database
+
+    Rows are only ever inserted. Queries by prompt, date and format are
+    served from indexes, so listing the catalog never walks the output
+    directory.
+
+    The same database keeps the export cache's memo (export_memo), so
+    repeat exports are recognized across restarts.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        with self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript(_SCHEMA)
+
+    def record(self, **fields):
+        """
+        Append one export record
+
+        Args:
+            **fields: Values for the indexed columns (path, format, prompt,
+                scale, behavior, width, height, bytes, content_sha256, ...);
+                anything else is stored in the JSON metadata column
+
+        Returns:
+            Row id of the new record
+        """
+        created = fields.pop("created", time.time())
+        values = [fields.pop(column, None) for column in _COLUMNS]
+        metadata = json.dumps(fields, default=str) if fields else None
+
+        placeholders = ", ".join("?" * (len(_COLUMNS) + 2))
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                f"INSERT INTO exports (created, {', '.join(_COLUMNS)}, metadata) "
+                f"VALUES ({placeholders})",
+                [created, *values, metadata],
+            )
+            return cursor.lastrowid
+
+    def query(
+        self,
+        prompt=None,
+        prompt_contains=None,
+        since=None,
+        until=None,
+        format=None,
+        content_sha256=None,
+        limit=None,
+    ):
+        """
+        Find export records, newest first
+
+        Args:
+            prompt: Exact prompt match
+            prompt_contains: Substring match on the prompt
+            since: Earliest creation time (Unix seconds), inclusive
+            until: Latest creation time (Unix seconds), exclusive
+            format: Export format (usdz, glb, png)
+            content_sha256: Payload digest
+            limit: Maximum number of records
+
+        Returns:
+            List of record dicts
+        """
+        clauses = []
+        params = []
+        for clause, value in (
+            ("prompt = ?", prompt),
+            (
+                f"prompt LIKE ? ESCAPE '{_LIKE_ESCAPE}'",
+                f"%{_escape_like(prompt_contains)}%" if prompt_contains else None,
+            ),
+            ("created >= ?", since),
+            ("created < ?", until),
+            ("format = ?", format),
+            ("content_sha256 = ?", content_sha256),
+        ):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+
+        sql = "SELECT * FROM exports"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY created DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+
+        with self._lock:
+            rows = self._connection.execute(sql, params).fetchall()
+
+        records = []
+        for row in rows:
+            record = dict(row)
+            metadata = record.pop("metadata")
+            if metadata:
+                record.update(json.loads(metadata))
+            records.append(record)
+        return records
+
+    def remember_export(self, key, result, artifacts, max_entries=None):
+        """
+        Save an export cache entry, keeping the newest max_entries
+
+        Args:
+            key: Export fingerprint
+            result: JSON-serializable export result
+            artifacts: List of {"path", "size", "mtime_ns"} dicts
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO export_memo (key, created, result, artifacts) "
+                "VALUES (?, ?, ?, ?)",
+                [key, time.time(), json.dumps(result), json.dumps(artifacts)],
+            )
+            if max_entries is not None:
+                self._connection.execute(
+                    "DELETE FROM export_memo WHERE key NOT IN "
+                    "(SELECT key FROM export_memo ORDER BY created DESC LIMIT ?)",
+                    [int(max_entries)],
+                )
+
+    def recall_export(self, key):
+        """
+        Return a saved export cache entry
+
+        Returns:
+            (result, artifacts) or None
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT result, artifacts FROM export_memo WHERE key = ?", [key]
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row["result"]), json.loads(row["artifacts"])
+
+    def forget_export(self, key):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM export_memo WHERE key = ?", [key])
+
+    def count(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM exports").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+def _escape_like(text):
+    """Escape LIKE wildcards so a user string matches only literally"""
+    for character in (_LIKE_ESCAPE, "%", "_"):
+        text = text.replace(character, _LIKE_ESCAPE + character)
+    return text
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_default_index():
+    """
+    Return the process-wide manifest index
+
+    Stored at $AR_STICKER_MANIFEST, or output/ar_stickers/manifest.sqlite in
+    the working directory.
+    """
+    global _index
+    with _index_lock:
+        if _index is None:
+            path = os.environ.get(MANIFEST_PATH_ENV) or os.path.join(
+                os.getcwd(), "output", "ar_stickers", "manifest.sqlite"
+            )
+            _index = ManifestIndex(path)
+        return _index
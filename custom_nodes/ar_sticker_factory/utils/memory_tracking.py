@@ -0,0 +1,167 @@
+"""
+Memory Tracking
+Per-stage peak memory: host RSS, Python/numpy allocations and accelerator
+"""
+
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import torch
+
+_MB = 1024**2
+
+# Open track_stage blocks in this process, on any thread. The kernel,
+# tracemalloc and CUDA peaks are process-wide, so they are only reset when
+# no other block is open; resetting under a running stage would hide its peak.
+_active = []
+_active_lock = threading.Lock()
+
+
+def _read_status():
+    """Current and peak resident set size from /proc, in bytes"""
+    fields = {}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(("VmRSS:", "VmHWM:")):
+                    name, value = line.split(":", 1)
+                    fields[name] = int(value.split()[0]) * 1024
+    except OSError:
+        # Not Linux: only the lifetime peak is available
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        fields["VmHWM"] = peak if sys.platform == "darwin" else peak * 1024
+    return fields
+
+
+def reset_peak_rss():
+    """
+    Reset the kernel's peak RSS (VmHWM) to the current RSS
+
+    Returns:
+        True when the peak was reset (Linux 4.0+), False otherwise
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _cuda_active():
+    return torch.cuda.is_available() and torch.cuda.is_initialized()
+
+
+@contextmanager
+def track_stage(name, trace_python=False):
+    """
+    Measure the peak memory of a block
+
+    Yields a dict that is filled in when the block exits:
+        stage, elapsed_s
+        rss_mb, rss_peak_mb: host resident set size at exit and its peak
+        rss_peak_delta_mb: peak above the RSS at entry
+        py_peak_mb: peak Python/numpy allocations above entry, when
+            tracemalloc is tracing (trace_python starts it for the block)
+        cuda_peak_mb, cuda_peak_delta_mb: peak allocated on the GPU
+        peak_shared: another tracked block was open at some point during
+            this one
+
+    Peaks are process-wide. The peak counters are only reset when a block
+    opens while no other is open, so an overlapping block (another thread's
+    stage, or a nested block) leaves them running. When peak_shared is
+    true the peaks include the other blocks' memory. The deltas are then
+    None when this block didn't reset the counters itself, and for the
+    block that did they cover everything that ran alongside it.
+    """
+    usage = {"stage": name}
+    frame = {"shared": False}
+
+    started_tracing = trace_python and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    tracing = tracemalloc.is_tracing()
+    cuda = _cuda_active()
+
+    with _active_lock:
+        owner = not _active
+        for other in _active:
+            other["shared"] = frame["shared"] = True
+        _active.append(frame)
+
+        rss_reset = owner and reset_peak_rss()
+        base_rss = _read_status().get("VmRSS")
+        if tracing:
+            if owner:
+                tracemalloc.reset_peak()
+            base_py = tracemalloc.get_traced_memory()[0]
+        if cuda:
+            if owner:
+                torch.cuda.reset_peak_memory_stats()
+            base_cuda = torch.cuda.memory_allocated()
+
+    start = time.perf_counter()
+    try:
+        yield usage
+    finally:
+        usage["elapsed_s"] = round(time.perf_counter() - start, 4)
+        with _active_lock:
+            _active.remove(frame)
+        usage["peak_shared"] = frame["shared"]
+
+        status = _read_status()
+        rss_peak = status.get("VmHWM", 0)
+        if "VmRSS" in status:
+            usage["rss_mb"] = _mb(status["VmRSS"])
+        usage["rss_peak_mb"] = _mb(rss_peak)
+        usage["rss_peak_delta_mb"] = (
+            _mb(rss_peak - base_rss) if rss_reset and base_rss is not None else None
+        )
+
+        if tracing:
+            py_peak = tracemalloc.get_traced_memory()[1] - base_py
+            usage["py_peak_mb"] = _mb(py_peak) if owner or started_tracing else None
+            if started_tracing:
+                tracemalloc.stop()
+
+        if cuda:
+            cuda_peak = torch.cuda.max_memory_allocated()
+            usage["cuda_peak_mb"] = _mb(cuda_peak)
+            usage["cuda_peak_delta_mb"] = _mb(cuda_peak - base_cuda) if owner else None
+
+
+def run_tracked(stage, fn, *args, **kwargs):
+    """
+    Call fn under track_stage
+
+    Returns:
+        (fn's return value, usage dict)
+    """
+    with track_stage(stage) as usage:
+        value = fn(*args, **kwargs)
+    return value, usage
+
+
+def memory_summary():
+    """Current and peak host and GPU memory as a short string"""
+    status = _read_status()
+    parts = []
+    if torch.cuda.is_available():
+        allocated = torch.cuda.memory_allocated() / 1024**3
+        peak = torch.cuda.max_memory_allocated() / 1024**3
+        parts.append(f"GPU {allocated:.1f}GB (peak {peak:.1f}GB)")
+    if "VmRSS" in status:
+        parts.append(
+            f"RSS {status['VmRSS'] / 1024**3:.1f}GB (peak {status['VmHWM'] / 1024**3:.1f}GB)"
+        )
+    else:
+        parts.append(f"RSS peak {status['VmHWM'] / 1024**3:.1f}GB")
+    return ", ".join(parts)
+
+
+def _mb(value):
+    return round(value / _MB, 1)
@@ -0,0 +1,159 @@
+"""
+Content-Addressed Output Store
+Sharded, deduplicated storage for exported stickers with atomic writes
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+
+# Environment variable overriding the default local store location
+STORE_ROOT_ENV = "AR_STICKER_STORE"
+
+
+def write_atomic(path, data):
+    """
+    Write bytes to path so readers never see a partial file
+
+    The data goes to a temp file in the same directory, is fsynced, and is
+    renamed over path.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class StorageBackend(ABC):
+    """
+    Interface for output store backends
+
+    Keys are relative, "/"-separated names such as "ab/cd/abcd...usdz".
+    A local directory is implemented below; an object store only needs to
+    map the same four operations onto its API.
+    """
+
+    @abstractmethod
+    def exists(self, key):
+        """True if an object is stored under key"""
+
+    @abstractmethod
+    def put(self, key, data):
+        """Store bytes under key; must never expose a partially written object"""
+
+    @abstractmethod
+    def get(self, key):
+        """Return the bytes stored under key"""
+
+    @abstractmethod
+    def locate(self, key):
+        """Return a path or URL for the stored object"""
+
+
+class LocalDirectoryBackend(StorageBackend):
+    """Store objects as files below a root directory"""
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+
+    def _path(self, key):
+        return os.path.join(self.root, *key.split("/"))
+
+    def exists(self, key):
+        return os.path.exists(self._path(key))
+
+    def put(self, key, data):
+        write_atomic(self._path(key), data)
+
+    def get(self, key):
+        with open(self._path(key), "rb") as f:
+            return f.read()
+
+    def locate(self, key):
+        return self._path(key)
+
+
+class ContentStore:
+    """
+    Store payloads under their SHA-256 digest, sharded by digest prefix
+
+    Identical payloads map to the same key and are written once.
+    """
+
+    def __init__(self, backend, shard_depth=2, shard_width=2):
+        self.backend = backend
+        self.shard_depth = shard_depth
+        self.shard_width = shard_width
+
+    def key_for(self, digest, suffix=""):
+        """Sharded key for a digest, e.g. ab/cd/abcd....usdz"""
+        shards = [
+            digest[i * self.shard_width : (i + 1) * self.shard_width]
+            for i in range(self.shard_depth)
+        ]
+        return "/".join(shards + [digest + suffix])
+
+    def put(self, data, suffix=""):
+        """
+        Store a payload
+
+        Args:
+            data: Payload bytes
+            suffix: File extension including the dot, e.g. ".usdz"
+
+        Returns:
+            Dict with key, digest, location, bytes and deduplicated
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        key = self.key_for(digest, suffix)
+
+        deduplicated = self.backend.exists(key)
+        if not deduplicated:
+            self.backend.put(key, data)
+
+        return {
+            "key": key,
+            "digest": digest,
+            "location": self.backend.locate(key),
+            "bytes": len(data),
+            "deduplicated": deduplicated,
+        }
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def exists(self, key):
+        return self.backend.exists(key)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_default_store():
+    """
+    Return the process-wide store
+
+    Rooted at $AR_STICKER_STORE, or output/ar_stickers/store in the working
+    directory.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            root = os.environ.get(STORE_ROOT_ENV) or os.path.join(
+                os.getcwd(), "output", "ar_stickers", "store"
+            )
+            _store = ContentStore(LocalDirectoryBackend(root))
+        return _store
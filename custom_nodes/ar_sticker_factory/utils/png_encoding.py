@@ -0,0 +1,155 @@
+"""
+PNG Encoding Utilities
+Named speed/size profiles for every PNG the exporters write
+"""
+
+import io
+import time
+import numpy as np
+from PIL import Image
+
+from .tiling import iter_bands
+
+# zlib level, exhaustive filter search and palette quantization per profile
+PNG_PROFILES = {
+    "fast": {"compress_level": 1, "optimize": False, "quantize": False},
+    "balanced": {"compress_level": 6, "optimize": False, "quantize": False},
+    "smallest": {"compress_level": 9, "optimize": True, "quantize": True},
+}
+
+DEFAULT_PNG_PROFILE = "balanced"
+
+# Stickers with more distinct colors than this are never palettized
+PALETTE_MAX_SOURCE_COLORS = 4096
+
+# Lossy palette quantization is kept only when nearly every pixel is close
+# to its source: at PALETTE_ERROR_PERCENTILE, the per-pixel error (largest
+# channel difference) may be at most PALETTE_MAX_PERCENTILE_ERROR, and no
+# pixel may be off by more than PALETTE_MAX_PIXEL_ERROR. A frame-wide mean
+# would let banding in a small region through on large flat stickers.
+PALETTE_ERROR_PERCENTILE = 99.9
+PALETTE_MAX_PERCENTILE_ERROR = 3
+PALETTE_MAX_PIXEL_ERROR = 12
+
+
+def encode_png(image, profile=DEFAULT_PNG_PROFILE):
+    """
+    Encode a PIL Image as PNG bytes using a named profile
+
+    Args:
+        image: PIL Image
+        profile: One of PNG_PROFILES (fast, balanced, smallest)
+
+    Returns:
+        Tuple of (PNG bytes, stats dict with profile, bytes, encode_ms, palette)
+    """
+    if profile not in PNG_PROFILES:
+        raise ValueError(
+            f"Unknown PNG profile '{profile}', expected one of {list(PNG_PROFILES)}"
+        )
+    settings = PNG_PROFILES[profile]
+
+    start = time.perf_counter()
+
+    palette = False
+    if settings["quantize"] and image.mode == "RGBA":
+        image = _clear_hidden_color(image)
+        quantized = _palettize(image)
+        if quantized is not None:
+            image = quantized
+            palette = True
+
+    buffer = io.BytesIO()
+    image.save(
+        buffer,
+        "PNG",
+        compress_level=settings["compress_level"],
+        optimize=settings["optimize"],
+    )
+    data = buffer.getvalue()
+
+    stats = {
+        "profile": profile,
+        "bytes": len(data),
+        "encode_ms": round((time.perf_counter() - start) * 1000, 2),
+        "palette": palette,
+    }
+    return data, stats
+
+
+def _clear_hidden_color(image):
+    """Zero the RGB of fully transparent pixels so they collapse to one color"""
+    result = Image.new("RGBA", image.size)
+    # A band of rows at a time keeps the working copy small on print sizes
+    for top, bottom in iter_bands(image.height):
+        box = (0, top, image.width, bottom)
+        array = np.array(image.crop(box))
+        array[array[:, :, 3] == 0] = 0
+        result.paste(Image.fromarray(array, "RGBA"), box)
+    return result
+
+
+def _palettize(image):
+    """
+    Convert an RGBA image to a palette image with per-entry alpha
+
+    Exact when the image has at most 256 colors; otherwise quantized only if
+    the sticker has few colors and the result stays visually lossless.
+    Returns None when the image should stay truecolor.
+    """
+    colors = image.getcolors(256)
+    if colors is not None:
+        return _exact_palette(image, [color for _, color in colors])
+
+    if image.getcolors(PALETTE_MAX_SOURCE_COLORS) is None:
+        return None
+
+    quantized = image.quantize(256, method=Image.Quantize.FASTOCTREE)
+    if _palette_error(image, quantized.convert("RGBA")) is None:
+        return None
+    return quantized
+
+
+def _palette_error(image, restored):
+    """
+    Per-pixel error of a quantized image against its source
+
+    Errors are counted into a 256-bin histogram band by band, so the
+    percentile is exact without holding a frame-sized error array.
+
+    Returns:
+        The error at PALETTE_ERROR_PERCENTILE, or None when it or the
+        largest error is over its limit
+    """
+    histogram = np.zeros(256, np.int64)
+    for top, bottom in iter_bands(image.height):
+        box = (0, top, image.width, bottom)
+        source = np.asarray(image.crop(box), dtype=np.int16)
+        difference = np.abs(source - np.asarray(restored.crop(box), dtype=np.int16))
+        histogram += np.bincount(difference.max(axis=2).ravel(), minlength=256)
+
+    largest = int(np.flatnonzero(histogram)[-1])
+    rank = histogram.sum() * PALETTE_ERROR_PERCENTILE / 100
+    percentile = int(np.searchsorted(np.cumsum(histogram), rank))
+    if percentile > PALETTE_MAX_PERCENTILE_ERROR or largest > PALETTE_MAX_PIXEL_ERROR:
+        return None
+    return percentile
+
+
+def _exact_palette(image, colors):
+    """Build a lossless palette image from a list of at most 256 RGBA colors"""
+    palette = np.array(colors, dtype=np.uint8)
+    keys = palette.view(np.uint32).ravel()
+    order = np.argsort(keys)
+
+    sorted_keys = keys[order]
+    indices = np.empty((image.height, image.width), np.uint8)
+    for top, bottom in iter_bands(image.height):
+        pixels = np.asarray(image.crop((0, top, image.width, bottom)), dtype=np.uint8)
+        pixel_keys = np.ascontiguousarray(pixels).view(np.uint32)[:, :, 0]
+        indices[top:bottom] = order[np.searchsorted(sorted_keys, pixel_keys)]
+
+    result = Image.fromarray(indices, "P")
+    result.putpalette(palette[:, :3].tobytes())
+    result.info["transparency"] = palette[:, 3].tobytes()
+    return result
@@ -0,0 +1,331 @@
+"""
+Profiling
+Opt-in per-request profiles of the sticker stages with trace export
+"""
+
+import contextvars
+import cProfile
+import functools
+import inspect
+import json
+import os
+import pstats
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# Where profiles are written unless STICKER_PROFILE_DIR says otherwise
+DEFAULT_PROFILE_DIR = "output/profiles"
+
+# Deepest call path written to the collapsed-stack (flamegraph) file
+_MAX_STACK_DEPTH = 64
+
+# Session of the request being profiled in this context
+_session = contextvars.ContextVar("profile_session", default=None)
+
+# Only one cProfile and one torch profiler can be active per process; a
+# stage that can't get them still records its span
+_cprofile_lock = threading.Lock()
+_torch_lock = threading.Lock()
+
+_sample_rate = 0.0
+
+
+def configure(sample_rate=None):
+    """
+    Set the fraction of top-level stage calls profiled without a request
+
+    Defaults to STICKER_PROFILE_RATE (0 disables sampling). Requests can
+    still opt in one at a time with profile_request.
+    """
+    global _sample_rate
+    if sample_rate is None:
+        sample_rate = float(os.environ.get("STICKER_PROFILE_RATE", "0") or 0)
+    _sample_rate = max(0.0, min(1.0, sample_rate))
+    return _sample_rate
+
+
+configure()
+
+
+class ProfileSession:
+    """
+    Profiles and spans collected for one request
+
+    Each profiled stage records a span for the Chrome trace. The outermost
+    profiled call runs a cProfile, unless another call already holds it,
+    and its stats are merged into the session. On CUDA machines that call
+    also runs torch.profiler.
+    """
+
+    def __init__(self, request_id=None, params=None, output_dir=None, use_torch=True):
+        self.request_id = str(request_id or uuid.uuid4().hex[:12])
+        self.params = _tag_params(params or {})
+        self.output_dir = output_dir or os.environ.get("STICKER_PROFILE_DIR", DEFAULT_PROFILE_DIR)
+        self.use_torch = use_torch
+        self.spans = []
+        self.torch_traces = []
+        self.paths = {}
+        self.started = time.perf_counter()
+        self._stats = None
+        self._lock = threading.Lock()
+
+    def add_span(self, name, start, end, thread_name):
+        with self._lock:
+            self.spans.append((name, start, end, thread_name))
+
+    def add_stats(self, profiler):
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profiler)
+            else:
+                self._stats.add(profiler)
+
+    def write(self):
+        """
+        Write the session's profile files
+
+        Returns:
+            Dict of kind -> path (trace, prof, collapsed and any torch traces)
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, self.request_id)
+        paths = {"trace": f"{base}.trace.json"}
+
+        with open(paths["trace"], "w") as f:
+            json.dump(self._chrome_trace(), f)
+
+        if self._stats is not None:
+            paths["prof"] = f"{base}.prof"
+            self._stats.dump_stats(paths["prof"])
+
+            paths["collapsed"] = f"{base}.collapsed"
+            with open(paths["collapsed"], "w") as f:
+                f.writelines(f"{stack} {micros}\n" for stack, micros in _collapsed_stacks(self._stats))
+
+        if self.torch_traces:
+            paths["torch"] = list(self.torch_traces)
+
+        total = time.perf_counter() - self.started
+        print(f"🔬 Profile {self.request_id}: {total:.2f}s, written to {base}.*")
+        return paths
+
+    def _chrome_trace(self):
+        """Spans in the Chrome trace event format (chrome://tracing, Perfetto)"""
+        threads = {}
+        events = []
+        for name, start, end, thread_name in self.spans:
+            tid = threads.setdefault(thread_name, len(threads) + 1)
+            events.append(
+                {
+                    "name": name,
+                    "ph": "X",
+                    "ts": round((start - self.started) * 1e6, 1),
+                    "dur": round((end - start) * 1e6, 1),
+                    "pid": os.getpid(),
+                    "tid": tid,
+                    "args": {"request_id": self.request_id},
+                }
+            )
+        for thread_name, tid in threads.items():
+            events.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": os.getpid(),
+                    "tid": tid,
+                    "args": {"name": thread_name},
+                }
+            )
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "metadata": {"request_id": self.request_id, "params": self.params},
+        }
+
+
+@contextmanager
+def profile_request(request_id=None, params=None, enabled=True, output_dir=None):
+    """
+    Profile every @profiled stage called inside the block
+
+    Args:
+        request_id: Used to name the output files
+        params: Request parameters stored in the trace metadata
+        enabled: Profile this request; False makes the block a no-op
+        output_dir: Defaults to STICKER_PROFILE_DIR or output/profiles
+
+    Yields:
+        The ProfileSession, or None when disabled. Its output paths are
+        in session.paths after the block.
+    """
+    if not enabled or _session.get() is not None:
+        yield _session.get()
+        return
+
+    session = ProfileSession(request_id, params, output_dir)
+    token = _session.set(session)
+    try:
+        yield session
+    finally:
+        _session.reset(token)
+        try:
+            session.paths = session.write()
+        except Exception as e:
+            print(f"❌ Error writing profile {session.request_id}: {str(e)}")
+
+
+def current_session():
+    return _session.get()
+
+
+def profiled(name):
+    """
+    Decorator that records a stage in the active profile session
+
+    Without a session a call costs one context-variable lookup, plus one
+    random draw when sampling is on; a sampled top-level call profiles
+    itself as its own request.
+    """
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            session = _session.get()
+            if session is None:
+                if not _sample_rate or random.random() >= _sample_rate:
+                    return fn(*args, **kwargs)
+                with profile_request(params=_call_params(fn, args, kwargs)):
+                    return _run_profiled(_session.get(), name, fn, args, kwargs)
+            return _run_profiled(session, name, fn, args, kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _run_profiled(session, name, fn, args, kwargs):
+    start = time.perf_counter()
+    if not _cprofile_lock.acquire(blocking=False):
+        # Nested stage, or another request is being profiled
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            session.add_span(name, start, time.perf_counter(), threading.current_thread().name)
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiling tool (e.g. a debugger) owns the hook
+        profiler = None
+    torch_profile = _start_torch_profile(session)
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        end = time.perf_counter()
+        _cprofile_lock.release()
+        session.add_span(name, start, end, threading.current_thread().name)
+        if profiler is not None:
+            session.add_stats(profiler)
+        if torch_profile is not None:
+            _stop_torch_profile(session, name, torch_profile)
+
+
+def _start_torch_profile(session):
+    """torch.profiler on CUDA machines, if no other request holds it"""
+    if not session.use_torch:
+        return None
+    try:
+        import torch
+
+        if not torch.cuda.is_available() or not _torch_lock.acquire(blocking=False):
+            return None
+        activities = [
+            torch.profiler.ProfilerActivity.CPU,
+            torch.profiler.ProfilerActivity.CUDA,
+        ]
+        profile = torch.profiler.profile(activities=activities, record_shapes=True)
+        profile.__enter__()
+        return profile
+    except Exception as e:
+        print(f"⚠️ torch profiler unavailable: {str(e)}")
+        if _torch_lock.locked():
+            _torch_lock.release()
+        return None
+
+
+def _stop_torch_profile(session, name, profile):
+    try:
+        profile.__exit__(None, None, None)
+        os.makedirs(session.output_dir, exist_ok=True)
+        path = os.path.join(session.output_dir, f"{session.request_id}.{name}.torch.json")
+        profile.export_chrome_trace(path)
+        session.torch_traces.append(path)
+    except Exception as e:
+        print(f"⚠️ torch profile export failed: {str(e)}")
+    finally:
+        _torch_lock.release()
+
+
+def _collapsed_stacks(stats):
+    """
+    Approximate collapsed stacks ("a;b;c micros") from cProfile stats
+
+    cProfile keeps caller edges rather than full stacks, so time in a
+    function is split between its callers in proportion to each edge.
+    """
+    children = {}
+    for func, (_, _, _, _, callers) in stats.stats.items():
+        for caller, edge in callers.items():
+            children.setdefault(caller, []).append((func, edge))
+
+    roots = [func for func, entry in stats.stats.items() if not entry[4]]
+    totals = {}
+
+    def label(func):
+        filename, line, function = func
+        return f"{function} ({os.path.basename(filename)}:{line})"
+
+    def walk(func, path, budget):
+        # budget: seconds of func's inclusive time spent under this path
+        _, _, own_time, inclusive, _ = stats.stats[func]
+        stack = path + (label(func),)
+        scale = budget / inclusive if inclusive else 0.0
+        key = ";".join(stack)
+        totals[key] = totals.get(key, 0.0) + own_time * scale
+        if len(stack) >= _MAX_STACK_DEPTH:
+            return
+        for child, edge in children.get(func, ()):
+            if label(child) not in stack:
+                walk(child, stack, edge[3] * scale)
+
+    for root in roots:
+        walk(root, (), stats.stats[root][3])
+
+    return [
+        (stack, int(round(seconds * 1e6)))
+        for stack, seconds in sorted(totals.items())
+        if seconds * 1e6 >= 1
+    ]
+
+
+def _call_params(fn, args, kwargs):
+    try:
+        bound = inspect.signature(fn).bind_partial(*args, **kwargs)
+        return dict(bound.arguments)
+    except TypeError:
+        return dict(kwargs)
+
+
+def _tag_params(params):
+    """Keep the scalar parameters; tensors and images aren't useful tags"""
+    return {
+        key: value
+        for key, value in params.items()
+        if isinstance(value, (str, int, float, bool)) and key != "self"
+    }
@@ -0,0 +1,139 @@
+"""
+Quality Gate
+Cheap CPU checks on a segmented sticker before it is exported
+"""
+
+import cv2
+import numpy as np
+import torch
+
+# Mask checks run on a copy no larger than this per side
+_CHECK_SIDE = 256
+
+DEFAULT_QUALITY_THRESHOLDS = {
+    # Share of the frame the subject may cover
+    "min_coverage": 0.05,
+    "max_coverage": 0.85,
+    # Share of any one frame side the subject may touch
+    "max_edge_touch": 0.02,
+    # Separate blobs allowed; blobs under blob_min_fraction of the
+    # largest (stray specks, small accessories) don't count
+    "max_blobs": 1,
+    "blob_min_fraction": 0.15,
+    # Overlap with SAM2Segmenter's circular fallback above which the mask
+    # is taken to be that fallback
+    "fallback_iou": 0.95,
+}
+
+# Seed stride between retries, so retries of sequentially seeded rows
+# don't land on each other's seeds
+_SEED_STRIDE = 1_000_003
+
+
+class QualityRejected(Exception):
+    """Raised when every attempt at a sticker failed the quality gate"""
+
+    def __init__(self, rejections):
+        reasons = sorted({reason for entry in rejections for reason in entry["reasons"]})
+        super().__init__(
+            f"Quality gate rejected all {len(rejections)} attempt(s): {', '.join(reasons)}"
+        )
+        self.rejections = rejections
+
+
+def check_sticker(mask, method=None, thresholds=None):
+    """
+    Score a segmentation mask for the usual signs of a bad generation
+
+    Args:
+        mask: Alpha/mask as a tensor or array, any leading batch dims,
+            float 0-1 or uint8
+        method: Segmentation method if known ("sam2", "rembg", "fallback")
+        thresholds: Overrides for DEFAULT_QUALITY_THRESHOLDS
+
+    Returns:
+        Dict with passed, reasons (list of codes: fallback_mask,
+        coverage_low, coverage_high, touches_edge, multiple_blobs) and the
+        scores behind them
+    """
+    limits = dict(DEFAULT_QUALITY_THRESHOLDS, **(thresholds or {}))
+    binary = _binary_mask(mask)
+    height, width = binary.shape
+
+    coverage = float(binary.mean())
+    edge_touch = max(
+        float(binary[0].mean()),
+        float(binary[-1].mean()),
+        float(binary[:, 0].mean()),
+        float(binary[:, -1].mean()),
+    )
+
+    count, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    blobs = int((areas >= areas.max() * limits["blob_min_fraction"]).sum()) if count > 1 else 0
+
+    fallback_iou = _fallback_overlap(binary)
+
+    scores = {
+        "coverage": round(coverage, 4),
+        "edge_touch": round(edge_touch, 4),
+        "blobs": blobs,
+        "fallback_iou": round(fallback_iou, 4),
+    }
+
+    reasons = []
+    if method == "fallback" or fallback_iou >= limits["fallback_iou"]:
+        reasons.append("fallback_mask")
+    if coverage < limits["min_coverage"]:
+        reasons.append("coverage_low")
+    elif coverage > limits["max_coverage"]:
+        reasons.append("coverage_high")
+    if edge_touch > limits["max_edge_touch"]:
+        reasons.append("touches_edge")
+    if blobs > limits["max_blobs"]:
+        reasons.append("multiple_blobs")
+
+    return {"passed": not reasons, "reasons": reasons, "scores": scores}
+
+
+def rejection(seed, verdict):
+    """Record of one rejected attempt for results and job events"""
+    return {"seed": seed, "reasons": verdict["reasons"], "scores": verdict["scores"]}
+
+
+def retry_seed(seed, attempt):
+    """Seed for the attempt-th retry of a rejected seed"""
+    return (seed + attempt * _SEED_STRIDE) % 2**32
+
+
+def _binary_mask(mask):
+    """Foreground (alpha > 0.5) as uint8 0/1, shrunk to at most _CHECK_SIDE"""
+    if isinstance(mask, torch.Tensor):
+        mask = mask.detach().cpu().numpy()
+    mask = np.asarray(mask)
+    mask = mask.reshape(mask.shape[-2:])
+    if mask.dtype == np.uint8:
+        mask = mask.astype(np.float32) / 255.0
+    else:
+        mask = mask.astype(np.float32, copy=False)
+
+    height, width = mask.shape
+    scale = _CHECK_SIDE / max(height, width)
+    if scale < 1:
+        size = (max(int(width * scale), 1), max(int(height * scale), 1))
+        mask = cv2.resize(mask, size, interpolation=cv2.INTER_AREA)
+    return (mask > 0.5).astype(np.uint8)
+
+
+def _fallback_overlap(binary):
+    """IoU with the centered circle SAM2Segmenter falls back to"""
+    height, width = binary.shape
+    y, x = np.ogrid[:height, :width]
+    radius = min(width, height) / 3
+    circle = (x - width // 2) ** 2 + (y - height // 2) ** 2 <= radius**2
+
+    foreground = binary.astype(bool)
+    union = np.logical_or(foreground, circle).sum()
+    if union == 0:
+        return 0.0
+    return float(np.logical_and(foreground, circle).sum() / union)
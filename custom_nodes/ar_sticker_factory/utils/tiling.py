@@ -0,0 +1,226 @@
+"""
+Tiling
+Bounded-memory tiled execution of the CPU post-processing stages
+"""
+
+import numpy as np
+import cv2
+import torch
+from PIL import Image, ImageEnhance
+
+# Rows/columns per tile; a 1024² float32 tile is 4 MB per channel
+DEFAULT_TILE_SIZE = 1024
+
+# Frames larger than this are tiled automatically (2048², the largest
+# generator output); smaller ones take the whole-frame path
+TILED_MIN_PIXELS = 2048 * 2048
+
+# Closing then opening with a 3x3 kernel reads 4 pixels beyond each output
+# pixel: one per dilate/erode pass
+_MORPHOLOGY_HALO = 4
+
+
+def use_tiles(height, width, tile_size=0):
+    """
+    Decide whether a frame should be processed in tiles
+
+    Args:
+        tile_size: > 0 forces tiling, 0 tiles frames above TILED_MIN_PIXELS,
+            < 0 never tiles
+    """
+    if tile_size > 0:
+        return True
+    if tile_size < 0:
+        return False
+    return height * width > TILED_MIN_PIXELS
+
+
+def tile_size_for(tile_size):
+    """Tile size to use for a use_tiles() setting"""
+    return tile_size if tile_size > 0 else DEFAULT_TILE_SIZE
+
+
+def iter_tiles(height, width, tile_size=DEFAULT_TILE_SIZE):
+    """
+    Yield tile boxes in row-major order
+
+    Yields:
+        (y0, y1, x0, x1) covering the frame without overlap
+    """
+    for y0 in range(0, height, tile_size):
+        y1 = min(y0 + tile_size, height)
+        for x0 in range(0, width, tile_size):
+            yield y0, y1, x0, min(x0 + tile_size, width)
+
+
+def iter_bands(height, band_rows=DEFAULT_TILE_SIZE):
+    """Yield (y0, y1) row ranges covering the frame"""
+    for y0 in range(0, height, band_rows):
+        yield y0, min(y0 + band_rows, height)
+
+
+def iter_alpha_bands(mask, padding=10, blur_radius=2, tile_size=DEFAULT_TILE_SIZE):
+    """
+    Smooth a mask tile by tile, one band of tile rows at a time
+
+    Each tile is read with a halo wide enough for the morphology and blur
+    kernels, so the result is identical to the whole-frame
+    process_alpha_channel with no seams. The frame's zero padding is
+    reproduced only on the sides where a tile touches the frame border.
+
+    Args:
+        mask: (H, W) mask, float 0-1, bool or uint8
+        padding: Zero border added around the frame before blurring
+        blur_radius: Gaussian blur radius for edge smoothing
+        tile_size: Tile side in pixels
+
+    Yields:
+        (y0, y1, uint8 alpha rows y0:y1)
+    """
+    height, width = mask.shape[:2]
+    halo = _MORPHOLOGY_HALO + blur_radius
+    kernel = np.ones((3, 3), np.uint8)
+    ksize = (blur_radius * 2 + 1, blur_radius * 2 + 1)
+
+    for y0, y1 in iter_bands(height, tile_size):
+        band = np.empty((y1 - y0, width), np.uint8)
+        for x0 in range(0, width, tile_size):
+            x1 = min(x0 + tile_size, width)
+            top, bottom = max(y0 - halo, 0), min(y1 + halo, height)
+            left, right = max(x0 - halo, 0), min(x1 + halo, width)
+
+            tile = mask[top:bottom, left:right]
+            if tile.dtype != np.uint8:
+                tile = (tile * 255).astype(np.uint8)
+
+            tile = cv2.morphologyEx(tile, cv2.MORPH_CLOSE, kernel)
+            tile = cv2.morphologyEx(tile, cv2.MORPH_OPEN, kernel)
+
+            pads = [0, 0, 0, 0]
+            if padding > 0:
+                pads = [
+                    padding if top == 0 else 0,
+                    padding if bottom == height else 0,
+                    padding if left == 0 else 0,
+                    padding if right == width else 0,
+                ]
+                tile = cv2.copyMakeBorder(tile, *pads, cv2.BORDER_CONSTANT, value=0)
+
+            tile = cv2.GaussianBlur(tile, ksize, 0)
+
+            row = y0 - top + pads[0]
+            col = x0 - left + pads[2]
+            band[:, x0:x1] = tile[row : row + (y1 - y0), col : col + (x1 - x0)]
+        yield y0, y1, band
+
+
+def process_alpha_channel_tiled(mask, padding=10, blur_radius=2, tile_size=DEFAULT_TILE_SIZE):
+    """
+    Tiled process_alpha_channel
+
+    Only the float32 result is frame-sized; the uint8 working copies,
+    morphology and blur buffers are per tile.
+
+    Returns:
+        Processed alpha channel as a float32 array in 0-1
+    """
+    result = np.empty(mask.shape[:2], np.float32)
+    for y0, y1, band in iter_alpha_bands(mask, padding, blur_radius, tile_size):
+        np.divide(band, np.float32(255.0), out=result[y0:y1], dtype=np.float32)
+    return result
+
+
+def to_uint8(values, tile_size=DEFAULT_TILE_SIZE):
+    """
+    (values * 255).astype(uint8) one band of rows at a time
+
+    Args:
+        values: Float 0-1 tensor or array, (1, H, W, ...) or (H, W, ...)
+
+    Returns:
+        uint8 array without the batch dimension
+    """
+    if isinstance(values, torch.Tensor):
+        values = values.detach().cpu().numpy()
+    if values.ndim == 4:
+        values = values[0]
+    result = np.empty(values.shape, np.uint8)
+    for y0, y1 in iter_bands(values.shape[0], tile_size):
+        result[y0:y1] = (values[y0:y1] * 255).astype(np.uint8)
+    return result
+
+
+def to_float_tensor(pixels, tile_size=DEFAULT_TILE_SIZE):
+    """
+    uint8 (H, W, C) pixels to a (1, H, W, C) float32 IMAGE tensor in 0-1
+
+    Converts band by band into the output instead of going through a
+    frame-sized astype copy.
+    """
+    pixels = np.asarray(pixels)
+    result = np.empty(pixels.shape, np.float32)
+    for y0, y1 in iter_bands(pixels.shape[0], tile_size):
+        np.divide(pixels[y0:y1], np.float32(255.0), out=result[y0:y1], dtype=np.float32)
+    return torch.from_numpy(result)[None,]
+
+
+def apply_mask_tiled(pixels, mask, tile_size=DEFAULT_TILE_SIZE):
+    """
+    Build an RGBA uint8 array from RGB(A) pixels and a mask, band by band
+
+    The alpha is mask.astype(uint8) * 255, as SAM2Segmenter has always
+    written it.
+
+    Returns:
+        (H, W, 4) uint8 array
+    """
+    pixels = np.asarray(pixels)
+    height, width = pixels.shape[:2]
+    result = np.empty((height, width, 4), np.uint8)
+    for y0, y1 in iter_bands(height, tile_size):
+        result[y0:y1, :, :3] = pixels[y0:y1, :, :3]
+        result[y0:y1, :, 3] = mask[y0:y1].astype(np.uint8) * 255
+    return result
+
+
+def enhance_tiled(image, contrast=None, saturation=None, tile_size=DEFAULT_TILE_SIZE):
+    """
+    ImageEnhance.Contrast then ImageEnhance.Color, tile by tile
+
+    Contrast blends towards the mean gray of the whole image, so a first
+    pass sums the grayscale histogram of every tile; the blend itself and
+    the saturation step are per pixel. The result matches the untiled
+    enhancers exactly.
+
+    Args:
+        image: PIL Image
+        contrast: Contrast factor, None to skip
+        saturation: Color factor, None to skip
+
+    Returns:
+        Enhanced PIL Image
+    """
+    width, height = image.size
+    boxes = [(x0, y0, x1, y1) for y0, y1, x0, x1 in iter_tiles(height, width, tile_size)]
+
+    mean = None
+    if contrast is not None:
+        histogram = np.zeros(256, np.int64)
+        for box in boxes:
+            histogram += np.asarray(image.crop(box).convert("L").histogram(), np.int64)
+        mean = int((histogram * np.arange(256)).sum() / histogram.sum() + 0.5)
+
+    result = Image.new(image.mode, image.size)
+    for box in boxes:
+        tile = image.crop(box)
+        if contrast is not None:
+            degenerate = Image.new("L", tile.size, mean)
+            if degenerate.mode != tile.mode:
+                degenerate = degenerate.convert(tile.mode)
+            if "A" in tile.getbands():
+                degenerate.putalpha(tile.getchannel("A"))
+            tile = Image.blend(degenerate, tile, contrast)
+        if saturation is not None:
+            tile = ImageEnhance.Color(tile).enhance(saturation)
+        result.paste(tile, box)
+    return result
@@ -3,10 +3,14 @@ USDZ Creation Utilities
 Create AR-ready USDZ files from images
 """
 
+import functools
 import os
-import tempfile
+import re
+import string
 from PIL import Image
 import numpy as np
+from .png_encoding import encode_png, DEFAULT_PNG_PROFILE
+from .usdz_packaging import write_usdz
 
 try:
     from pxr import Usd, UsdGeom, Sdf, UsdShade, Gf
@@ -14,184 +18,335 @@ try:
     USD_AVAILABLE = True
 except ImportError:
     USD_AVAILABLE = False
-    print("USD not available. Install with: conda install -c conda-forge usd-core")
-
-
-def create_usdz_from_image(image, output_path, scale=0.1, material_type="matte", ar_behavior="billboard"):
+    print("USD not available, writing USDZ layers as plain USDA text. "
+          "Install with: conda install -c conda-forge usd-core")
+
+# File names inside the USDZ package
+LAYER_NAME = "sticker.usda"
+TEXTURE_NAME = "texture.png"
+
+# (roughness, metallic) per material type
+MATERIAL_PRESETS = {
+    "matte": (0.8, 0.0),  # Slightly less rough for AR
+    "glossy": (0.1, 0.0),
+    "metallic": (0.3, 0.8),  # More realistic metallic
+}
+
+# UV coordinates (flipped for AR compatibility)
+TEX_COORDS = [(0, 1), (1, 1), (1, 0), (0, 0)]
+
+
+def create_usdz_from_image(
+    image,
+    output_path,
+    scale=0.1,
+    material_type="matte",
+    ar_behavior="billboard",
+    png_profile=DEFAULT_PNG_PROFILE,
+    stats=None,
+):
     """
     Create USDZ file from PIL Image for AR viewing with AR-specific optimizations
 
+    The layer and texture are assembled in memory and packaged as a
+    self-contained USDZ. Works without the USD library by writing the
+    layer as USDA text.
+
     Args:
         image: PIL Image (RGB or RGBA)
-        output_path: Output path for USDZ file
+        output_path: Output path for USDZ file, or a writable binary buffer
         scale: Scale factor for AR object (in meters)
         material_type: Material type (matte, glossy, metallic)
         ar_behavior: AR behavior (billboard, fixed, physics)
+        png_profile: PNG encoding profile for the texture (fast, balanced, smallest)
+        stats: Optional dict updated with the texture encoding stats
 
     Returns:
         Boolean indicating success
     """
-    if not USD_AVAILABLE:
-        print("USD library not available for USDZ export")
-        return False
-
     try:
-        # Create temporary directory for intermediate files
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # Save image as optimized PNG
-            image_path = os.path.join(temp_dir, "texture.png")
-            if image.mode != "RGBA":
-                image = image.convert("RGBA")
-            
-            # Optimize image for AR
-            image = _optimize_image_for_ar(image)
-            image.save(image_path, "PNG", optimize=True)
-
-            # Create USD stage directly  
-            stage = Usd.Stage.CreateNew(output_path)
-            stage.SetStartTimeCode(1)
-            stage.SetEndTimeCode(1)
-            
-            # Set up root prim with AR metadata
-            root_prim = stage.DefinePrim("/Root", "Xform")
-            stage.SetDefaultPrim(root_prim)
-            
-            # Add AR QuickLook metadata
-            root_prim.SetMetadata("customData", {
-                "arQuickLookCompatible": True,
-                "realWorldScale": scale,
-                "behavior": ar_behavior
-            })
-
-            # Create mesh geometry
-            mesh_prim = stage.DefinePrim("/Root/Sticker", "Mesh")
-            mesh = UsdGeom.Mesh(mesh_prim)
-
-            # Define quad geometry optimized for AR
-            width, height = image.size
-            aspect_ratio = height / width
-
-            # Create geometry with correct Y-up orientation for AR
-            if ar_behavior == "billboard":
-                # Billboard: Y-up, faces camera (AR Quick Look compatible)
-                points = [
-                    (-scale, 0, -scale * aspect_ratio),  # Bottom-left
-                    (scale, 0, -scale * aspect_ratio),   # Bottom-right  
-                    (scale, 0, scale * aspect_ratio),    # Top-right
-                    (-scale, 0, scale * aspect_ratio),   # Top-left
-                ]
-                # Add billboard constraint
-                mesh_prim.SetMetadata("customData", {"billboard": True})
-            else:
-                # Fixed: maintain Y-up standard orientation
-                points = [
-                    (-scale, -scale * aspect_ratio, 0),  # Bottom-left
-                    (scale, -scale * aspect_ratio, 0),   # Bottom-right
-                    (scale, scale * aspect_ratio, 0),    # Top-right
-                    (-scale, scale * aspect_ratio, 0),   # Top-left
-                ]
-
-            # Set mesh attributes
-            mesh.CreatePointsAttr(points)
-            mesh.CreateFaceVertexCountsAttr([4])  # Quad
-            mesh.CreateFaceVertexIndicesAttr([0, 1, 2, 3])
-            
-            # Normals for proper AR lighting (Y-up compatible)
-            if ar_behavior == "billboard":
-                # Billboard faces up (+Y normal)
-                normals = [(0, 1, 0), (0, 1, 0), (0, 1, 0), (0, 1, 0)]
-            else:
-                # Fixed faces viewer (+Z normal)
-                normals = [(0, 0, 1), (0, 0, 1), (0, 0, 1), (0, 0, 1)]
-            mesh.CreateNormalsAttr(normals)
-            mesh.SetNormalsInterpolation(UsdGeom.Tokens.vertex)
-
-            # UV coordinates (flipped for AR compatibility)
-            texCoords = [(0, 1), (1, 1), (1, 0), (0, 0)]
-            texCoordsPrimvar = UsdGeom.PrimvarsAPI(mesh_prim).CreatePrimvar(
-                "st", Sdf.ValueTypeNames.TexCoord2fArray, UsdGeom.Tokens.vertex
-            )
-            texCoordsPrimvar.Set(texCoords)
-
-            # Create AR-optimized material
-            material_prim = stage.DefinePrim("/Root/Material", "Material")
-            material = UsdShade.Material(material_prim)
-
-            # Create surface shader with AR settings
-            shader_prim = stage.DefinePrim("/Root/Material/Shader", "Shader")
-            shader = UsdShade.Shader(shader_prim)
-            shader.CreateIdAttr("UsdPreviewSurface")
-
-            # Set material properties for AR
-            diffuse_color = shader.CreateInput("diffuseColor", Sdf.ValueTypeNames.Color3f)
-            roughness = shader.CreateInput("roughness", Sdf.ValueTypeNames.Float)
-            metallic = shader.CreateInput("metallic", Sdf.ValueTypeNames.Float)
-            opacity = shader.CreateInput("opacity", Sdf.ValueTypeNames.Float)
-            
-            # Enable alpha blending for transparency
-            shader.CreateInput("useSpecularWorkflow", Sdf.ValueTypeNames.Int).Set(1)
-
-            # Set material properties based on type
-            if material_type == "matte":
-                roughness.Set(0.8)  # Slightly less rough for AR
-                metallic.Set(0.0)
-            elif material_type == "glossy":
-                roughness.Set(0.1)
-                metallic.Set(0.0)
-            elif material_type == "metallic":
-                roughness.Set(0.3)  # More realistic metallic
-                metallic.Set(0.8)
-
-            # Create texture reader with AR optimization
-            tex_reader_prim = stage.DefinePrim("/Root/Material/TextureReader", "Shader")
-            tex_reader = UsdShade.Shader(tex_reader_prim)
-            tex_reader.CreateIdAttr("UsdUVTexture")
-
-            # Set texture file with wrap mode
-            tex_file_input = tex_reader.CreateInput("file", Sdf.ValueTypeNames.Asset)
-            tex_file_input.Set(image_path)
-            
-            # Set texture wrapping for AR
-            tex_reader.CreateInput("wrapS", Sdf.ValueTypeNames.Token).Set("clamp")
-            tex_reader.CreateInput("wrapT", Sdf.ValueTypeNames.Token).Set("clamp")
-
-            # Connect texture to material
-            tex_output = tex_reader.CreateOutput("rgb", Sdf.ValueTypeNames.Float3)
-            diffuse_color.ConnectToSource(tex_output)
-
-            # Handle alpha channel for AR transparency
-            if image.mode == "RGBA":
-                alpha_output = tex_reader.CreateOutput("a", Sdf.ValueTypeNames.Float)
-                opacity.ConnectToSource(alpha_output)
-                
-                # Enable transparency in AR
-                shader.CreateInput("opacityThreshold", Sdf.ValueTypeNames.Float).Set(0.01)
-
-            # Connect shader to material
-            surface_output = material.CreateSurfaceOutput()
-            shader_output = shader.CreateOutput("surface", Sdf.ValueTypeNames.Token)
-            surface_output.ConnectToSource(shader_output)
-
-            # Bind material to mesh
-            UsdShade.MaterialBindingAPI(mesh_prim).Bind(material)
-            
-            # Add physics if requested
-            if ar_behavior == "physics":
-                # Add collision shape
-                mesh_prim.GetAttribute("physics:collisionEnabled").Set(True)
-                mesh_prim.GetAttribute("physics:rigidBodyEnabled").Set(True)
-
-            # Save stage with AR optimization
-            stage.GetRootLayer().Save()
+        if image.mode != "RGBA":
+            image = image.convert("RGBA")
 
+        # Optimize image for AR and encode the texture in memory
+        image = _optimize_image_for_ar(image)
+        texture, encode_stats = encode_png(image, png_profile)
+        if stats is not None:
+            stats.update(encode_stats)
+
+        width, height = image.size
+        points, _ = _quad_geometry(scale, height / width, ar_behavior)
+
+        # Only the varying values are substituted into a cached layer
+        layer = _layer_template(ar_behavior, material_type).substitute(
+            points=_usda_array(points), scale=_usda_number(scale)
+        )
+
+        write_usdz(
+            output_path,
+            [(LAYER_NAME, layer.encode("utf-8")), (TEXTURE_NAME, texture)],
+        )
+
+        if isinstance(output_path, (str, os.PathLike)):
             print(f"✅ AR-optimized USDZ created: {output_path}")
-            return True
+        return True
 
     except Exception as e:
         print(f"❌ Error creating USDZ: {str(e)}")
         return False
 
 
+def _quad_geometry(scale, aspect_ratio, ar_behavior):
+    """Quad points and normals with correct Y-up orientation for AR"""
+    if ar_behavior == "billboard":
+        # Billboard: Y-up, faces camera (AR Quick Look compatible)
+        points = [
+            (-scale, 0, -scale * aspect_ratio),  # Bottom-left
+            (scale, 0, -scale * aspect_ratio),   # Bottom-right
+            (scale, 0, scale * aspect_ratio),    # Top-right
+            (-scale, 0, scale * aspect_ratio),   # Top-left
+        ]
+        # Billboard faces up (+Y normal)
+        normals = [(0, 1, 0)] * 4
+    else:
+        # Fixed: maintain Y-up standard orientation
+        points = [
+            (-scale, -scale * aspect_ratio, 0),  # Bottom-left
+            (scale, -scale * aspect_ratio, 0),   # Bottom-right
+            (scale, scale * aspect_ratio, 0),    # Top-right
+            (-scale, scale * aspect_ratio, 0),   # Top-left
+        ]
+        # Fixed faces viewer (+Z normal)
+        normals = [(0, 0, 1)] * 4
+
+    return points, normals
+
+
+@functools.lru_cache(maxsize=None)
+def _layer_template(ar_behavior, material_type):
+    """
+    Build the sticker layer once per (ar_behavior, material_type)
+
+    The prim hierarchy, material network and normals are identical for every
+    sticker with the same behavior and material, so they are authored once
+    per process. Points and realWorldScale become $points and $scale
+    placeholders for per-export substitution.
+    """
+    points, normals = _quad_geometry(1.0, 1.0, ar_behavior)
+    if USD_AVAILABLE:
+        layer = _author_layer_with_usd(
+            points, normals, 1.0, material_type, ar_behavior
+        )
+    else:
+        layer = _author_layer_text(points, normals, 1.0, material_type, ar_behavior)
+
+    layer = layer.replace("$", "$$")
+    layer = re.sub(r"(point3f\[\] points = ).*", r"\1${points}", layer)
+    layer = re.sub(r"(double realWorldScale = ).*", r"\1${scale}", layer)
+    return string.Template(layer)
+
+
+def _author_layer_with_usd(points, normals, scale, material_type, ar_behavior):
+    """Author the sticker layer through the USD API and return it as USDA text"""
+    stage = Usd.Stage.CreateInMemory(LAYER_NAME)
+    stage.SetStartTimeCode(1)
+    stage.SetEndTimeCode(1)
+
+    # Set up root prim with AR metadata
+    root_prim = stage.DefinePrim("/Root", "Xform")
+    stage.SetDefaultPrim(root_prim)
+
+    # Add AR QuickLook metadata
+    root_prim.SetMetadata("customData", {
+        "arQuickLookCompatible": True,
+        "realWorldScale": scale,
+        "behavior": ar_behavior
+    })
+
+    # Create mesh geometry
+    mesh_prim = stage.DefinePrim("/Root/Sticker", "Mesh")
+    mesh = UsdGeom.Mesh(mesh_prim)
+    if ar_behavior == "billboard":
+        # Add billboard constraint
+        mesh_prim.SetMetadata("customData", {"billboard": True})
+
+    # Set mesh attributes
+    mesh.CreatePointsAttr(points)
+    mesh.CreateFaceVertexCountsAttr([4])  # Quad
+    mesh.CreateFaceVertexIndicesAttr([0, 1, 2, 3])
+
+    # Normals for proper AR lighting
+    mesh.CreateNormalsAttr(normals)
+    mesh.SetNormalsInterpolation(UsdGeom.Tokens.vertex)
+
+    texCoordsPrimvar = UsdGeom.PrimvarsAPI(mesh_prim).CreatePrimvar(
+        "st", Sdf.ValueTypeNames.TexCoord2fArray, UsdGeom.Tokens.vertex
+    )
+    texCoordsPrimvar.Set(TEX_COORDS)
+
+    # Create AR-optimized material
+    material_prim = stage.DefinePrim("/Root/Material", "Material")
+    material = UsdShade.Material(material_prim)
+
+    # Create surface shader with AR settings
+    shader_prim = stage.DefinePrim("/Root/Material/Shader", "Shader")
+    shader = UsdShade.Shader(shader_prim)
+    shader.CreateIdAttr("UsdPreviewSurface")
+
+    # Set material properties for AR
+    diffuse_color = shader.CreateInput("diffuseColor", Sdf.ValueTypeNames.Color3f)
+    roughness = shader.CreateInput("roughness", Sdf.ValueTypeNames.Float)
+    metallic = shader.CreateInput("metallic", Sdf.ValueTypeNames.Float)
+    opacity = shader.CreateInput("opacity", Sdf.ValueTypeNames.Float)
+
+    # Enable alpha blending for transparency
+    shader.CreateInput("useSpecularWorkflow", Sdf.ValueTypeNames.Int).Set(1)
+
+    # Set material properties based on type
+    if material_type in MATERIAL_PRESETS:
+        roughness_value, metallic_value = MATERIAL_PRESETS[material_type]
+        roughness.Set(roughness_value)
+        metallic.Set(metallic_value)
+
+    # Create texture reader with AR optimization
+    tex_reader_prim = stage.DefinePrim("/Root/Material/TextureReader", "Shader")
+    tex_reader = UsdShade.Shader(tex_reader_prim)
+    tex_reader.CreateIdAttr("UsdUVTexture")
+
+    # Texture is packaged next to the layer, referenced relatively
+    tex_reader.CreateInput("file", Sdf.ValueTypeNames.Asset).Set(TEXTURE_NAME)
+
+    # Set texture wrapping for AR
+    tex_reader.CreateInput("wrapS", Sdf.ValueTypeNames.Token).Set("clamp")
+    tex_reader.CreateInput("wrapT", Sdf.ValueTypeNames.Token).Set("clamp")
+
+    # Connect texture to material
+    tex_output = tex_reader.CreateOutput("rgb", Sdf.ValueTypeNames.Float3)
+    diffuse_color.ConnectToSource(tex_output)
+
+    # Handle alpha channel for AR transparency
+    alpha_output = tex_reader.CreateOutput("a", Sdf.ValueTypeNames.Float)
+    opacity.ConnectToSource(alpha_output)
+    shader.CreateInput("opacityThreshold", Sdf.ValueTypeNames.Float).Set(0.01)
+
+    # Connect shader to material
+    surface_output = material.CreateSurfaceOutput()
+    shader_output = shader.CreateOutput("surface", Sdf.ValueTypeNames.Token)
+    surface_output.ConnectToSource(shader_output)
+
+    # Bind material to mesh
+    UsdShade.MaterialBindingAPI(mesh_prim).Bind(material)
+
+    # Add physics if requested
+    if ar_behavior == "physics":
+        # Add collision shape
+        for name in ("physics:collisionEnabled", "physics:rigidBodyEnabled"):
+            mesh_prim.CreateAttribute(name, Sdf.ValueTypeNames.Bool).Set(True)
+
+    return stage.GetRootLayer().ExportToString()
+
+
+def _author_layer_text(points, normals, scale, material_type, ar_behavior):
+    """Write the same sticker layer as USDA text when USD is unavailable"""
+    array = _usda_array
+
+    mesh_metadata = ""
+    if ar_behavior == "billboard":
+        mesh_metadata = (
+            " (\n        customData = {\n            bool billboard = 1\n"
+            "        }\n    )"
+        )
+
+    physics = ""
+    if ar_behavior == "physics":
+        physics = (
+            "        custom bool physics:collisionEnabled = 1\n"
+            "        custom bool physics:rigidBodyEnabled = 1\n"
+        )
+
+    metallic_input = roughness_input = ""
+    if material_type in MATERIAL_PRESETS:
+        roughness_value, metallic_value = MATERIAL_PRESETS[material_type]
+        metallic_input = (
+            f"            float inputs:metallic = {_usda_number(metallic_value)}\n"
+        )
+        roughness_input = (
+            f"            float inputs:roughness = {_usda_number(roughness_value)}\n"
+        )
+
+    return f"""#usda 1.0
+(
+    defaultPrim = "Root"
+    endTimeCode = 1
+    startTimeCode = 1
+)
+
+def Xform "Root" (
+    customData = {{
+        bool arQuickLookCompatible = 1
+        string behavior = "{ar_behavior}"
+        double realWorldScale = {_usda_number(scale)}
+    }}
+)
+{{
+    def Mesh "Sticker"{mesh_metadata}
+    {{
+        int[] faceVertexCounts = [4]
+        int[] faceVertexIndices = [0, 1, 2, 3]
+        rel material:binding = </Root/Material>
+        normal3f[] normals = {array(normals)} (
+            interpolation = "vertex"
+        )
+{physics}        point3f[] points = {array(points)}
+        texCoord2f[] primvars:st = {array(TEX_COORDS)} (
+            interpolation = "vertex"
+        )
+    }}
+
+    def Material "Material"
+    {{
+        token outputs:surface.connect = </Root/Material/Shader.outputs:surface>
+
+        def Shader "Shader"
+        {{
+            uniform token info:id = "UsdPreviewSurface"
+            color3f inputs:diffuseColor.connect = </Root/Material/TextureReader.outputs:rgb>
+{metallic_input}            float inputs:opacity.connect = </Root/Material/TextureReader.outputs:a>
+            float inputs:opacityThreshold = 0.01
+{roughness_input}            int inputs:useSpecularWorkflow = 1
+            token outputs:surface
+        }}
+
+        def Shader "TextureReader"
+        {{
+            uniform token info:id = "UsdUVTexture"
+            asset inputs:file = @{TEXTURE_NAME}@
+            token inputs:wrapS = "clamp"
+            token inputs:wrapT = "clamp"
+            float outputs:a
+            float3 outputs:rgb
+        }}
+    }}
+}}
+
+"""
+
+
+def _usda_array(values):
+    """Format a list of tuples as a USDA array"""
+    return "[" + ", ".join(
+        "(" + ", ".join(_usda_number(v) for v in value) + ")" for value in values
+    ) + "]"
+
+
+def _usda_number(value):
+    """Format a number the way USDA writes it (no trailing .0 on integers)"""
+    value = float(value)
+    if value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
 def _optimize_image_for_ar(image):
     """Optimize image specifically for AR viewing"""
     # Ensure power-of-2 dimensions for GPU efficiency
@@ -217,7 +372,25 @@ def _optimize_image_for_ar(image):
     return image
 
 
-def create_fallback_obj(image, output_path, scale=0.1):
+def fallback_obj_paths(output_path):
+    """
+    Files written by create_fallback_obj for an output path
+
+    Returns:
+        Tuple of (obj_path, mtl_path, texture_path)
+    """
+    base_path = os.path.splitext(output_path)[0]
+    return base_path + ".obj", base_path + ".mtl", base_path + "_texture.png"
+
+
+def create_fallback_obj(
+    image,
+    output_path,
+    scale=0.1,
+    png_profile=DEFAULT_PNG_PROFILE,
+    stats=None,
+    texture_bytes=None,
+):
     """
     Create OBJ file as fallback when USD is not available
 
@@ -225,20 +398,26 @@ def create_fallback_obj(image, output_path, scale=0.1):
         image: PIL Image
         output_path: Output path (will be changed to .obj)
         scale: Scale factor
+        png_profile: PNG encoding profile for the texture (fast, balanced, smallest)
+        stats: Optional dict updated with the texture encoding stats
+        texture_bytes: PNG already encoded from image; written as-is
+            instead of encoding the texture again
 
     Returns:
         Boolean indicating success
     """
     try:
-        # Change extension to .obj
-        obj_path = output_path.replace(".usdz", ".obj")
-        mtl_path = output_path.replace(".usdz", ".mtl")
-        texture_path = output_path.replace(".usdz", "_texture.png")
+        obj_path, mtl_path, texture_path = fallback_obj_paths(output_path)
 
         # Save texture
-        if image.mode != "RGBA":
-            image = image.convert("RGBA")
-        image.save(texture_path, "PNG")
+        if texture_bytes is None:
+            if image.mode != "RGBA":
+                image = image.convert("RGBA")
+            texture_bytes, encode_stats = encode_png(image, png_profile)
+            if stats is not None:
+                stats.update(encode_stats)
+        with open(texture_path, "wb") as f:
+            f.write(texture_bytes)
 
         # Create OBJ file
         width, height = image.size
@@ -0,0 +1,58 @@
+"""
+USDZ Packaging Utilities
+Write spec-compliant USDZ archives without touching intermediate files
+"""
+
+import os
+import struct
+import zipfile
+
+# USDZ requires every file's data to start on a 64-byte boundary
+USDZ_ALIGNMENT = 64
+
+# Extra field id used for alignment padding (same as Pixar's usdzip)
+_PADDING_EXTRA_ID = 0x1986
+
+# Fixed timestamp so identical inputs produce byte-identical packages
+_ZIP_EPOCH = (1980, 1, 1, 0, 0, 0)
+
+_LOCAL_HEADER_SIZE = 30
+_EXTRA_HEADER_SIZE = 4
+
+
+def write_usdz(output, entries):
+    """
+    Write a USDZ package: an uncompressed zip with 64-byte aligned file data
+
+    Args:
+        output: Output file path or seekable, writable binary file object
+        entries: Iterable of (name, bytes) pairs; the first entry must be
+            the root USD layer
+
+    Returns:
+        Number of bytes written
+    """
+    if isinstance(output, (str, os.PathLike)):
+        with open(output, "wb") as f:
+            return write_usdz(f, entries)
+
+    start = output.tell()
+
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_STORED) as archive:
+        for name, data in entries:
+            info = zipfile.ZipInfo(name, date_time=_ZIP_EPOCH)
+            info.compress_type = zipfile.ZIP_STORED
+            info.extra = _alignment_padding(
+                output.tell() - start, len(name.encode("utf-8"))
+            )
+            archive.writestr(info, data)
+
+    return output.tell() - start
+
+
+def _alignment_padding(offset, name_length):
+    """Build an extra field that pushes the file data onto an aligned offset"""
+    header_size = _LOCAL_HEADER_SIZE + name_length + _EXTRA_HEADER_SIZE
+    pad = -(offset + header_size) % USDZ_ALIGNMENT
+    return struct.pack("<HH", _PADDING_EXTRA_ID, pad) + b"\0" * pad
+
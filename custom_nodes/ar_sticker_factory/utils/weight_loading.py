@@ -0,0 +1,537 @@
+"""
+Weight Loading
+Memory-mapped model weights, shared loaded models and cold-start timings
+"""
+
+import contextvars
+import json
+import mmap
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, suppress
+from functools import partial
+
+import numpy as np
+import torch
+
+# Readiness marker written once warm standby has finished preloading
+DEFAULT_READY_FILE = "/tmp/sticker-ready"
+
+# safetensors dtype names -> torch dtypes
+_SAFETENSORS_DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+for _name, _attr in (("F8_E4M3", "float8_e4m3fn"), ("F8_E5M2", "float8_e5m2")):
+    if hasattr(torch, _attr):
+        _SAFETENSORS_DTYPES[_name] = getattr(torch, _attr)
+
+# Model whose load is currently being timed in this thread
+_current_model = contextvars.ContextVar("current_model", default=None)
+
+# Unhooked loaders; install_load_hooks replaces the module attributes
+_torch_load = torch.load
+_safetensors_load_file = None
+_hooks_installed = False
+_hooks_lock = threading.Lock()
+
+
+def load_weights(path, device="cpu", prefetch=True):
+    """
+    Load a state dict without reading the whole file into process memory
+
+    .safetensors files are parsed directly over a copy-on-write mmap, so
+    tensors are views of the page cache. Pickled checkpoints (.ckpt, .pt,
+    .pth, .bin) go through torch.load(mmap=True), falling back to a normal
+    load for the legacy non-zip format.
+
+    Time is split into I/O (faulting the file into the page cache),
+    deserialize (building tensors) and device transfer. It is added to the
+    model being timed by track_model, or recorded under the file name.
+
+    Args:
+        path: Weight file
+        device: Where the tensors should end up
+        prefetch: Read the file into the page cache up front; without it
+            pages are read lazily and I/O shows up in the later phases
+
+    Returns:
+        Dict of name -> tensor
+    """
+    path = os.fspath(path)
+    if path.endswith(".safetensors"):
+        return _timed_load(path, device, partial(_load_safetensors, path, prefetch))
+    return _timed_load(path, device, partial(_load_torch, path, prefetch))
+
+
+def _timed_load(path, device, load):
+    """Run load(timings), move the result to device and record the file"""
+    timings = {"io_s": 0.0, "deserialize_s": 0.0, "device_s": 0.0}
+    size = os.path.getsize(path)
+
+    state_dict, mapped = load(timings)
+
+    if str(device) != "cpu":
+        start = time.perf_counter()
+        state_dict = {
+            name: tensor.to(device, non_blocking=True) for name, tensor in state_dict.items()
+        }
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        timings["device_s"] = time.perf_counter() - start
+
+    get_load_report().add_file(
+        _current_model.get() or os.path.basename(path), path, size, mapped, timings
+    )
+    return state_dict
+
+
+def _load_safetensors(path, prefetch, timings):
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    if prefetch:
+        _prefetch(buffer)
+    timings["io_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    header_size = int.from_bytes(buffer[:8], "little")
+    header = json.loads(buffer[8 : 8 + header_size])
+    data_start = 8 + header_size
+
+    state_dict = {}
+    for name, entry in header.items():
+        if name == "__metadata__":
+            continue
+        dtype = _SAFETENSORS_DTYPES[entry["dtype"]]
+        begin, end = entry["data_offsets"]
+        shape = entry["shape"]
+        if end == begin:
+            state_dict[name] = torch.empty(shape, dtype=dtype)
+            continue
+        tensor = torch.frombuffer(
+            buffer,
+            dtype=dtype,
+            count=(end - begin) // torch.empty((), dtype=dtype).element_size(),
+            offset=data_start + begin,
+        )
+        state_dict[name] = tensor.reshape(shape)
+    timings["deserialize_s"] = time.perf_counter() - start
+
+    return state_dict, True
+
+
+def _load_torch(path, prefetch, timings, unwrap=True, load_kwargs=None):
+    if prefetch:
+        start = time.perf_counter()
+        with open(path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        _prefetch(buffer)
+        buffer.close()
+        timings["io_s"] = time.perf_counter() - start
+
+    load_kwargs = {"weights_only": True} if load_kwargs is None else load_kwargs
+    start = time.perf_counter()
+    try:
+        state_dict = _torch_load(path, map_location="cpu", mmap=True, **load_kwargs)
+        mapped = True
+    except RuntimeError:
+        # Legacy (pre-zip) checkpoints can't be memory-mapped
+        state_dict = _torch_load(path, map_location="cpu", **load_kwargs)
+        mapped = False
+    timings["deserialize_s"] = time.perf_counter() - start
+
+    if not unwrap:
+        return state_dict, mapped
+    if isinstance(state_dict, dict) and isinstance(state_dict.get("state_dict"), dict):
+        state_dict = state_dict["state_dict"]
+    return state_dict, mapped
+
+
+def _prefetch_file(path, timings):
+    """Fault a whole file into the page cache, timed as I/O"""
+    start = time.perf_counter()
+    if os.path.getsize(path):
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            _prefetch(buffer)
+    timings["io_s"] = time.perf_counter() - start
+
+
+def _prefetch(buffer):
+    """Fault every page of a mapping into the page cache"""
+    if hasattr(buffer, "madvise") and hasattr(mmap, "MADV_WILLNEED"):
+        buffer.madvise(mmap.MADV_WILLNEED)
+    if len(buffer):
+        # Reading one byte per page pulls the whole file through the cache
+        np.frombuffer(buffer, dtype=np.uint8)[:: mmap.PAGESIZE].sum()
+
+
+def install_load_hooks():
+    """
+    Route the model loaders' own checkpoint reads through load_weights
+
+    The SDXL and SAM2 loaders read their weights with
+    safetensors.torch.load_file (diffusers) and torch.load (SAM2). Once the
+    hooks are installed, those calls made inside track_model are memory-
+    mapped and split into I/O, deserialize and device transfer time for the
+    model being loaded. Calls outside track_model, or with arguments the
+    mapped path can't honor (file objects, map_location other than "cpu",
+    extra pickle options), go to the original functions unchanged.
+
+    Installed once per process, on the first ModelCache load.
+    """
+    global _hooks_installed, _safetensors_load_file
+    with _hooks_lock:
+        if _hooks_installed:
+            return
+        torch.load = _torch_load_hook
+        try:
+            import safetensors.torch
+
+            _safetensors_load_file = safetensors.torch.load_file
+            safetensors.torch.load_file = _safetensors_load_file_hook
+        except ImportError:
+            pass
+        _hooks_installed = True
+
+
+def _torch_load_hook(f, map_location=None, *args, **kwargs):
+    if (
+        _current_model.get() is None
+        or args
+        or not isinstance(f, (str, os.PathLike))
+        or str(map_location) != "cpu"
+        or set(kwargs) - {"weights_only", "mmap"}
+    ):
+        return _torch_load(f, map_location, *args, **kwargs)
+
+    path = os.fspath(f)
+    load_kwargs = {key: value for key, value in kwargs.items() if key == "weights_only"}
+    # Callers index into the checkpoint themselves, so return it as saved
+    return _timed_load(
+        path, "cpu", partial(_load_torch, path, True, unwrap=False, load_kwargs=load_kwargs)
+    )
+
+
+def _safetensors_load_file_hook(filename, device="cpu"):
+    if _current_model.get() is None:
+        return _safetensors_load_file(filename, device=device)
+    path = os.fspath(filename)
+    return _timed_load(path, device, partial(_load_safetensors, path, True))
+
+
+def load_rembg_session(model_name="u2net"):
+    """
+    Create a rembg session with the ONNX file read timed separately
+
+    onnxruntime reads the model file itself, so it can't be memory-mapped
+    here. The file is faulted into the page cache first (I/O) and session
+    creation is recorded as deserialize.
+    """
+    from rembg import new_session
+
+    home = os.environ.get(
+        "U2NET_HOME",
+        os.path.join(os.path.expanduser(os.environ.get("XDG_DATA_HOME", "~")), ".u2net"),
+    )
+    path = os.path.join(home, f"{model_name}.onnx")
+    timings = {"io_s": 0.0, "deserialize_s": 0.0, "device_s": 0.0}
+    size = 0
+    if os.path.exists(path):
+        size = os.path.getsize(path)
+        _prefetch_file(path, timings)
+
+    start = time.perf_counter()
+    session = new_session(model_name)
+    timings["deserialize_s"] = time.perf_counter() - start
+
+    get_load_report().add_file(_current_model.get() or model_name, path, size, False, timings)
+    return session
+
+
+class LoadReport:
+    """Per-model cold-start breakdown collected in this process"""
+
+    def __init__(self):
+        self.models = {}
+        self.failed = {}
+        self.preload_wall_s = None
+        self._lock = threading.Lock()
+
+    def _entry(self, name):
+        return self.models.setdefault(
+            name,
+            {
+                "files": [],
+                "bytes": 0,
+                "mmap": None,
+                "io_s": 0.0,
+                "deserialize_s": 0.0,
+                "device_s": 0.0,
+                "total_s": None,
+            },
+        )
+
+    def add_file(self, name, path, size, mapped, timings):
+        with self._lock:
+            entry = self._entry(name)
+            entry["files"].append(path)
+            entry["bytes"] += size
+            entry["mmap"] = mapped if entry["mmap"] is None else entry["mmap"] and mapped
+            for key, value in timings.items():
+                entry[key] += value
+
+    def add_failure(self, name, reason):
+        with self._lock:
+            self.failed[name] = reason
+
+    def set_total(self, name, seconds):
+        with self._lock:
+            self._entry(name)["total_s"] = seconds
+
+    def summary(self):
+        """JSON-serializable breakdown; times rounded to milliseconds"""
+        with self._lock:
+            models = {}
+            for name, entry in self.models.items():
+                entry = dict(entry)
+                phases = entry["io_s"] + entry["deserialize_s"] + entry["device_s"]
+                if entry["total_s"] is None:
+                    # Loaded outside track_model: the phases are the whole load
+                    entry["total_s"] = phases
+                # Loader work outside the weight reads, e.g. building modules
+                # or its own pipeline.to(device)
+                entry["other_s"] = max(entry["total_s"] - phases, 0.0)
+                models[name] = {
+                    key: round(value, 3) if isinstance(value, float) else value
+                    for key, value in entry.items()
+                }
+            return {
+                "models": models,
+                "failed": dict(self.failed),
+                "preload_wall_s": (
+                    round(self.preload_wall_s, 3) if self.preload_wall_s is not None else None
+                ),
+            }
+
+    def print_summary(self):
+        for name, entry in self.summary()["models"].items():
+            if not entry["files"]:
+                # The loader didn't go through load_weights
+                print(f"⏱️  {name}: {entry['total_s']}s total")
+                continue
+            print(
+                f"⏱️  {name}: {entry['total_s']}s total "
+                f"(io {entry['io_s']}s, deserialize {entry['deserialize_s']}s, "
+                f"device {entry['device_s']}s, other {entry['other_s']}s, "
+                f"{entry['bytes'] / 1024**2:.1f} MB, "
+                f"mmap={entry['mmap']})"
+            )
+
+
+@contextmanager
+def track_model(name):
+    """Attribute load_weights calls in the block to one model and time it"""
+    token = _current_model.set(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        get_load_report().set_total(name, time.perf_counter() - start)
+        _current_model.reset(token)
+
+
+class ModelCache:
+    """
+    Loaded models shared by every node instance in the process
+
+    ComfyUI creates node instances freely; without this each one would load
+    its own copy. A model is loaded once, concurrent requests for the same
+    model wait for that load, and a loader returning None is retried on the
+    next request.
+    """
+
+    def __init__(self):
+        self._models = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, name, loader):
+        """
+        Return a loaded model, loading it on first use
+
+        Args:
+            name: Cache key, e.g. "sdxl"
+            loader: Zero-argument callable returning the model
+        """
+        if name in self._models:
+            return self._models[name]
+
+        with self._lock:
+            model_lock = self._locks.setdefault(name, threading.Lock())
+        install_load_hooks()
+        with model_lock:
+            if name not in self._models:
+                with track_model(name):
+                    model = loader()
+                if model is None:
+                    return None
+                self._models[name] = model
+            return self._models[name]
+
+    def loaded(self):
+        return sorted(self._models)
+
+
+def preload_models(loaders, max_workers=None):
+    """
+    Load independent models in parallel into the model cache
+
+    Args:
+        loaders: Dict of model name -> zero-argument loader
+        max_workers: Threads to use; defaults to one per model
+
+    Returns:
+        Dict of name -> model (None where loading failed)
+    """
+    cache = get_model_cache()
+    start = time.perf_counter()
+
+    def load(name, loader):
+        try:
+            model = cache.get(name, loader)
+        except Exception as e:
+            print(f"❌ Error preloading {name}: {str(e)}")
+            get_load_report().add_failure(name, str(e))
+            return None
+        if model is None:
+            get_load_report().add_failure(name, "loader returned None")
+        return model
+
+    with ThreadPoolExecutor(
+        max_workers=max_workers or max(len(loaders), 1), thread_name_prefix="preload"
+    ) as pool:
+        futures = {name: pool.submit(load, name, loader) for name, loader in loaders.items()}
+        models = {name: future.result() for name, future in futures.items()}
+
+    report = get_load_report()
+    report.preload_wall_s = time.perf_counter() - start
+    report.print_summary()
+    print(f"🔥 Preloaded {len(loaders)} model(s) in {report.preload_wall_s:.2f}s")
+    return models
+
+
+def warm_standby_enabled():
+    return os.environ.get("STICKER_WARM_STANDBY", "0").lower() in ("1", "true", "yes")
+
+
+def ready_file():
+    return os.environ.get("STICKER_READY_FILE", DEFAULT_READY_FILE)
+
+
+def mark_ready(report=None):
+    """Write the readiness marker, with the load report as its content"""
+    path = ready_file()
+    with open(path, "w") as f:
+        json.dump(report or get_load_report().summary(), f, indent=2)
+    return path
+
+
+def start_warm_standby():
+    """
+    Preload models before the pod reports ready
+
+    Does nothing unless STICKER_READY_FILE is set. With
+    STICKER_WARM_STANDBY=1 the node models are loaded in a background
+    thread and the readiness marker is written once they are all in memory;
+    if any fails the marker stays absent and the failure is in the load
+    report. Without STICKER_WARM_STANDBY the marker is written straight
+    away, so a readiness probe can check for it.
+    """
+    if "STICKER_READY_FILE" not in os.environ:
+        return None
+
+    with suppress(OSError):
+        os.remove(ready_file())
+
+    if not warm_standby_enabled():
+        mark_ready()
+        return None
+
+    def warm():
+        try:
+            from ..pipeline.backends import NodeBackend
+
+            NodeBackend().preload()
+        except Exception as e:
+            print(f"❌ Error in warm standby: {str(e)}")
+            get_load_report().add_failure("warm_standby", str(e))
+        failed = get_load_report().failed
+        if failed:
+            print(f"❌ Warm standby failed for {', '.join(sorted(failed))}; not marking ready")
+            return
+        mark_ready()
+        print(f"✅ Warm standby complete; marked ready at {ready_file()}")
+
+    thread = threading.Thread(target=warm, name="warm-standby", daemon=True)
+    thread.start()
+    return thread
+
+
+def register_warm_standby():
+    """
+    Run start_warm_standby when the ComfyUI server starts
+
+    The hook is added to the PromptServer's aiohttp startup signals, so only
+    the ComfyUI server process preloads. Other processes that import the
+    package (the bulk runner, the sticker service and its pool workers) have
+    no PromptServer and load nothing; the service preloads through
+    --warm-standby instead.
+
+    Returns:
+        True if the hook was registered
+    """
+    server = sys.modules.get("server")
+    prompt_server = getattr(getattr(server, "PromptServer", None), "instance", None)
+    if prompt_server is None:
+        return False
+
+    async def on_startup(app):
+        start_warm_standby()
+
+    prompt_server.app.on_startup.append(on_startup)
+    return True
+
+
+_cache = None
+_report = None
+_singleton_lock = threading.Lock()
+
+
+def get_model_cache():
+    """Return the process-wide model cache, creating it on first use"""
+    global _cache
+    with _singleton_lock:
+        if _cache is None:
+            _cache = ModelCache()
+        return _cache
+
+
+def get_load_report():
+    """Return the process-wide load report, creating it on first use"""
+    global _report
+    with _singleton_lock:
+        if _report is None:
+            _report = LoadReport()
+        return _report
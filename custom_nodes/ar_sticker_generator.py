@@ -11,10 +11,17 @@ This node generates AR-ready stickers from text prompts using:
 import torch
 import numpy as np
 from PIL import Image
+import hashlib
+import io
 import tempfile
 import os
 from typing import Dict, Any, Tuple, Optional
 
+# Plain package imports: the ar_sticker_factory package defers its node
+# registration, so these don't load the factory nodes or model loaders
+from .ar_sticker_factory.utils.output_store import get_default_store, write_atomic
+from .ar_sticker_factory.utils.tiling import to_uint8
+
 
 class ARStickerGenerator:
     """
@@ -46,13 +53,13 @@ class ARStickerGenerator:
                 "width": ("INT", {
                     "default": 512,
                     "min": 256,
-                    "max": 2048,
+                    "max": 4096,
                     "step": 64
                 }),
                 "height": ("INT", {
                     "default": 512,
                     "min": 256,
-                    "max": 2048,
+                    "max": 4096,
                     "step": 64
                 }),
                 "steps": ("INT", {
@@ -260,47 +267,48 @@ class ARStickerGenerator:
         png_path = None
         usdz_path = None
         
-        # Create output directory
-        output_dir = "output/ar_stickers"
-        os.makedirs(output_dir, exist_ok=True)
-        
-        timestamp = torch.randint(10000, 99999, (1,)).item()
+        # Outputs are named by content hash in the shared sharded store,
+        # so identical stickers are stored once and never collide
+        store = get_default_store()
         
         if export_format in ["png", "both"]:
-            png_path = self._export_png(image, mask, output_dir, timestamp)
+            png_path = self._export_png(image, mask, store)
         
         if export_format in ["usdz", "both"]:
-            usdz_path = self._export_usdz(image, mask, output_dir, timestamp)
+            usdz_path = self._export_usdz(image, mask)
         
         return png_path, usdz_path
     
-    def _export_png(self, image: torch.Tensor, mask: torch.Tensor, output_dir: str, timestamp: int) -> str:
+    def _export_png(self, image: torch.Tensor, mask: torch.Tensor, store) -> str:
         """Export as PNG with transparency."""
         print("💾 Exporting PNG with transparency...")
         
-        # Convert tensor to PIL Image
-        image_np = (image.squeeze(0).cpu().numpy() * 255).astype(np.uint8)
+        # Convert tensor to PIL Image, in bands so 4096² prints don't
+        # allocate a full-frame float copy
+        image_np = to_uint8(image)
         pil_image = Image.fromarray(image_np)
         
         # TODO: Apply mask as alpha channel
         # For now, save as regular PNG
-        png_path = os.path.join(output_dir, f"ar_sticker_{timestamp}.png")
-        pil_image.save(png_path)
+        buffer = io.BytesIO()
+        pil_image.save(buffer, "PNG")
+        png_path = store.put(buffer.getvalue(), ".png")["location"]
         
         print(f"📁 PNG saved: {png_path}")
         return png_path
     
-    def _export_usdz(self, image: torch.Tensor, mask: torch.Tensor, output_dir: str, timestamp: int) -> str:
+    def _export_usdz(self, image: torch.Tensor, mask: torch.Tensor) -> str:
         """Export as USDZ for AR applications."""
         print("🥽 Exporting USDZ for AR...")
         
         # TODO: Implement actual USDZ export with USD/MaterialX
-        # For now, create a placeholder file
-        usdz_path = os.path.join(output_dir, f"ar_sticker_{timestamp}.usdz")
-        
-        # Create placeholder file
-        with open(usdz_path, 'wb') as f:
-            f.write(b"USDZ placeholder - TODO: implement actual USDZ export")
+        # For now, write a placeholder file. It stays out of the content
+        # store, where every placeholder would collapse into one fake
+        # artifact; it is named after the image instead.
+        output_dir = os.path.join("output", "ar_stickers", "placeholders")
+        digest = hashlib.sha256(to_uint8(image).tobytes()).hexdigest()[:16]
+        usdz_path = os.path.join(output_dir, f"ar_sticker_{digest}.usdz")
+        write_atomic(usdz_path, b"USDZ placeholder - TODO: implement actual USDZ export")
         
         print(f"🥽 USDZ placeholder created: {usdz_path}")
         return usdz_path
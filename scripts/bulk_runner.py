@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+AR Sticker Factory - Headless Bulk Runner
+Generate, segment and export stickers for a list of prompts without ComfyUI
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# Make the repository importable when run as a script
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[-1])
+    parser.add_argument(
+        "rows", help="Prompt rows: .csv (with header), .jsonl, or one prompt per line"
+    )
+    parser.add_argument(
+        "--workflow",
+        help="Workflow JSON whose generator/exporter widgets become row defaults",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["nodes", "stub"],
+        default="nodes",
+        help="nodes runs SDXL/SAM2; stub is a CPU stand-in for local testing",
+    )
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument(
+        "--output-layout",
+        choices=["content_addressed", "flat"],
+        default="content_addressed",
+    )
+    parser.add_argument(
+        "--results",
+        default="output/ar_stickers/bulk_results.jsonl",
+        help="Where to write one JSON result per input row",
+    )
+    parser.add_argument(
+        "--journal",
+        help="Job journal path; rerunning with the same journal resumes the run",
+    )
+    parser.add_argument("--limit", type=int, help="Only process the first N rows")
+    parser.add_argument(
+        "--fast-upscale",
+        action="store_true",
+        help="Generate and segment at a lower resolution, then upscale",
+    )
+    parser.add_argument(
+        "--upscaler",
+        help="Upscaler for --fast-upscale: lanczos or comfy:<upscale model file>",
+    )
+    parser.add_argument(
+        "--profile-rate",
+        type=float,
+        help="Fraction of stage calls to profile into STICKER_PROFILE_DIR (0-1)",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    from custom_nodes.ar_sticker_factory.pipeline import (
+        StickerPipeline,
+        defaults_from_workflow,
+        load_rows,
+    )
+
+    if args.profile_rate is not None:
+        from custom_nodes.ar_sticker_factory.utils.profiling import configure
+
+        configure(args.profile_rate)
+
+    rows = load_rows(args.rows)
+    if args.limit:
+        rows = rows[: args.limit]
+
+    defaults = defaults_from_workflow(args.workflow) if args.workflow else {}
+    if args.fast_upscale:
+        defaults["fast_upscale"] = True
+    if args.upscaler:
+        defaults["upscaler"] = args.upscaler
+
+    print("🚀 AR Sticker Factory - Bulk Runner")
+    print(f"📋 {len(rows)} rows, backend={args.backend}, batch_size={args.batch_size}")
+
+    pipeline = StickerPipeline(
+        backend=args.backend,
+        batch_size=args.batch_size,
+        output_layout=args.output_layout,
+        defaults=defaults,
+        journal=args.journal,
+    )
+    try:
+        results, report = pipeline.run(rows)
+    except ValueError as e:
+        print(f"❌ {str(e)}")
+        return 2
+    finally:
+        if pipeline.journal:
+            pipeline.journal.close()
+
+    results_path = Path(args.results)
+    results_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(results_path, "w") as f:
+        for result in results:
+            f.write(json.dumps(result) + "\n")
+
+    print(f"📄 Results: {results_path}")
+    print(json.dumps(report, indent=2))
+
+    return 0 if report["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
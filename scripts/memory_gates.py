@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+AR Sticker Factory - Memory Gates
+Fail when a CPU stage's peak memory at a resolution exceeds its ceiling
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import types
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+# Make the repository importable when run as a script
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# segment_* run SAM2Segmenter's own code for each path: SAM2, the rembg
+# fallback and the geometric fallback. Only the model calls are stubbed.
+STAGES = ("segment_sam2", "segment_rembg", "segment_fallback", "alpha", "export")
+
+# Peak RSS growth allowed per stage and square resolution, in MB. Measured
+# with the model stand-ins plus ~30% headroom (at least MIN_CEILING_MB); use
+# --update when a change is meant to move them.
+CEILINGS_MB = {
+    "segment_sam2": {512: 16, 1024: 64, 2048: 252, 4096: 924},
+    "segment_rembg": {512: 16, 1024: 61, 2048: 241, 4096: 878},
+    "segment_fallback": {512: 19, 1024: 73, 2048: 214, 4096: 795},
+    "alpha": {512: 8, 1024: 16, 2048: 50, 4096: 84},
+    "export": {512: 8, 1024: 30, 2048: 110, 4096: 177},
+}
+MIN_CEILING_MB = 8
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[-1])
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[512, 1024, 2048, 4096],
+        help="Square resolutions to measure",
+    )
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument(
+        "--ceilings",
+        help="JSON file of {stage: {size: MB}} overriding the built-in ceilings",
+    )
+    parser.add_argument(
+        "--update",
+        metavar="PATH",
+        help="Write measured peaks plus 30%% headroom to a ceilings file",
+    )
+    parser.add_argument("--measure", nargs=2, metavar=("STAGE", "SIZE"), help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def _foreground(pixels):
+    """Anything visibly darker than the stub's white background"""
+    return np.asarray(pixels)[..., :3].min(axis=2) < 245
+
+
+def _stub_model_calls():
+    """
+    Replace the model calls, and only those, with cheap stand-ins
+
+    SAM2's loader and automatic mask generator and rembg's remove() need
+    weights; everything the segmenter does around them runs as shipped.
+    The stand-ins threshold against the stub generator's white background.
+    """
+
+    class SAM2Loader:
+        def load_model(self):
+            return types.SimpleNamespace(model=None)
+
+    class SAM2AutomaticMaskGenerator:
+        def __init__(self, model, **kwargs):
+            pass
+
+        def generate(self, image):
+            return [{"segmentation": _foreground(image), "stability_score": 0.95}]
+
+    def remove(image, session=None):
+        rgba = image.convert("RGBA")
+        rgba.putalpha(Image.fromarray(_foreground(image).astype(np.uint8) * 255))
+        return rgba
+
+    stubs = {
+        "custom_nodes.ar_sticker_factory.models": types.ModuleType("models"),
+        "custom_nodes.ar_sticker_factory.models.sam2_loader": types.SimpleNamespace(
+            SAM2Loader=SAM2Loader
+        ),
+        "sam2": types.ModuleType("sam2"),
+        "sam2.automatic_mask_generator": types.SimpleNamespace(
+            SAM2AutomaticMaskGenerator=SAM2AutomaticMaskGenerator
+        ),
+        "rembg": types.SimpleNamespace(remove=remove, new_session=lambda name: name),
+    }
+    sys.modules.update(stubs)
+
+
+def measure(stage, size):
+    """Run one stage once in this process and return its usage"""
+    _stub_model_calls()
+
+    from custom_nodes.ar_sticker_factory.nodes.sam2_segmenter import SAM2Segmenter
+    from custom_nodes.ar_sticker_factory.pipeline import StubBackend, default_params
+    from custom_nodes.ar_sticker_factory.pipeline.runner import normalize_row
+    from custom_nodes.ar_sticker_factory.utils.image_processing import process_alpha_channel
+    from custom_nodes.ar_sticker_factory.utils.memory_tracking import track_stage
+
+    # The stub draws the inputs; export is the real USDZExporter either way
+    backend = StubBackend()
+    segmenter = SAM2Segmenter()
+    row = normalize_row({"prompt": "memory gate", "seed": 7}, default_params())
+
+    def inputs(side):
+        side_row = dict(row, width=side, height=side)
+        image = backend.generate([side_row])[0]
+        segmented = backend.segment(image, side_row)
+        mask = segmented[0, :, :, 3].numpy().copy()
+        return side_row, image, segmented, mask
+
+    def run(side_row, image, segmented, mask):
+        smoothing, padding = side_row["edge_smoothing"], side_row["padding"]
+        if stage == "segment_sam2":
+            result = segmenter._try_sam2_segmentation(
+                image, side_row["confidence_threshold"], smoothing, padding
+            )
+        elif stage == "segment_rembg":
+            result = segmenter._try_rembg_segmentation(image, smoothing, padding)
+        elif stage == "segment_fallback":
+            result = segmenter._fallback_segmentation(image, padding)
+        elif stage == "alpha":
+            return process_alpha_channel(mask, padding=padding)
+        else:
+            return backend.export_payload(segmented, side_row)
+        if result is None:
+            # The path bailed out, so its memory wasn't measured
+            raise RuntimeError(f"{stage} produced no result")
+        return result
+
+    # Warm up at a small size so imports and caches aren't counted
+    run(*inputs(64))
+
+    prepared = inputs(size)
+    with track_stage(stage, trace_python=True) as usage:
+        run(*prepared)
+    usage["size"] = size
+    return usage
+
+
+def measure_isolated(stage, size):
+    """
+    Measure one stage in a fresh process
+
+    A fresh process per measurement means earlier stages' allocator state
+    doesn't hide or inflate this one's peak.
+
+    Returns:
+        The measure() usage dict with "peak_mb" added: the RSS growth, or
+        the numpy/Python peak where RSS isn't available
+
+    Raises:
+        RuntimeError: The measurement process failed
+    """
+    completed = subprocess.run(
+        [
+            sys.executable,
+            __file__,
+            "--measure",
+            stage,
+            str(size),
+        ],
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr[-2000:])
+
+    usage = json.loads(completed.stdout.strip().splitlines()[-1])
+    peak = usage["rss_peak_delta_mb"]
+    usage["peak_mb"] = peak if peak is not None else usage["py_peak_mb"]
+    return usage
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.measure:
+        stage, size = args.measure
+        # Keep export's store writes and manifest rows out of the real outputs
+        with tempfile.TemporaryDirectory() as scratch:
+            os.environ["AR_STICKER_STORE"] = os.path.join(scratch, "store")
+            os.environ["AR_STICKER_MANIFEST"] = os.path.join(scratch, "manifest.sqlite")
+            print(json.dumps(measure(stage, int(size))))
+        return 0
+
+    ceilings = {stage: dict(sizes) for stage, sizes in CEILINGS_MB.items()}
+    if args.ceilings:
+        with open(args.ceilings) as f:
+            for stage, sizes in json.load(f).items():
+                ceilings.setdefault(stage, {}).update(
+                    {int(size): value for size, value in sizes.items()}
+                )
+
+    print(f"💾 Memory gates: {', '.join(args.stages)} at {args.sizes}")
+    failures = []
+    measured = {}
+    for stage in args.stages:
+        for size in args.sizes:
+            try:
+                usage = measure_isolated(stage, size)
+            except RuntimeError as e:
+                print(f"❌ {stage} @ {size}²: measurement failed\n{e}")
+                failures.append((stage, size))
+                continue
+
+            peak = usage["peak_mb"]
+            measured.setdefault(stage, {})[size] = peak
+
+            ceiling = ceilings.get(stage, {}).get(size)
+            status = "✅" if ceiling is None or peak <= ceiling else "❌"
+            print(
+                f"{status} {stage:16s} {size:5d}²: +{peak:7.1f}MB RSS "
+                f"(numpy/Python peak {usage['py_peak_mb']:.1f}MB, "
+                f"ceiling {ceiling if ceiling is not None else '-'}MB, "
+                f"{usage['elapsed_s']:.2f}s)"
+            )
+            if status == "❌":
+                failures.append((stage, size))
+
+    if args.update:
+        with open(args.update, "w") as f:
+            json.dump(
+                {
+                    stage: {
+                        str(size): max(int(peak * 1.3) + 1, MIN_CEILING_MB)
+                        for size, peak in sizes.items()
+                    }
+                    for stage, sizes in measured.items()
+                },
+                f,
+                indent=2,
+            )
+        print(f"📄 Ceilings written to {args.update}")
+
+    if failures:
+        print(f"❌ {len(failures)} memory gate(s) failed")
+        return 1
+    print("✅ All memory gates passed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
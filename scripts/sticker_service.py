@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+AR Sticker Factory - Sticker Service
+Serve prompt-in, sticker-out HTTP jobs without the ComfyUI graph
+"""
+
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# Make the repository importable when run as a script
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[-1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8189)
+    parser.add_argument(
+        "--backend",
+        choices=["nodes", "stub"],
+        default="nodes",
+        help="nodes runs SDXL/SAM2; stub is a CPU stand-in for local testing",
+    )
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--max-queue", type=int, default=256)
+    parser.add_argument("--generate-limit", type=int, default=1)
+    parser.add_argument("--segment-limit", type=int, default=1)
+    parser.add_argument("--export-limit", type=int, default=4)
+    parser.add_argument(
+        "--tenant-limit",
+        type=int,
+        default=4,
+        help="Jobs one tenant may have running at once",
+    )
+    parser.add_argument(
+        "--max-depth",
+        type=int,
+        help="Defer new jobs (503 + Retry-After) once this many are waiting",
+    )
+    parser.add_argument(
+        "--pool",
+        action="store_true",
+        help="Run jobs in one worker process per GPU (or --cpu-workers without a GPU)",
+    )
+    parser.add_argument("--cpu-workers", type=int, default=2)
+    parser.add_argument(
+        "--frame-handoff",
+        action="store_true",
+        help="With --pool, hand segmented frames to this process through shared "
+        "memory and export them here instead of in the workers",
+    )
+    parser.add_argument(
+        "--warm-standby",
+        action="store_true",
+        help="Preload models on start; /ready returns 503 until they are loaded",
+    )
+    parser.add_argument(
+        "--profile-rate",
+        type=float,
+        help="Fraction of jobs to profile; a job can also send \"profile\": true",
+    )
+    parser.add_argument(
+        "--persist",
+        action="store_true",
+        help="Also write every result to the content-addressed store",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    from custom_nodes.ar_sticker_factory.pipeline.service import serve
+
+    pool = None
+    if args.pool:
+        from custom_nodes.ar_sticker_factory.pipeline.worker_pool import WorkerPool
+
+        pool = WorkerPool(
+            backend=args.backend,
+            cpu_workers=args.cpu_workers,
+            preload=args.warm_standby,
+            frame_handoff=args.frame_handoff,
+        )
+
+    try:
+        asyncio.run(
+            serve(
+                host=args.host,
+                port=args.port,
+                backend=args.backend,
+                workers=args.workers,
+                max_queue=args.max_queue,
+                persist=args.persist,
+                default_tenant_limit=args.tenant_limit,
+                max_depth=args.max_depth,
+                pool=pool,
+                warm_standby=args.warm_standby,
+                profile_rate=args.profile_rate or 0.0,
+                stage_limits={
+                    "generate": args.generate_limit,
+                    "segment": args.segment_limit,
+                    "export": args.export_limit,
+                },
+            )
+        )
+    except KeyboardInterrupt:
+        print("\n👋 Sticker service stopped")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,24 @@
+"""
+Shared test fixtures
+Keep exports and the manifest index out of the repository tree
+"""
+
+import pytest
+
+from custom_nodes.ar_sticker_factory.utils import export_cache, manifest_index, output_store
+
+
+@pytest.fixture(autouse=True)
+def isolated_outputs(tmp_path, monkeypatch):
+    # Inherited by the memory gates' measurement subprocesses too
+    monkeypatch.setenv(output_store.STORE_ROOT_ENV, str(tmp_path / "store"))
+    monkeypatch.setenv(manifest_index.MANIFEST_PATH_ENV, str(tmp_path / "manifest.sqlite"))
+    # The process-wide instances read the environment once; start each test fresh
+    monkeypatch.setattr(output_store, "_store", None)
+    monkeypatch.setattr(manifest_index, "_index", None)
+    monkeypatch.setattr(export_cache, "_cache", None)
+    # Flat exports and packs are written under output/ in the working directory
+    monkeypatch.chdir(tmp_path)
+    yield
+    if manifest_index._index is not None:
+        manifest_index._index.close()
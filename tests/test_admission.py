@@ -0,0 +1,103 @@
+"""
+Tests for AdmissionController
+Service-time estimates, admission decisions and queue metrics
+"""
+
+import pytest
+
+from custom_nodes.ar_sticker_factory.pipeline.admission import AdmissionController
+
+STAGE_LIMITS = {"generate": 1, "segment": 1, "export": 1}
+
+
+def make_controller(**kwargs):
+    return AdmissionController(
+        STAGE_LIMITS,
+        initial_estimates={"generate": 4.0, "segment": 1.0, "export": 0.5},
+        **kwargs,
+    )
+
+
+def test_estimate_uses_bottleneck_stage():
+    controller = make_controller()
+
+    assert controller.service_time() == pytest.approx(5.5)
+    # generate at 4s per slot bounds throughput to 0.25 jobs/s
+    assert controller.throughput() == pytest.approx(0.25)
+    assert controller.estimate(4) == pytest.approx(16 + 5.5)
+
+
+def test_stage_limits_raise_throughput():
+    controller = AdmissionController(
+        {"generate": 4, "segment": 1, "export": 1},
+        initial_estimates={"generate": 4.0, "segment": 1.0, "export": 0.5},
+    )
+
+    # Four generate slots make segment the bottleneck
+    assert controller.throughput() == pytest.approx(1.0)
+
+
+def test_first_sample_replaces_estimate_then_ewma():
+    controller = make_controller(alpha=0.5)
+
+    controller.observe("segment", 3.0)
+    assert controller.snapshot()["stage_seconds_ewma"]["segment"] == 3.0
+
+    controller.observe("segment", 1.0)
+    assert controller.snapshot()["stage_seconds_ewma"]["segment"] == 2.0
+
+
+def test_track_counts_inflight_and_observes():
+    controller = make_controller()
+
+    with controller.track("export"):
+        assert controller.snapshot()["stage_inflight"]["export"] == 1
+
+    snapshot = controller.snapshot()
+    assert snapshot["stage_inflight"]["export"] == 0
+    assert snapshot["stage_seconds_ewma"]["export"] < 0.5
+
+
+def test_decide_admits_without_deadline():
+    decision = make_controller().decide(jobs_ahead=100, depth=100)
+
+    assert decision["action"] == "admit"
+    assert decision["eta_s"] == pytest.approx(405.5)
+
+
+def test_decide_rejects_deadline_below_service_time():
+    decision = make_controller().decide(jobs_ahead=0, depth=0, deadline_s=5.0)
+
+    assert decision["action"] == "reject"
+    assert "service time" in decision["reason"]
+
+
+def test_decide_defers_until_queue_drains():
+    decision = make_controller().decide(jobs_ahead=4, depth=4, deadline_s=10.0)
+
+    assert decision["action"] == "defer"
+    # eta 21.5s against a 10s deadline
+    assert decision["retry_after_s"] == 12
+
+
+def test_decide_defers_at_max_depth():
+    controller = make_controller(max_depth=8)
+
+    assert controller.decide(jobs_ahead=7, depth=7)["action"] == "admit"
+    decision = controller.decide(jobs_ahead=8, depth=9)
+    assert decision["action"] == "defer"
+    assert decision["retry_after_s"] == 8
+    assert controller.snapshot()["decisions"] == {"admit": 1, "defer": 1, "reject": 0}
+
+
+def test_prometheus_metrics_expose_hpa_signals():
+    controller = make_controller()
+    text = controller.prometheus_metrics(
+        {"interactive": 1, "batch": 3, "backfill": 0},
+        {"batch": {"wait_ms_p50": 500.0, "wait_ms_p95": 1500.0}},
+        jobs_ahead=4,
+    )
+
+    assert 'sticker_queue_depth{priority="batch"} 3' in text
+    assert "sticker_estimated_completion_seconds 21.5" in text
+    assert 'sticker_queue_wait_seconds{priority="batch",quantile="0.95"} 1.5' in text
@@ -0,0 +1,74 @@
+"""
+Tests for AsyncExportWriter
+Per-path ordering, failure records and bounded job history
+"""
+
+import threading
+
+import pytest
+import torch
+
+from custom_nodes.ar_sticker_factory.nodes.usdz_exporter import USDZExporter
+from custom_nodes.ar_sticker_factory.utils.async_writer import AsyncExportWriter
+
+
+@pytest.fixture
+def writer():
+    writer = AsyncExportWriter(max_workers=2, max_pending=4, max_history=3)
+    yield writer
+    writer.shutdown()
+
+
+def test_jobs_for_one_path_run_in_order(writer):
+    order = []
+    release = threading.Event()
+
+    def first():
+        release.wait(5)
+        order.append("first")
+
+    writer.submit("a.usdz", first)
+    writer.submit("a.usdz", order.append, "second")
+    release.set()
+
+    assert writer.flush(timeout=5)
+    assert order == ["first", "second"]
+    assert writer.status("a.usdz")["state"] == "done"
+
+
+def test_failures_are_recorded(writer):
+    def fail():
+        raise OSError("disk full")
+
+    job_id = writer.submit("b.usdz", fail)
+    writer.flush(timeout=5)
+
+    record = writer.errors()[job_id]
+    assert record["error"] == "disk full"
+    assert "OSError" in record["traceback"]
+
+
+def test_finished_jobs_are_pruned_to_the_history_limit(writer):
+    job_ids = [writer.submit(f"{index}.usdz", lambda: None) for index in range(10)]
+    assert writer.flush(timeout=5)
+
+    assert writer.pending() == 0
+    assert writer._futures == {}
+    assert list(writer._jobs) == job_ids[-3:]
+    assert set(writer._latest) == {"7.usdz", "8.usdz", "9.usdz"}
+    assert writer.status(job_ids[0]) is None
+    assert writer.status("9.usdz")["job"] == job_ids[-1]
+
+
+def test_sync_export_failure_raises():
+    with pytest.raises(ValueError, match="Unknown PNG profile"):
+        USDZExporter().export_ar_sticker(
+            torch.ones(1, 8, 8, 4),
+            0.1,
+            "sticker",
+            "matte",
+            "billboard",
+            True,
+            png_profile="no-such-profile",
+            output_layout="content_addressed",
+        )
@@ -0,0 +1,110 @@
+"""
+Tests for StickerPipeline
+Bulk runs with the stub backend: validation, dedupe, filenames and resume
+"""
+
+import os
+
+import pytest
+
+from custom_nodes.ar_sticker_factory.pipeline import StickerPipeline, StubBackend
+from custom_nodes.ar_sticker_factory.pipeline.journal import JobJournal
+
+
+class CountingStubBackend(StubBackend):
+    """Stub that counts generated images and can stop before an export"""
+
+    def __init__(self, interrupt_prompt=None):
+        super().__init__()
+        self.generated = 0
+        self.interrupt_prompt = interrupt_prompt
+
+    def generate(self, rows):
+        self.generated += len(rows)
+        return super().generate(rows)
+
+    def export(self, image, row, output_layout):
+        if row["prompt"] == self.interrupt_prompt:
+            raise KeyboardInterrupt
+        return super().export(image, row, output_layout)
+
+
+def rows(*prompts):
+    # The stub draws from the seed alone, so each prompt gets its own
+    return [
+        {"prompt": prompt, "seed": sum(map(ord, prompt)), "width": 512, "height": 512}
+        for prompt in prompts
+    ]
+
+
+def test_identical_rows_are_produced_once():
+    backend = CountingStubBackend()
+    pipeline = StickerPipeline(backend=backend, batch_size=4)
+
+    results, report = pipeline.run(rows("cat", "dog", "cat"))
+
+    assert backend.generated == 2
+    assert report["unique"] == 2
+    assert report["deduplicated"] == 1
+    assert results[0]["path"] == results[2]["path"]
+    assert results[0]["path"] != results[1]["path"]
+
+
+def test_flat_layout_gives_each_row_its_own_file():
+    pipeline = StickerPipeline(backend="stub", output_layout="flat")
+
+    results, report = pipeline.run(rows("cat", "dog", "fox"))
+
+    paths = [result["path"] for result in results]
+    assert report["completed"] == 3
+    assert len(set(paths)) == 3
+    assert all(os.path.exists(path) for path in paths)
+    assert all(os.path.basename(path).startswith("sticker_") for path in paths)
+
+
+def test_flat_layout_refuses_a_shared_explicit_filename():
+    pipeline = StickerPipeline(backend="stub", output_layout="flat")
+    shared = [dict(row, filename="same") for row in rows("cat", "dog")]
+
+    with pytest.raises(ValueError, match="row 2: filename 'same'"):
+        pipeline.run(shared)
+
+
+def test_invalid_rows_fail_before_any_work():
+    backend = CountingStubBackend()
+    pipeline = StickerPipeline(backend=backend)
+    bad = rows("cat") + [{"prompt": "dog", "width": 8}, {"prompt": "fox", "filename": "../x"}]
+
+    with pytest.raises(ValueError) as excinfo:
+        pipeline.run(bad)
+
+    message = str(excinfo.value)
+    assert "row 2: width must be at least 512" in message
+    assert "row 3: filename" in message
+    assert backend.generated == 0
+
+
+def test_interrupted_run_resumes_from_the_journal(tmp_path):
+    journal_path = str(tmp_path / "journal.jsonl")
+    prompts = rows("cat", "dog")
+
+    interrupted = StickerPipeline(
+        backend=CountingStubBackend(interrupt_prompt="dog"),
+        batch_size=1,
+        journal=JobJournal(journal_path),
+    )
+    with pytest.raises(KeyboardInterrupt):
+        interrupted.run(prompts)
+    interrupted.journal.close()
+
+    backend = CountingStubBackend()
+    resumed = StickerPipeline(backend=backend, batch_size=1, journal=JobJournal(journal_path))
+    results, report = resumed.run(prompts)
+    resumed.journal.close()
+
+    # cat was exported and dog was segmented before the interruption
+    assert backend.generated == 0
+    assert report["resumed"] == 2
+    assert report["completed"] == 2
+    assert results[0]["resumed"] is True
+    assert all(os.path.exists(result["path"]) for result in results)
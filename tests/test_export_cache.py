@@ -0,0 +1,137 @@
+"""
+Tests for ExportCache
+LRU reuse, artifact verification and the persisted memo
+"""
+
+import os
+
+import torch
+
+from custom_nodes.ar_sticker_factory.nodes.usdz_exporter import USDZExporter
+from custom_nodes.ar_sticker_factory.utils.export_cache import ExportCache, get_export_cache
+from custom_nodes.ar_sticker_factory.utils.manifest_index import ManifestIndex
+
+
+def write_artifact(path, data=b"usdz"):
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_hit_after_store(tmp_path):
+    cache = ExportCache()
+    artifact = write_artifact(tmp_path / "a.usdz")
+
+    assert cache.lookup("a") is None
+    cache.store("a", ("result",), artifact)
+    assert cache.lookup("a") == ("result",)
+    assert cache.stats() == {
+        "hits": 1,
+        "misses": 1,
+        "invalidated": 0,
+        "entries": 1,
+        "hit_rate": 0.5,
+    }
+
+
+def test_missing_artifact_is_not_stored(tmp_path):
+    cache = ExportCache()
+    cache.store("a", ("result",), str(tmp_path / "missing.usdz"))
+
+    assert cache.stats()["entries"] == 0
+
+
+def test_changed_or_deleted_artifact_invalidates(tmp_path):
+    cache = ExportCache()
+    changed = write_artifact(tmp_path / "changed.usdz")
+    deleted = write_artifact(tmp_path / "deleted.usdz")
+    cache.store("changed", "c", changed)
+    cache.store("deleted", "d", deleted)
+
+    write_artifact(tmp_path / "changed.usdz", b"rewritten")
+    os.remove(deleted)
+
+    assert cache.lookup("changed") is None
+    assert cache.lookup("deleted") is None
+    assert cache.stats()["invalidated"] == 2
+    assert cache.stats()["entries"] == 0
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = ExportCache(max_entries=2)
+    for key in ("a", "b"):
+        cache.store(key, key, write_artifact(tmp_path / f"{key}.usdz"))
+
+    cache.lookup("a")
+    cache.store("c", "c", write_artifact(tmp_path / "c.usdz"))
+
+    assert cache.peek("a") == "a"
+    assert cache.peek("b") is None
+    assert cache.peek("c") == "c"
+
+
+def test_peek_leaves_counters_and_order(tmp_path):
+    cache = ExportCache(max_entries=2)
+    for key in ("a", "b"):
+        cache.store(key, key, write_artifact(tmp_path / f"{key}.usdz"))
+
+    assert cache.peek("a") == "a"
+    assert cache.peek("missing") is None
+    assert cache.stats()["hits"] == cache.stats()["misses"] == 0
+
+    # "a" is still the oldest entry, so it goes first
+    cache.store("c", "c", write_artifact(tmp_path / "c.usdz"))
+    assert cache.peek("a") is None
+
+
+def test_every_artifact_must_verify(tmp_path):
+    cache = ExportCache()
+    paths = [write_artifact(tmp_path / name) for name in ("a.png", "a.obj", "a.mtl")]
+    cache.store("a", ("a.png", "png", ""), paths)
+
+    assert cache.lookup("a") is not None
+    os.remove(paths[2])
+    assert cache.lookup("a") is None
+    assert cache.stats()["invalidated"] == 1
+
+
+def test_memo_survives_a_new_cache(tmp_path):
+    index = ManifestIndex(str(tmp_path / "manifest.sqlite"))
+    artifact = write_artifact(tmp_path / "a.usdz")
+    ExportCache(index=index).store("a", ("a.usdz", "usdz", "tap"), artifact)
+
+    restarted = ExportCache(index=index)
+    assert restarted.peek("a") == ("a.usdz", "usdz", "tap")
+    assert restarted.lookup("a") == ("a.usdz", "usdz", "tap")
+
+    os.remove(artifact)
+    assert ExportCache(index=index).lookup("a") is None
+    assert index.recall_export("a") is None
+    index.close()
+
+
+def test_persisted_memo_is_bounded(tmp_path):
+    index = ManifestIndex(str(tmp_path / "manifest.sqlite"))
+    cache = ExportCache(index=index, max_persisted=2)
+    for key in ("a", "b", "c"):
+        cache.store(key, (key,), write_artifact(tmp_path / f"{key}.usdz"))
+
+    assert index.recall_export("a") is None
+    assert index.recall_export("c") is not None
+    index.close()
+
+
+def test_png_obj_export_is_redone_when_its_material_is_deleted():
+    image = torch.ones(1, 32, 32, 4)
+    args = (image, 0.1, "memo", "matte", "billboard", True)
+    exporter = USDZExporter()
+
+    path, format_type, _ = exporter.export_ar_sticker(*args, export_format="png_obj")
+    assert format_type == "png"
+    assert exporter.export_ar_sticker(*args, export_format="png_obj")[0] == path
+    assert get_export_cache().stats()["hits"] == 1
+
+    os.remove(os.path.join(os.path.dirname(path), "memo.mtl"))
+    exporter.export_ar_sticker(*args, export_format="png_obj")
+
+    assert get_export_cache().stats()["invalidated"] == 1
+    assert os.path.exists(os.path.join(os.path.dirname(path), "memo.mtl"))
@@ -0,0 +1,90 @@
+"""
+Tests for GLB creation
+Container layout, buffer alignment and triangle winding
+"""
+
+import io
+import json
+import struct
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from custom_nodes.ar_sticker_factory.utils.glb_creation import create_glb_from_image
+
+COMPONENTS = {"SCALAR": 1, "VEC2": 2, "VEC3": 3}
+DTYPES = {5126: np.float32, 5123: np.uint16}
+
+
+def build(ar_behavior="billboard", size=(48, 32)):
+    image = Image.new("RGBA", size, (200, 40, 40, 255))
+    buffer = io.BytesIO()
+    assert create_glb_from_image(image, buffer, scale=0.1, ar_behavior=ar_behavior)
+    return buffer.getvalue()
+
+
+def parse(glb):
+    """Split a GLB into its JSON document and binary chunk"""
+    magic, version, length = struct.unpack_from("<III", glb, 0)
+    assert (magic, version, length) == (0x46546C67, 2, len(glb))
+
+    json_length, json_type = struct.unpack_from("<II", glb, 12)
+    assert json_type == 0x4E4F534A
+    document = json.loads(glb[20 : 20 + json_length])
+
+    offset = 20 + json_length
+    bin_length, bin_type = struct.unpack_from("<II", glb, offset)
+    assert bin_type == 0x004E4942
+    binary = glb[offset + 8 : offset + 8 + bin_length]
+    assert offset + 8 + bin_length == len(glb)
+    return document, json_length, binary
+
+
+def accessor_data(document, binary, index):
+    accessor = document["accessors"][index]
+    view = document["bufferViews"][accessor["bufferView"]]
+    data = binary[view["byteOffset"] : view["byteOffset"] + view["byteLength"]]
+    values = np.frombuffer(data, dtype=DTYPES[accessor["componentType"]])
+    return values.reshape(accessor["count"], COMPONENTS[accessor["type"]])
+
+
+def test_chunks_and_buffer_views_are_aligned():
+    document, json_length, binary = parse(build())
+
+    assert json_length % 4 == 0
+    assert len(binary) % 4 == 0
+    assert document["buffers"] == [{"byteLength": len(binary)}]
+    for view in document["bufferViews"]:
+        assert view["byteOffset"] % 4 == 0
+        assert view["byteOffset"] + view["byteLength"] <= len(binary)
+
+    for index, accessor in enumerate(document["accessors"]):
+        view = document["bufferViews"][accessor["bufferView"]]
+        itemsize = np.dtype(DTYPES[accessor["componentType"]]).itemsize
+        assert view["byteLength"] == accessor["count"] * COMPONENTS[accessor["type"]] * itemsize
+        assert accessor_data(document, binary, index).shape[0] == accessor["count"]
+
+
+def test_texture_is_the_embedded_png():
+    document, _, binary = parse(build(size=(48, 32)))
+
+    view = document["bufferViews"][document["images"][0]["bufferView"]]
+    texture = binary[view["byteOffset"] : view["byteOffset"] + view["byteLength"]]
+    assert Image.open(io.BytesIO(texture)).size == (48, 32)
+
+
+@pytest.mark.parametrize("ar_behavior", ["billboard", "fixed", "physics"])
+def test_triangles_wind_counter_clockwise_around_the_normal(ar_behavior):
+    document, _, binary = parse(build(ar_behavior))
+    primitive = document["meshes"][0]["primitives"][0]
+
+    positions = accessor_data(document, binary, primitive["attributes"]["POSITION"])
+    normals = accessor_data(document, binary, primitive["attributes"]["NORMAL"])
+    triangles = accessor_data(document, binary, primitive["indices"]).reshape(-1, 3)
+
+    assert len(triangles) == 2
+    assert sorted(set(triangles.ravel().tolist())) == [0, 1, 2, 3]
+    for a, b, c in triangles:
+        geometric = np.cross(positions[b] - positions[a], positions[c] - positions[a])
+        assert np.dot(geometric, normals[a]) > 0
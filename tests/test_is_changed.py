@@ -0,0 +1,64 @@
+"""
+Tests for the nodes' IS_CHANGED hooks
+Re-runs only for randomized seeds and missing artifacts
+"""
+
+import math
+import os
+
+import torch
+
+from custom_nodes.ar_sticker_factory.nodes.ar_sticker_generator import ARStickerGenerator
+from custom_nodes.ar_sticker_factory.nodes.sam2_segmenter import SAM2Segmenter
+from custom_nodes.ar_sticker_factory.nodes.sticker_pack_bundler import StickerPackBundler
+from custom_nodes.ar_sticker_factory.nodes.usdz_exporter import USDZExporter
+
+
+def sticker(side=64):
+    image = torch.ones(1, side, side, 4)
+    image[:, 16:48, 16:48, :3] = 0.2
+    image[:, :8, :, 3] = 0.0
+    return image
+
+
+def changed(value):
+    return isinstance(value, float) and math.isnan(value)
+
+
+def test_generator_reruns_only_for_random_seeds():
+    assert changed(ARStickerGenerator.IS_CHANGED(seed=-1, prompt="cat"))
+    assert ARStickerGenerator.IS_CHANGED(seed=7, prompt="cat") == 7
+
+
+def test_segmenter_relies_on_input_caching():
+    assert "IS_CHANGED" not in vars(SAM2Segmenter)
+
+
+def test_exporter_is_stable_until_its_artifact_is_deleted():
+    image = sticker()
+    options = dict(output_layout="content_addressed", write_sidecars=False)
+
+    assert changed(USDZExporter.IS_CHANGED(image=image, **options))
+
+    path, _, _ = USDZExporter().export_ar_sticker(
+        image, 0.1, "sticker", "matte", "billboard", True, **options
+    )
+    first = USDZExporter.IS_CHANGED(image=image, **options)
+    assert isinstance(first, str)
+    assert USDZExporter.IS_CHANGED(image=image, **options) == first
+
+    os.remove(path)
+    assert changed(USDZExporter.IS_CHANGED(image=image, **options))
+
+
+def test_bundler_reruns_when_the_pack_is_missing(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    inputs = dict(pack_name=["pack"], images=[sticker()])
+
+    assert changed(StickerPackBundler.IS_CHANGED(**inputs))
+
+    os.makedirs("output/sticker_packs")
+    open("output/sticker_packs/pack.zip", "wb").close()
+    key = StickerPackBundler.IS_CHANGED(**inputs)
+    assert isinstance(key, str)
+    assert StickerPackBundler.IS_CHANGED(max_workers=[8], **inputs) == key
@@ -0,0 +1,91 @@
+"""
+Tests for the memory gates
+Per-stage peak memory against the ceilings in scripts/memory_gates.py
+"""
+
+import importlib.util
+import json
+import threading
+from pathlib import Path
+
+import pytest
+
+from custom_nodes.ar_sticker_factory.utils.memory_tracking import track_stage
+
+SCRIPT = Path(__file__).resolve().parent.parent / "scripts" / "memory_gates.py"
+
+# Larger sizes take longer and are covered by `make memory-gates`
+SIZES = (512, 1024)
+
+
+def load_gates():
+    spec = importlib.util.spec_from_file_location("memory_gates", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+gates = load_gates()
+
+
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize("stage", gates.STAGES)
+def test_stage_peak_is_under_ceiling(stage, size):
+    usage = gates.measure_isolated(stage, size)
+
+    assert usage["size"] == size
+    assert usage["peak_mb"] <= gates.CEILINGS_MB[stage][size], usage
+
+
+def test_gate_fails_over_ceiling(tmp_path, capsys):
+    ceilings = tmp_path / "ceilings.json"
+    ceilings.write_text(json.dumps({"alpha": {"512": 0}}))
+
+    status = gates.main(
+        ["--stages", "alpha", "--sizes", "512", "--ceilings", str(ceilings)]
+    )
+
+    assert status == 1
+    assert "1 memory gate(s) failed" in capsys.readouterr().out
+
+
+def test_update_writes_ceilings_with_headroom(tmp_path):
+    ceilings = tmp_path / "ceilings.json"
+
+    status = gates.main(["--stages", "export", "--sizes", "512", "--update", str(ceilings)])
+
+    written = json.loads(ceilings.read_text())
+    assert status == 0
+    assert written["export"]["512"] >= gates.MIN_CEILING_MB
+
+
+def test_overlapping_stages_report_growth_only_for_the_first():
+    opened = threading.Event()
+    release = threading.Event()
+    usage = {}
+
+    def outer():
+        with track_stage("outer") as usage["outer"]:
+            opened.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=outer)
+    thread.start()
+    opened.wait(5)
+    with track_stage("inner") as usage["inner"]:
+        pass
+    release.set()
+    thread.join()
+
+    assert usage["outer"]["peak_shared"] is True
+    assert usage["outer"]["rss_peak_delta_mb"] is not None
+    assert usage["inner"]["peak_shared"] is True
+    assert usage["inner"]["rss_peak_delta_mb"] is None
+
+
+def test_lone_stage_is_not_shared():
+    with track_stage("lone") as usage:
+        pass
+
+    assert usage["peak_shared"] is False
+    assert usage["rss_peak_delta_mb"] is not None
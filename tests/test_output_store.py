@@ -0,0 +1,66 @@
+"""
+Tests for the content-addressed output store
+Sharded keys, deduplication, atomic writes and the shared default store
+"""
+
+import os
+
+import pytest
+import torch
+
+from custom_nodes.ar_sticker_factory.utils import output_store
+from custom_nodes.ar_sticker_factory.utils.output_store import (
+    ContentStore,
+    LocalDirectoryBackend,
+    StorageBackend,
+    write_atomic,
+)
+
+
+def test_identical_payloads_are_stored_once(tmp_path):
+    store = ContentStore(LocalDirectoryBackend(tmp_path))
+
+    first = store.put(b"sticker", ".usdz")
+    second = store.put(b"sticker", ".usdz")
+
+    digest = first["digest"]
+    assert first["key"] == f"{digest[:2]}/{digest[2:4]}/{digest}.usdz"
+    assert not first["deduplicated"]
+    assert second["deduplicated"]
+    assert store.get(first["key"]) == b"sticker"
+
+
+def test_backends_must_implement_every_operation():
+    class Partial(StorageBackend):
+        def exists(self, key):
+            return False
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_write_atomic_replaces_without_leaving_temp_files(tmp_path):
+    path = tmp_path / "flat" / "sticker.usdz"
+
+    write_atomic(str(path), b"old")
+    write_atomic(str(path), b"new")
+
+    assert path.read_bytes() == b"new"
+    assert os.listdir(path.parent) == ["sticker.usdz"]
+
+
+def test_standalone_generator_shares_the_default_store():
+    from custom_nodes import ar_sticker_generator
+
+    assert ar_sticker_generator.get_default_store is output_store.get_default_store
+
+
+def test_usdz_placeholder_stays_out_of_the_store(tmp_path):
+    from custom_nodes.ar_sticker_generator import ARStickerGenerator
+
+    path = ARStickerGenerator()._export_usdz(torch.rand(1, 16, 16, 3), None)
+
+    store_root = output_store.get_default_store().backend.root
+    assert os.path.exists(path)
+    assert not os.path.abspath(path).startswith(store_root)
+    assert not os.path.exists(store_root)
@@ -0,0 +1,124 @@
+"""
+Tests for PNG encoding profiles
+Round trips per profile and the palette quantization error gate
+"""
+
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from custom_nodes.ar_sticker_factory.utils import png_encoding
+from custom_nodes.ar_sticker_factory.utils.png_encoding import PNG_PROFILES, encode_png
+
+
+def decode(data):
+    return np.asarray(Image.open(io.BytesIO(data)).convert("RGBA"))
+
+
+def visible(pixels):
+    """RGBA with the color of fully transparent pixels zeroed"""
+    pixels = pixels.copy()
+    pixels[pixels[:, :, 3] == 0] = 0
+    return pixels
+
+
+def sticker(colors, side=64, seed=0):
+    """Opaque disc of random colors from a palette of the given size"""
+    rng = np.random.default_rng(seed)
+    palette = rng.integers(0, 256, size=(colors, 3), dtype=np.uint8)
+    pixels = np.zeros((side, side, 4), np.uint8)
+    pixels[:, :, :3] = palette[rng.integers(0, colors, size=(side, side))]
+    yy, xx = np.mgrid[:side, :side]
+    pixels[:, :, 3] = np.where((yy - side / 2) ** 2 + (xx - side / 2) ** 2 < (side / 3) ** 2, 255, 0)
+    # Hidden color under the transparent corners
+    pixels[0, 0, :3] = (1, 2, 3)
+    return Image.fromarray(pixels, "RGBA")
+
+
+@pytest.mark.parametrize("profile", sorted(PNG_PROFILES))
+def test_every_profile_round_trips_visible_pixels(profile):
+    image = sticker(16)
+
+    data, stats = encode_png(image, profile)
+
+    assert stats["profile"] == profile
+    assert stats["bytes"] == len(data)
+    assert np.array_equal(visible(decode(data)), visible(np.asarray(image)))
+
+
+def test_fast_and_balanced_keep_truecolor():
+    for profile in ("fast", "balanced"):
+        data, stats = encode_png(sticker(16), profile)
+        assert not stats["palette"]
+        assert Image.open(io.BytesIO(data)).mode == "RGBA"
+
+
+def test_smallest_palettizes_few_colors_exactly():
+    data, stats = encode_png(sticker(200), "smallest")
+
+    assert stats["palette"]
+    assert Image.open(io.BytesIO(data)).mode == "P"
+
+
+def test_unknown_profile_is_rejected():
+    with pytest.raises(ValueError, match="Unknown PNG profile"):
+        encode_png(sticker(4), "tiny")
+
+
+def test_many_colors_stay_truecolor():
+    side = 128
+    gradient = np.zeros((side, side, 4), np.uint8)
+    gradient[:, :, 0] = np.arange(side)[None, :] * 2
+    gradient[:, :, 1] = np.arange(side)[:, None] * 2
+    gradient[:, :, 2] = (np.arange(side)[None, :] + np.arange(side)[:, None]) % 256
+    gradient[:, :, 3] = 255
+
+    _, stats = encode_png(Image.fromarray(gradient, "RGBA"), "smallest")
+
+    # 16384 distinct colors is over PALETTE_MAX_SOURCE_COLORS
+    assert not stats["palette"]
+
+
+def test_scattered_colors_fail_the_error_gate():
+    # Under 4096 colors, but too far apart for 256 entries to stay close
+    image = sticker(3000, side=96, seed=1)
+
+    data, stats = encode_png(image, "smallest")
+
+    assert not stats["palette"]
+    assert np.array_equal(visible(decode(data)), visible(np.asarray(image)))
+
+
+def restored_with(errors):
+    """A source frame and a copy whose red channel is off by errors"""
+    source = np.full((100, 100, 4), 100, np.uint8)
+    restored = source.copy()
+    restored[:, :, 0] += np.asarray(errors, np.uint8).reshape(100, 100)
+    return Image.fromarray(source, "RGBA"), Image.fromarray(restored, "RGBA")
+
+
+def test_error_gate_passes_small_uniform_error():
+    errors = np.full(10000, png_encoding.PALETTE_MAX_PERCENTILE_ERROR)
+
+    assert png_encoding._palette_error(*restored_with(errors)) == 3
+
+
+def test_error_gate_rejects_one_pixel_over_the_maximum():
+    errors = np.zeros(10000)
+    errors[0] = png_encoding.PALETTE_MAX_PIXEL_ERROR + 1
+
+    assert png_encoding._palette_error(*restored_with(errors)) is None
+
+
+def test_error_gate_rejects_a_band_over_the_percentile():
+    # 0.2% of pixels at 4 puts the 99.9th percentile over the limit of 3
+    errors = np.zeros(10000)
+    errors[:20] = png_encoding.PALETTE_MAX_PERCENTILE_ERROR + 1
+
+    assert png_encoding._palette_error(*restored_with(errors)) is None
+
+    # 0.05% is under the percentile and within the per-pixel maximum
+    errors[5:] = 0
+    assert png_encoding._palette_error(*restored_with(errors)) == 0
@@ -0,0 +1,122 @@
+"""
+Tests for profiling
+Trace and collapsed-stack output, and the disabled path
+"""
+
+import json
+import os
+
+import pytest
+
+from custom_nodes.ar_sticker_factory.utils import profiling
+from custom_nodes.ar_sticker_factory.utils.profiling import configure, profile_request, profiled
+
+
+@profiled("inner")
+def inner_stage(count):
+    return sum(index * index for index in range(count))
+
+
+@profiled("outer")
+def outer_stage(count):
+    return inner_stage(count) + inner_stage(count)
+
+
+@pytest.fixture(autouse=True)
+def no_sampling():
+    configure(0)
+    yield
+    configure(0)
+
+
+def test_request_writes_trace_and_collapsed_stacks(tmp_path):
+    params = {"prompt": "cat", "seed": 7, "image": object()}
+    with profile_request("req1", params=params, output_dir=str(tmp_path)) as session:
+        outer_stage(20000)
+
+    assert session.paths["trace"] == str(tmp_path / "req1.trace.json")
+    assert {"trace", "prof", "collapsed"} <= set(session.paths)
+
+    with open(session.paths["trace"]) as f:
+        trace = json.load(f)
+    assert trace["metadata"] == {"request_id": "req1", "params": {"prompt": "cat", "seed": 7}}
+
+    spans = [event for event in trace["traceEvents"] if event["ph"] == "X"]
+    assert sorted(event["name"] for event in spans) == ["inner", "inner", "outer"]
+    outer = next(event for event in spans if event["name"] == "outer")
+    for event in spans:
+        assert event["ts"] >= outer["ts"]
+        assert event["ts"] + event["dur"] <= outer["ts"] + outer["dur"] + 1
+
+    with open(session.paths["collapsed"]) as f:
+        lines = f.read().splitlines()
+    assert lines
+    for line in lines:
+        _, micros = line.rsplit(" ", 1)
+        assert int(micros) >= 1
+    # Nested stages are attributed under the outer stage's frame
+    assert any("outer_stage" in line and "inner_stage" in line for line in lines)
+
+
+def test_nested_request_joins_the_outer_session(tmp_path):
+    with profile_request("outer", output_dir=str(tmp_path)) as session:
+        with profile_request("inner", output_dir=str(tmp_path)) as nested:
+            inner_stage(100)
+
+    assert nested is session
+    assert sorted(os.listdir(tmp_path)) == ["outer.collapsed", "outer.prof", "outer.trace.json"]
+
+
+def test_failing_stage_still_records_its_span(tmp_path):
+    @profiled("broken")
+    def broken():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        with profile_request("req", output_dir=str(tmp_path)):
+            broken()
+
+    with open(tmp_path / "req.trace.json") as f:
+        names = [event["name"] for event in json.load(f)["traceEvents"] if event["ph"] == "X"]
+    assert names == ["broken"]
+    assert not profiling._cprofile_lock.locked()
+
+
+def test_disabled_path_skips_the_profiler(tmp_path, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("profiler touched without a session")
+
+    monkeypatch.setattr(profiling, "_run_profiled", fail)
+    monkeypatch.setattr(profiling.random, "random", fail)
+    monkeypatch.setenv("STICKER_PROFILE_DIR", str(tmp_path))
+
+    assert outer_stage(10) == 2 * sum(index * index for index in range(10))
+
+    with profile_request("off", enabled=False) as session:
+        assert session is None
+        outer_stage(10)
+
+    assert os.listdir(tmp_path) == []
+
+
+def test_sampled_call_profiles_itself(tmp_path, monkeypatch):
+    monkeypatch.setenv("STICKER_PROFILE_DIR", str(tmp_path))
+    assert configure(1.0) == 1.0
+
+    outer_stage(100)
+
+    traces = [name for name in os.listdir(tmp_path) if name.endswith(".trace.json")]
+    assert len(traces) == 1
+    with open(tmp_path / traces[0]) as f:
+        trace = json.load(f)
+    assert trace["metadata"]["params"] == {"count": 100}
+    assert sorted(event["name"] for event in trace["traceEvents"] if event["ph"] == "X") == [
+        "inner",
+        "inner",
+        "outer",
+    ]
+
+
+def test_sample_rate_is_clamped():
+    assert configure(5) == 1.0
+    assert configure(-1) == 0.0
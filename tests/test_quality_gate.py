@@ -0,0 +1,125 @@
+"""
+Tests for the quality gate
+Retry seeding, and rejected stickers in bulk runs
+"""
+
+import numpy as np
+import pytest
+
+from custom_nodes.ar_sticker_factory.pipeline import StickerPipeline, StubBackend
+from custom_nodes.ar_sticker_factory.utils.quality_gate import check_sticker, retry_seed
+
+
+class ScriptedGateBackend(StubBackend):
+    """Stub whose quality gate rejects a fixed set of seeds"""
+
+    def __init__(self, rejected_seeds):
+        super().__init__()
+        self.rejected_seeds = set(rejected_seeds)
+        self.generated_seeds = []
+        self.exported_seeds = []
+
+    def generate(self, rows):
+        self.generated_seeds.extend(row["seed"] for row in rows)
+        return super().generate(rows)
+
+    def check_quality(self, image, row):
+        if not row.get("quality_gate", True):
+            return None
+        if row["seed"] in self.rejected_seeds:
+            return {"passed": False, "reasons": ["touches_edge"], "scores": {"edge_touch": 0.5}}
+        return {"passed": True, "reasons": [], "scores": {}}
+
+    def export(self, image, row, output_layout):
+        self.exported_seeds.append(row["seed"])
+        return super().export(image, row, output_layout)
+
+
+def sticker_row(seed, **params):
+    return dict({"prompt": "cat", "seed": seed, "width": 512, "height": 512}, **params)
+
+
+def test_retries_step_from_the_first_rejected_seed():
+    seed = 42
+    backend = ScriptedGateBackend({seed, retry_seed(seed, 1)})
+    pipeline = StickerPipeline(backend=backend)
+
+    results, report = pipeline.run([sticker_row(seed, quality_retries=2)])
+
+    # Each retry is offset from the row's seed, not chained off the last retry
+    assert backend.generated_seeds == [seed, retry_seed(seed, 1), retry_seed(seed, 2)]
+    assert backend.exported_seeds == [retry_seed(seed, 2)]
+    assert results[0]["status"] == "ok"
+    assert results[0]["seed"] == retry_seed(seed, 2)
+    assert [entry["seed"] for entry in results[0]["rejections"]] == [seed, retry_seed(seed, 1)]
+    assert report["completed"] == 1
+    assert report["rejection_reasons"] == {"touches_edge": 2}
+
+
+def test_used_up_retries_reject_without_exporting():
+    seeds = [7, retry_seed(7, 1)]
+    backend = ScriptedGateBackend(seeds)
+
+    results, report = StickerPipeline(backend=backend).run([sticker_row(7, quality_retries=1)])
+
+    assert backend.generated_seeds == seeds
+    assert backend.exported_seeds == []
+    assert results[0]["status"] == "rejected"
+    assert [entry["seed"] for entry in results[0]["rejections"]] == seeds
+    assert report["rejected"] == 1
+    assert report["failed"] == 0
+
+
+def test_gate_off_exports_the_first_attempt():
+    backend = ScriptedGateBackend({3})
+
+    results, _ = StickerPipeline(backend=backend).run(
+        [sticker_row(3, quality_gate=False, quality_retries=2)]
+    )
+
+    assert backend.generated_seeds == [3]
+    assert results[0]["status"] == "ok"
+    assert "rejections" not in results[0]
+
+
+def test_retry_seeds_avoid_neighbouring_rows():
+    # Rows are often seeded 0, 1, 2, ...; their retries must not collide
+    seeds = range(1000)
+    retries = {retry_seed(seed, attempt) for seed in seeds for attempt in (1, 2, 3)}
+
+    assert len(retries) == 3000
+    assert retries.isdisjoint(seeds)
+
+
+def test_retry_seed_wraps_to_32_bits():
+    assert retry_seed(2**32 - 1, 1) == (2**32 - 1 + 1_000_003) % 2**32
+    assert 0 <= retry_seed(2**32 - 1, 10) < 2**32
+
+
+@pytest.mark.parametrize(
+    "box,reason",
+    [
+        ((0, 0, 64, 64), "coverage_high"),
+        ((30, 30, 33, 33), "coverage_low"),
+        ((0, 20, 30, 40), "touches_edge"),
+    ],
+)
+def test_check_sticker_names_the_failure(box, reason):
+    mask = np.zeros((64, 64), np.float32)
+    x0, y0, x1, y1 = box
+    mask[y0:y1, x0:x1] = 1.0
+
+    verdict = check_sticker(mask)
+
+    assert not verdict["passed"]
+    assert reason in verdict["reasons"]
+
+
+def test_check_sticker_passes_a_centered_subject():
+    mask = np.zeros((64, 64), np.float32)
+    mask[17:47, 17:47] = 1.0
+
+    verdict = check_sticker(mask)
+
+    assert verdict["passed"], verdict["reasons"]
+    assert verdict["scores"]["blobs"] == 1
@@ -0,0 +1,104 @@
+"""
+Tests for FairScheduler
+Priority classes, per-tenant fair share and concurrency caps
+"""
+
+import asyncio
+
+import pytest
+
+from custom_nodes.ar_sticker_factory.pipeline.scheduler import FairScheduler, QueueFull
+
+
+def drain(scheduler):
+    """Dequeue until nothing is eligible, without marking anything done"""
+    items = []
+    while (item := scheduler.get_nowait()) is not None:
+        items.append(item)
+    return items
+
+
+def test_priority_classes_are_strict():
+    scheduler = FairScheduler()
+    scheduler.put_nowait("backfill", priority="backfill")
+    scheduler.put_nowait("batch", priority="batch")
+    scheduler.put_nowait("interactive", priority="interactive")
+
+    assert drain(scheduler) == ["interactive", "batch", "backfill"]
+
+
+def test_tenants_share_a_class_fairly():
+    scheduler = FairScheduler(default_tenant_limit=100)
+    for i in range(10):
+        scheduler.put_nowait(f"a{i}", tenant="a")
+    scheduler.put_nowait("b0", tenant="b")
+    scheduler.put_nowait("b1", tenant="b")
+
+    order = drain(scheduler)
+
+    # b's jobs interleave with a's backlog instead of waiting behind it
+    assert order[:4] == ["a0", "b0", "a1", "b1"]
+    assert order[4:] == [f"a{i}" for i in range(2, 10)]
+
+
+def test_tenant_weight_scales_share():
+    scheduler = FairScheduler(tenant_weights={"a": 2.0}, default_tenant_limit=100)
+    for i in range(4):
+        scheduler.put_nowait(f"a{i}", tenant="a")
+        scheduler.put_nowait(f"b{i}", tenant="b")
+
+    order = drain(scheduler)
+
+    assert order[:3] == ["a0", "a1", "b0"]
+    assert order.index("a3") < order.index("b2")
+
+
+def test_tenant_cap_skips_until_task_done():
+    scheduler = FairScheduler(tenant_limits={"a": 1})
+    scheduler.put_nowait("a0", tenant="a")
+    scheduler.put_nowait("a1", tenant="a")
+    scheduler.put_nowait("b0", tenant="b")
+
+    assert drain(scheduler) == ["a0", "b0"]
+    assert scheduler.qsize() == 1
+
+    scheduler.task_done("a0")
+    assert scheduler.get_nowait() == "a1"
+    assert scheduler.stats()["running_by_tenant"] == {"a": 1, "b": 1}
+
+
+def test_rejects_unknown_priority_and_overflow():
+    scheduler = FairScheduler(max_size=2)
+    with pytest.raises(ValueError):
+        scheduler.put_nowait("x", priority="urgent")
+
+    scheduler.put_nowait("x")
+    scheduler.put_nowait("y")
+    with pytest.raises(QueueFull):
+        scheduler.put_nowait("z")
+    assert scheduler.depth_by_class() == {"interactive": 0, "batch": 2, "backfill": 0}
+
+
+def test_stats_count_dequeues_per_class():
+    scheduler = FairScheduler()
+    scheduler.put_nowait("x", priority="interactive")
+    scheduler.put_nowait("y")
+    scheduler.get_nowait()
+
+    stats = scheduler.stats()
+    assert stats["interactive"]["dequeued"] == 1
+    assert stats["batch"]["waiting"] == 1
+    assert stats["batch"]["dequeued"] == 0
+
+
+def test_get_waits_for_an_item():
+    async def run():
+        scheduler = FairScheduler()
+        waiter = asyncio.create_task(scheduler.get())
+        await asyncio.sleep(0)
+        assert not waiter.done()
+
+        scheduler.put_nowait("job")
+        return await asyncio.wait_for(waiter, timeout=1)
+
+    assert asyncio.run(run()) == "job"
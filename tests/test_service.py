@@ -0,0 +1,151 @@
+"""
+Tests for StickerService
+The HTTP front end on an ephemeral port with the stub backend
+"""
+
+import asyncio
+import io
+import json
+import zipfile
+
+from custom_nodes.ar_sticker_factory.pipeline.service import MAX_BODY_BYTES, StickerService
+
+ESTIMATES = {"generate": 4.0, "segment": 1.0, "export": 0.5}
+
+
+async def request(port, method, path, body=None, headers=None):
+    """Send one request and return (status, headers, body bytes)"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    if isinstance(body, (dict, str)):
+        body = json.dumps(body).encode("utf-8")
+    body = body or b""
+
+    lines = [f"{method} {path} HTTP/1.1", "Host: localhost", f"Content-Length: {len(body)}"]
+    lines.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+
+    raw = await asyncio.wait_for(reader.read(), timeout=60)
+    writer.close()
+
+    head, _, payload = raw.partition(b"\r\n\r\n")
+    status_line, *header_lines = head.decode("latin-1").split("\r\n")
+    response_headers = {}
+    for line in header_lines:
+        name, _, value = line.partition(":")
+        response_headers[name.strip().lower()] = value.strip()
+    if response_headers.get("transfer-encoding") == "chunked":
+        payload = dechunk(payload)
+    return int(status_line.split()[1]), response_headers, payload
+
+
+def dechunk(data):
+    body = b""
+    while True:
+        size_line, _, data = data.partition(b"\r\n")
+        size = int(size_line, 16)
+        if size == 0:
+            return body
+        body += data[:size]
+        data = data[size + 2 :]
+
+
+def run_service(scenario, **options):
+    """Start a service on an ephemeral port, run scenario(port, service), stop"""
+
+    async def main():
+        service = StickerService(backend="stub", stage_estimates=ESTIMATES, **options)
+        server = await service.start(port=0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            return await scenario(port, service)
+        finally:
+            await service.stop()
+
+    return asyncio.run(main())
+
+
+def test_submit_stream_and_download():
+    async def scenario(port, service):
+        row = {"prompt": "service test", "seed": 11, "width": 512, "height": 512}
+        status, headers, body = await request(port, "POST", "/jobs", row)
+        assert status == 202
+        job = json.loads(body)
+        assert headers["location"] == f"/jobs/{job['id']}"
+        assert job["seed"] == 11
+
+        status, headers, body = await request(port, "GET", job["links"]["stream"])
+        assert status == 200
+        assert headers["content-type"] == "application/x-ndjson"
+        events = [json.loads(line) for line in body.decode("utf-8").splitlines()]
+
+        status, headers, payload = await request(port, "GET", job["links"]["result"])
+        return events, status, headers, payload
+
+    events, status, headers, payload = run_service(scenario)
+
+    stages = [(event["stage"], event["status"]) for event in events]
+    assert stages[0] == ("queued", "queued")
+    for stage in ("generate", "segment", "export"):
+        assert (stage, "started") in stages
+        assert (stage, "done") in stages
+    assert stages[-1] == ("done", "done")
+
+    assert status == 200
+    assert headers["x-sticker-format"] == "usdz"
+    assert 'filename="sticker.usdz"' in headers["content-disposition"]
+    assert int(headers["content-length"]) == len(payload)
+    with zipfile.ZipFile(io.BytesIO(payload)) as archive:
+        assert archive.namelist()[0].endswith(".usda")
+
+
+def test_oversized_body_is_refused():
+    async def scenario(port, service):
+        body = b"{" + b" " * MAX_BODY_BYTES + b"}"
+        return await request(port, "POST", "/jobs", body)
+
+    status, _, body = run_service(scenario)
+
+    assert status == 413
+    assert json.loads(body)["error"] == "Request body too large"
+
+
+def test_invalid_row_is_a_bad_request():
+    async def scenario(port, service):
+        return await request(port, "POST", "/jobs", {"prompt": "x", "width": 8})
+
+    status, _, body = run_service(scenario)
+
+    assert status == 400
+    assert "width" in json.loads(body)["error"]
+
+
+def test_admission_defers_and_rejects_by_deadline():
+    async def scenario(port, service):
+        # Nothing runs with no workers, so queued jobs stay ahead
+        for seed in range(2):
+            status, _, _ = await request(port, "POST", "/jobs", {"prompt": "ahead", "seed": seed})
+            assert status == 202
+
+        deferred = await request(port, "POST", "/jobs", {"prompt": "late", "deadline_s": 10})
+        rejected = await request(port, "POST", "/jobs", {"prompt": "late", "deadline_s": 2})
+        admitted = await request(port, "POST", "/jobs", {"prompt": "late", "deadline_s": 60})
+        return deferred, rejected, admitted
+
+    deferred, rejected, admitted = run_service(scenario, workers=0)
+
+    status, headers, body = deferred
+    decision = json.loads(body)["admission"]
+    # Two generates at 4s ahead plus a 5.5s job: 13.5s against 10s
+    assert status == 503
+    assert decision["action"] == "defer"
+    assert decision["retry_after_s"] == 4
+    assert headers["retry-after"] == "4"
+
+    status, headers, body = rejected
+    decision = json.loads(body)["admission"]
+    assert status == 503
+    assert decision["action"] == "reject"
+    assert "retry-after" not in headers
+
+    assert admitted[0] == 202
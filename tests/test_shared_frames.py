@@ -0,0 +1,123 @@
+"""
+Tests for FrameRing
+Reference counting, slot reuse and stale handle detection
+"""
+
+import multiprocessing
+
+import numpy as np
+import pytest
+import torch
+
+from custom_nodes.ar_sticker_factory.pipeline.shared_frames import FrameRing, StaleFrame
+
+
+@pytest.fixture
+def ring():
+    ring = FrameRing(slots=2, max_height=8, max_width=8, max_channels=4)
+    yield ring
+    ring.unlink()
+
+
+def rgba(value, side=4):
+    return np.full((side, side, 4), value, dtype=np.uint8)
+
+
+def test_put_and_view_round_trip(ring):
+    handle = ring.put(rgba(7))
+
+    assert ring.in_use() == 1
+    assert handle.kind == "raw"
+    np.testing.assert_array_equal(ring.view(handle), rgba(7))
+
+
+def test_image_and_mask_tensors(ring):
+    image = torch.rand(1, 4, 4, 3)
+    mask = torch.rand(1, 4, 4)
+
+    restored_image = ring.get_image(ring.put_image(image))
+    restored_mask = ring.get_mask(ring.put_mask(mask))
+
+    assert restored_image.shape == (1, 4, 4, 3)
+    assert restored_mask.shape == (1, 4, 4)
+    assert torch.allclose(restored_image, image, atol=1 / 255)
+    assert torch.allclose(restored_mask, mask, atol=1 / 255)
+
+
+def test_slot_is_freed_when_last_reference_drops(ring):
+    handle = ring.put(rgba(1))
+    ring.retain(handle)
+
+    ring.release(handle)
+    assert ring.in_use() == 1
+    np.testing.assert_array_equal(ring.view(handle), rgba(1))
+
+    ring.release(handle)
+    assert ring.in_use() == 0
+    with pytest.raises(StaleFrame):
+        ring.view(handle)
+
+
+def test_reused_slot_makes_old_handle_stale(ring):
+    old = ring.put(rgba(1))
+    ring.release(old)
+    new = ring.put(rgba(2))
+
+    assert new.slot == old.slot
+    assert new.generation == old.generation + 1
+    with pytest.raises(StaleFrame):
+        ring.view(old)
+    with pytest.raises(StaleFrame):
+        ring.retain(old)
+    with pytest.raises(StaleFrame):
+        ring.release(old)
+    np.testing.assert_array_equal(ring.view(new), rgba(2))
+
+
+def test_full_ring_times_out(ring):
+    ring.put(rgba(1))
+    ring.put(rgba(2))
+
+    with pytest.raises(TimeoutError):
+        ring.put(rgba(3), timeout=0.01)
+
+
+def test_rejects_frames_that_do_not_fit(ring):
+    with pytest.raises(ValueError):
+        ring.put(np.zeros((16, 16, 4), dtype=np.uint8))
+    with pytest.raises(ValueError):
+        ring.put(np.zeros((4, 4, 4), dtype=np.float32))
+    assert ring.in_use() == 0
+
+
+def _child_invert(ring, handle, results):
+    """Runs in a spawned process: read a frame by handle, write back its inverse"""
+    pixels = ring.view(handle)
+    inverted = ring.put(255 - pixels)
+    ring.release(handle)
+    results.put((int(pixels.sum()), inverted))
+    ring.close()
+
+
+def test_handle_crosses_process_boundary():
+    context = multiprocessing.get_context("spawn")
+    ring = FrameRing(slots=2, max_height=8, max_width=8, max_channels=4, context=context)
+    try:
+        frame = rgba(3)
+        handle = ring.put(frame)
+        results = context.Queue()
+
+        child = context.Process(target=_child_invert, args=(ring, handle, results))
+        child.start()
+        total, inverted = results.get(timeout=60)
+        child.join(timeout=30)
+
+        assert child.exitcode == 0
+        assert total == int(frame.sum())
+        # The child's release is visible here: only its own frame is held
+        assert ring.in_use() == 1
+        with pytest.raises(StaleFrame):
+            ring.view(handle)
+        np.testing.assert_array_equal(ring.view(inverted), 255 - frame)
+    finally:
+        ring.unlink()
@@ -0,0 +1,72 @@
+"""
+Tests for StickerPackBundler
+Archive contents against manifest.json, and pack name validation
+"""
+
+import hashlib
+import json
+import os
+import zipfile
+
+import pytest
+import torch
+
+from custom_nodes.ar_sticker_factory.nodes.sticker_pack_bundler import StickerPackBundler
+
+
+def stickers(count, side=32):
+    batch = torch.ones(count, side, side, 4)
+    for index in range(count):
+        batch[index, 8:24, 8:24, index % 3] = 0.1 * index
+    batch[:, :4, :, 3] = 0.0
+    return batch
+
+
+def bundle(pack_name, export_format="glb"):
+    return StickerPackBundler().bundle_pack(
+        images=[stickers(2), stickers(1)],
+        pack_name=[pack_name],
+        pack_theme=["animals"],
+        scale=[0.1],
+        material_type=["matte"],
+        ar_behavior=["billboard"],
+        export_format=[export_format],
+        max_workers=[2],
+        thumbnail_size=[64],
+    )
+
+
+def test_archive_matches_its_manifest():
+    pack_path, thumbnail = bundle("zoo")
+
+    assert pack_path == os.path.join(os.getcwd(), "output", "sticker_packs", "zoo.zip")
+    assert thumbnail.shape == (1, 64, 64, 4)
+
+    with zipfile.ZipFile(pack_path) as archive:
+        manifest = json.loads(archive.read("manifest.json"))
+        names = set(archive.namelist())
+
+        assert manifest["pack_name"] == "zoo"
+        assert manifest["count"] == 3
+        assert [member["index"] for member in manifest["stickers"]] == [0, 1, 2]
+        assert names == {member["file"] for member in manifest["stickers"]} | {
+            "manifest.json",
+            manifest["thumbnail"],
+        }
+        for member in manifest["stickers"]:
+            payload = archive.read(member["file"])
+            assert member["file"] == f"stickers/zoo_{member['index']:03d}.glb"
+            assert member["bytes"] == len(payload)
+            assert member["sha256"] == hashlib.sha256(payload).hexdigest()
+            assert payload[:4] == b"glTF"
+
+    # Only the finished pack is left in the output directory
+    assert os.listdir(os.path.dirname(pack_path)) == ["zoo.zip"]
+
+
+@pytest.mark.parametrize("pack_name", ["", "../escape", "nested/pack", ".hidden", "a" * 129])
+def test_pack_names_must_be_plain_file_names(pack_name):
+    with pytest.raises(ValueError, match="pack_name"):
+        bundle(pack_name)
+
+    assert not os.path.exists(os.path.join("output", "sticker_packs"))
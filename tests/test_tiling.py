@@ -0,0 +1,108 @@
+"""
+Tests for tiled post-processing
+Each tiled path must match the whole-frame result exactly
+"""
+
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+
+from custom_nodes.ar_sticker_factory.utils import tiling
+from custom_nodes.ar_sticker_factory.utils.image_processing import (
+    enhance_sticker_for_ar,
+    process_alpha_channel,
+)
+from custom_nodes.ar_sticker_factory.utils.tiling import (
+    apply_mask_tiled,
+    to_float_tensor,
+    to_uint8,
+    use_tiles,
+)
+
+
+def blob_mask(height=150, width=170, seed=0):
+    """Speckled blobs, so the morphology and blur have edges to work on"""
+    rng = np.random.default_rng(seed)
+    coarse = rng.random((height // 10 + 1, width // 10 + 1))
+    blobs = np.kron(coarse, np.ones((10, 10)))[:height, :width] > 0.5
+    speckle = rng.random((height, width)) < 0.05
+    return blobs ^ speckle
+
+
+def max_diff(a, b):
+    return np.abs(np.asarray(a, np.float64) - np.asarray(b, np.float64)).max()
+
+
+@pytest.mark.parametrize("tile_size", [16, 37, 64, 1024])
+@pytest.mark.parametrize("padding,blur_radius", [(10, 2), (0, 1), (3, 5)])
+def test_alpha_channel_tiles_match_the_whole_frame(tile_size, padding, blur_radius):
+    mask = blob_mask()
+
+    whole = process_alpha_channel(mask.astype(np.float32), padding, blur_radius, tile_size=-1)
+    tiled = process_alpha_channel(mask.astype(np.float32), padding, blur_radius, tile_size=tile_size)
+
+    assert tiled.dtype == whole.dtype == np.float32
+    assert tiled.shape == whole.shape
+    assert max_diff(tiled, whole) == 0
+
+
+@pytest.mark.parametrize("dtype", [bool, np.uint8, np.float32])
+def test_alpha_channel_tiles_accept_every_mask_dtype(dtype):
+    mask = blob_mask(seed=1)
+    mask = mask.astype(dtype) * (255 if dtype is np.uint8 else 1)
+
+    whole = process_alpha_channel(mask, tile_size=-1)
+    tiled = process_alpha_channel(mask, tile_size=32)
+
+    assert max_diff(tiled, whole) == 0
+
+
+def sticker_image(mode, size=(130, 90), seed=0):
+    rng = np.random.default_rng(seed)
+    channels = len(mode)
+    pixels = rng.integers(0, 256, size=(size[1], size[0], channels), dtype=np.uint8)
+    return Image.fromarray(pixels, mode)
+
+
+@pytest.mark.parametrize("mode", ["RGB", "RGBA"])
+@pytest.mark.parametrize("contrast,saturation", [(True, True), (True, False), (False, True)])
+@pytest.mark.parametrize("tile_size", [16, 50])
+def test_enhance_tiles_match_the_whole_image(mode, contrast, saturation, tile_size):
+    image = sticker_image(mode)
+
+    whole = enhance_sticker_for_ar(image, contrast, saturation, tile_size=-1)
+    tiled = enhance_sticker_for_ar(image, contrast, saturation, tile_size=tile_size)
+
+    assert tiled.mode == whole.mode == mode
+    assert max_diff(tiled, whole) == 0
+
+
+def test_band_conversions_match_whole_frame_casts():
+    rng = np.random.default_rng(2)
+    values = torch.from_numpy(rng.random((1, 75, 40, 3), dtype=np.float32))
+
+    pixels = to_uint8(values, tile_size=16)
+    assert np.array_equal(pixels, (values[0].numpy() * 255).astype(np.uint8))
+
+    tensor = to_float_tensor(pixels, tile_size=16)
+    assert tensor.shape == (1, 75, 40, 3)
+    assert torch.equal(tensor, torch.from_numpy(pixels.astype(np.float32) / 255.0)[None,])
+
+
+def test_apply_mask_matches_the_segmenter_alpha():
+    pixels = np.asarray(sticker_image("RGB", size=(40, 75), seed=3))
+    mask = blob_mask(75, 40, seed=3)
+
+    rgba = apply_mask_tiled(pixels, mask, tile_size=16)
+
+    assert np.array_equal(rgba[:, :, :3], pixels)
+    assert np.array_equal(rgba[:, :, 3], mask.astype(np.uint8) * 255)
+
+
+def test_use_tiles_follows_the_setting_and_frame_size():
+    assert use_tiles(10, 10, tile_size=8)
+    assert not use_tiles(4096, 4096, tile_size=-1)
+    assert not use_tiles(2048, 2048)
+    assert use_tiles(2048, 2049)
+    assert tiling.tile_size_for(0) == tiling.DEFAULT_TILE_SIZE
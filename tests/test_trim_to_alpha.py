@@ -0,0 +1,89 @@
+"""
+Tests for trim-to-alpha
+Crop boxes and the exporter's mesh scale after trimming
+"""
+
+import pytest
+from PIL import Image
+
+from custom_nodes.ar_sticker_factory.nodes.usdz_exporter import USDZExporter
+from custom_nodes.ar_sticker_factory.utils.image_processing import trim_to_alpha
+
+
+def sticker(size, box, alpha=255):
+    """Transparent frame with an opaque rectangle at box"""
+    image = Image.new("RGBA", size, (255, 255, 255, 0))
+    content = Image.new("RGBA", (box[2] - box[0], box[3] - box[1]), (200, 0, 0, alpha))
+    image.paste(content, box[:2])
+    return image
+
+
+def test_crops_to_content_plus_margin():
+    trimmed, box = trim_to_alpha(sticker((200, 100), (100, 40, 150, 60)), margin=8)
+
+    assert box == (92, 32, 158, 68)
+    assert trimmed.size == (66, 36)
+
+
+def test_margin_is_clamped_to_the_frame():
+    _, box = trim_to_alpha(sticker((200, 100), (2, 0, 198, 50)), margin=8)
+
+    assert box == (0, 0, 200, 58)
+
+
+def test_alpha_threshold_ignores_faint_pixels():
+    image = sticker((100, 100), (0, 0, 100, 100), alpha=10)
+    image.paste(Image.new("RGBA", (20, 20), (0, 0, 0, 255)), (40, 40))
+
+    _, box = trim_to_alpha(image, margin=0, alpha_threshold=16)
+
+    assert box == (40, 40, 60, 60)
+
+
+@pytest.mark.parametrize(
+    "image",
+    [Image.new("RGBA", (64, 32), (0, 0, 0, 0)), Image.new("RGB", (64, 32))],
+    ids=["transparent", "rgb"],
+)
+def test_untrimmable_frames_are_returned_whole(image):
+    trimmed, box = trim_to_alpha(image)
+
+    assert trimmed is image
+    assert box == (0, 0, 64, 32)
+
+
+def test_mesh_scale_keeps_the_real_world_pixel_size():
+    image = sticker((400, 200), (100, 50, 300, 150))
+
+    trimmed, mesh_scale, box = USDZExporter()._prepare_image(
+        image, 0.2, optimize_mobile=False, auto_trim=True, trim_margin=0
+    )
+
+    assert box == (100, 50, 300, 150)
+    assert trimmed.size == (200, 100)
+    # The quad spans 2 * scale across the width, so each pixel keeps its size
+    assert mesh_scale == pytest.approx(0.1)
+    assert 2 * mesh_scale / trimmed.width == pytest.approx(2 * 0.2 / image.width)
+
+
+def test_mobile_resize_after_trim_keeps_the_mesh_scale():
+    image = sticker((2048, 1024), (0, 0, 1536, 1024))
+
+    trimmed, mesh_scale, _ = USDZExporter()._prepare_image(
+        image, 0.2, optimize_mobile=True, auto_trim=True, trim_margin=0
+    )
+
+    assert trimmed.size == (1024, 682)
+    assert mesh_scale == pytest.approx(0.2 * 1536 / 2048)
+
+
+def test_without_auto_trim_the_scale_is_unchanged():
+    image = sticker((400, 200), (100, 50, 300, 150))
+
+    trimmed, mesh_scale, box = USDZExporter()._prepare_image(
+        image, 0.2, optimize_mobile=False, auto_trim=False, trim_margin=0
+    )
+
+    assert trimmed is image
+    assert mesh_scale == 0.2
+    assert box is None
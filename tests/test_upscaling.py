@@ -0,0 +1,89 @@
+"""
+Tests for sticker upscaling
+Premultiplied RGBA upscaling without edge fringes, and mask shapes
+"""
+
+import pytest
+import torch
+
+from custom_nodes.ar_sticker_factory.utils import upscaling
+from custom_nodes.ar_sticker_factory.utils.upscaling import lanczos_upscale, upscale_sticker
+
+
+def red_disc_on_hidden_green(side=32):
+    """Opaque red disc; the transparent background hides pure green"""
+    yy, xx = torch.meshgrid(torch.arange(side), torch.arange(side), indexing="ij")
+    inside = ((yy - side / 2) ** 2 + (xx - side / 2) ** 2 < (side / 3) ** 2).float()
+    image = torch.zeros(1, side, side, 4)
+    image[0, ..., 0] = inside
+    image[0, ..., 1] = 1.0 - inside
+    image[0, ..., 3] = inside
+    return image
+
+
+def test_premultiplied_upscale_has_no_fringe():
+    image = red_disc_on_hidden_green()
+
+    upscaled, _, _ = upscale_sticker(image, None, (128, 128))
+
+    assert upscaled.shape == (1, 128, 128, 4)
+    rgb, alpha = upscaled[0, ..., :3], upscaled[0, ..., 3]
+    edge = (alpha > 0.05) & (alpha < 0.95)
+    assert edge.any()
+    # Edge pixels keep the disc's color instead of picking up the green
+    assert upscaled[0, ..., 1][alpha > 0.05].max() < 0.02
+    assert rgb[..., 0][edge].min() > 0.98
+    # Fully transparent pixels carry no color at all
+    assert (rgb[alpha < upscaling._MIN_ALPHA] == 0).all()
+
+
+def test_straight_upscale_would_fringe():
+    # The hidden green does bleed into the edge without premultiplying
+    image = red_disc_on_hidden_green()
+
+    rgb = lanczos_upscale(image[..., :3], (128, 128))[0]
+    alpha = lanczos_upscale(image[..., 3:], (128, 128))[0, ..., 0]
+
+    assert rgb[..., 1][(alpha > 0.05) & (alpha < 0.95)].max() > 0.3
+
+
+def test_rgb_upscaler_sees_premultiplied_color(monkeypatch):
+    seen = []
+
+    def recording(image, size):
+        seen.append(image.clone())
+        return lanczos_upscale(image, size)
+
+    monkeypatch.setitem(upscaling._upscalers, "recording", recording)
+    image = red_disc_on_hidden_green(16)
+
+    upscale_sticker(image, None, (32, 32), upscaler="recording")
+
+    assert len(seen) == 1
+    assert seen[0].shape == (1, 16, 16, 3)
+    assert torch.equal(seen[0], image[..., :3] * image[..., 3:])
+
+
+@pytest.mark.parametrize("shape", [(1, 24, 16), (1, 1, 24, 16)])
+def test_mask_keeps_its_layout(shape):
+    image = torch.rand(1, 24, 16, 3)
+    mask = torch.zeros(shape)
+    mask[..., 6:18, 4:12] = 1.0
+
+    upscaled, upscaled_mask, seconds = upscale_sticker(image, mask, (32, 48))
+
+    assert upscaled.shape == (1, 48, 32, 3)
+    assert upscaled_mask.shape == shape[:-2] + (48, 32)
+    assert float(upscaled_mask.min()) >= 0.0 and float(upscaled_mask.max()) <= 1.0
+    assert seconds >= 0
+
+
+def test_unknown_upscaler_is_rejected():
+    with pytest.raises(ValueError, match="Unknown upscaler"):
+        upscale_sticker(torch.rand(1, 8, 8, 3), None, (16, 16), upscaler="bicubic-ish")
+
+
+def test_generation_size_keeps_the_short_side_at_the_minimum():
+    assert upscaling.generation_size(2048, 1024, 0.25) == (1024, 512)
+    assert upscaling.generation_size(1024, 1024, 0.5) == (512, 512)
+    assert upscaling.generation_size(768, 512, 0.5) == (768, 512)
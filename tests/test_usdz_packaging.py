@@ -0,0 +1,64 @@
+"""
+Tests for USDZ packaging
+Stored entries with 64-byte aligned data and deterministic output
+"""
+
+import io
+import struct
+import zipfile
+
+import pytest
+
+from custom_nodes.ar_sticker_factory.utils.usdz_packaging import USDZ_ALIGNMENT, write_usdz
+
+ENTRIES = [
+    ("sticker.usda", b"#usda 1.0\n"),
+    ("textures/a.png", b"\x89PNG" + bytes(range(97))),
+    ("textures/odd name.png", b"x" * 3),
+    ("textures/long_" + "n" * 40 + ".png", b"y" * 1000),
+]
+
+
+def data_offset(raw, info):
+    """Offset of an entry's data, read from its local file header"""
+    name_length, extra_length = struct.unpack_from("<HH", raw, info.header_offset + 26)
+    return info.header_offset + 30 + name_length + extra_length
+
+
+def test_entry_data_is_aligned_and_stored():
+    output = io.BytesIO()
+    size = write_usdz(output, ENTRIES)
+    raw = output.getvalue()
+    assert size == len(raw)
+
+    with zipfile.ZipFile(io.BytesIO(raw)) as archive:
+        infos = archive.infolist()
+        assert [info.filename for info in infos] == [name for name, _ in ENTRIES]
+        for info, (name, data) in zip(infos, ENTRIES):
+            assert info.compress_type == zipfile.ZIP_STORED
+            offset = data_offset(raw, info)
+            assert offset % USDZ_ALIGNMENT == 0, name
+            assert raw[offset : offset + len(data)] == data
+            assert archive.read(name) == data
+
+
+@pytest.mark.parametrize("prefix", [0, 1, 63])
+def test_alignment_is_relative_to_archive_start(prefix):
+    output = io.BytesIO()
+    output.write(b"\0" * prefix)
+    write_usdz(output, ENTRIES)
+    raw = output.getvalue()[prefix:]
+
+    with zipfile.ZipFile(io.BytesIO(raw)) as archive:
+        for info in archive.infolist():
+            assert data_offset(raw, info) % USDZ_ALIGNMENT == 0
+
+
+def test_output_is_deterministic(tmp_path):
+    path = tmp_path / "sticker.usdz"
+    write_usdz(str(path), ENTRIES)
+
+    output = io.BytesIO()
+    write_usdz(output, ENTRIES)
+
+    assert path.read_bytes() == output.getvalue()
@@ -0,0 +1,182 @@
+"""
+Tests for weight loading
+Memory-mapped loads of small synthetic weight files, the load report and warm standby
+"""
+
+import asyncio
+import sys
+import types
+
+import pytest
+import torch
+
+from custom_nodes.ar_sticker_factory.utils import weight_loading
+from custom_nodes.ar_sticker_factory.utils.weight_loading import (
+    LoadReport,
+    ModelCache,
+    load_weights,
+    track_model,
+)
+
+safetensors_torch = pytest.importorskip("safetensors.torch")
+
+
+@pytest.fixture
+def report(monkeypatch):
+    report = LoadReport()
+    monkeypatch.setattr(weight_loading, "_report", report)
+    return report
+
+
+@pytest.fixture
+def state_dict():
+    return {
+        "weight": torch.arange(12, dtype=torch.float32).reshape(3, 4),
+        "bias": torch.tensor([1, 2, 3], dtype=torch.float16),
+        "steps": torch.tensor([7], dtype=torch.int64),
+        "empty": torch.zeros(0, 2),
+    }
+
+
+def assert_same(loaded, expected):
+    assert sorted(loaded) == sorted(expected)
+    for name, tensor in expected.items():
+        assert loaded[name].dtype == tensor.dtype
+        assert torch.equal(loaded[name], tensor), name
+
+
+@pytest.mark.parametrize("prefetch", [True, False])
+def test_safetensors_are_memory_mapped(tmp_path, report, state_dict, prefetch):
+    path = str(tmp_path / "tiny.safetensors")
+    safetensors_torch.save_file(state_dict, path)
+
+    assert_same(load_weights(path, prefetch=prefetch), state_dict)
+
+    entry = report.summary()["models"]["tiny.safetensors"]
+    assert entry["mmap"] is True
+    assert entry["bytes"] == (tmp_path / "tiny.safetensors").stat().st_size
+
+
+def test_torch_checkpoint_unwraps_state_dict(tmp_path, report, state_dict):
+    path = str(tmp_path / "tiny.ckpt")
+    torch.save({"state_dict": state_dict}, path)
+
+    assert_same(load_weights(path), state_dict)
+    assert report.summary()["models"]["tiny.ckpt"]["mmap"] is True
+
+
+def test_track_model_groups_files(tmp_path, report, state_dict):
+    first = str(tmp_path / "unet.safetensors")
+    second = str(tmp_path / "vae.pt")
+    safetensors_torch.save_file(state_dict, first)
+    torch.save(state_dict, second)
+
+    with track_model("sdxl"):
+        load_weights(first)
+        load_weights(second)
+
+    entry = report.summary()["models"]["sdxl"]
+    assert entry["files"] == [first, second]
+    assert entry["total_s"] >= entry["io_s"] + entry["deserialize_s"] - 0.001
+    assert set(report.summary()["models"]) == {"sdxl"}
+
+
+def test_model_cache_loads_once_and_retries_none(report):
+    cache = ModelCache()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return None if len(calls) == 1 else object()
+
+    assert cache.get("sam2", loader) is None
+    model = cache.get("sam2", loader)
+    assert model is not None
+    assert cache.get("sam2", loader) is model
+    assert len(calls) == 2
+    assert cache.loaded() == ["sam2"]
+
+
+def test_warm_standby_only_registers_under_comfyui(monkeypatch, tmp_path):
+    monkeypatch.delitem(sys.modules, "server", raising=False)
+    assert weight_loading.register_warm_standby() is False
+
+    app = types.SimpleNamespace(on_startup=[])
+    server = types.ModuleType("server")
+    server.PromptServer = types.SimpleNamespace(instance=types.SimpleNamespace(app=app))
+    monkeypatch.setitem(sys.modules, "server", server)
+    assert weight_loading.register_warm_standby() is True
+
+    # Without STICKER_WARM_STANDBY the marker is written straight away
+    ready = tmp_path / "ready"
+    monkeypatch.setenv("STICKER_READY_FILE", str(ready))
+    monkeypatch.delenv("STICKER_WARM_STANDBY", raising=False)
+    asyncio.run(app.on_startup[0](None))
+    assert ready.exists()
+
+
+def test_failed_warm_standby_leaves_marker_absent(monkeypatch, tmp_path, report):
+    from custom_nodes.ar_sticker_factory.pipeline import backends
+
+    class FailingBackend:
+        def preload(self):
+            return weight_loading.preload_models({"sdxl": lambda: None})
+
+    monkeypatch.setattr(backends, "NodeBackend", FailingBackend)
+    ready = tmp_path / "ready"
+    monkeypatch.setenv("STICKER_READY_FILE", str(ready))
+    monkeypatch.setenv("STICKER_WARM_STANDBY", "1")
+
+    weight_loading.start_warm_standby().join(timeout=10)
+
+    assert not ready.exists()
+    assert report.summary()["failed"] == {"sdxl": "loader returned None"}
+
+
+def test_hooks_map_loader_reads_inside_track_model(tmp_path, report, state_dict):
+    weight_loading.install_load_hooks()
+    unet = str(tmp_path / "unet.safetensors")
+    sam = str(tmp_path / "sam2.pt")
+    safetensors_torch.save_file(state_dict, unet)
+    torch.save({"model": state_dict, "step": 3}, sam)
+
+    # What the SDXL and SAM2 loaders call themselves
+    with track_model("sdxl"):
+        loaded_unet = safetensors_torch.load_file(unet, device="cpu")
+    with track_model("sam2"):
+        checkpoint = torch.load(sam, map_location="cpu", weights_only=True)
+
+    assert_same(loaded_unet, state_dict)
+    # Returned as saved, not unwrapped, since the caller indexes into it
+    assert checkpoint["step"] == 3
+    assert_same(checkpoint["model"], state_dict)
+
+    models = report.summary()["models"]
+    assert models["sdxl"]["files"] == [unet]
+    assert models["sam2"]["files"] == [sam]
+    assert models["sdxl"]["mmap"] is True and models["sam2"]["mmap"] is True
+    for entry in models.values():
+        assert entry["io_s"] + entry["deserialize_s"] + entry["other_s"] <= entry["total_s"] + 0.002
+
+
+def test_hooks_pass_through_outside_track_model(tmp_path, report, state_dict):
+    weight_loading.install_load_hooks()
+    path = str(tmp_path / "plain.pt")
+    torch.save(state_dict, path)
+
+    assert_same(torch.load(path, map_location="cpu", weights_only=True), state_dict)
+    with open(path, "rb") as f, track_model("file-object"):
+        assert_same(torch.load(f, map_location="cpu", weights_only=True), state_dict)
+
+    assert report.summary()["models"]["file-object"]["files"] == []
+    assert "plain.pt" not in report.summary()["models"]
+
+
+def test_preload_failure_is_reported(report):
+    models = weight_loading.preload_models(
+        {"ok": lambda: object(), "broken": lambda: 1 / 0, "missing": lambda: None}
+    )
+
+    assert models["ok"] is not None
+    assert models["broken"] is None
+    assert set(report.summary()["failed"]) == {"broken", "missing"}
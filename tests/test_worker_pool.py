@@ -0,0 +1,185 @@
+"""
+Tests for WorkerPool
+CPU workers running the stub backend: routing, results and restarts
+"""
+
+import os
+import signal
+import time
+import warnings
+
+import pytest
+
+from custom_nodes.ar_sticker_factory.pipeline import BACKENDS, StubBackend, WorkerPool, default_params
+from custom_nodes.ar_sticker_factory.pipeline.runner import normalize_row
+
+SLOW_JOB_S = 2.0
+
+
+class SlowStubBackend(StubBackend):
+    """Stub whose generate takes a while, so jobs can be caught in flight"""
+
+    name = "slow-stub"
+
+    def generate(self, rows):
+        time.sleep(SLOW_JOB_S)
+        return super().generate(rows)
+
+
+def row(seed):
+    return normalize_row(
+        {"prompt": "worker pool", "seed": seed, "width": 64, "height": 64}, default_params()
+    )
+
+
+def wait_for(condition, timeout=60):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError("condition not met in time")
+        time.sleep(0.05)
+
+
+@pytest.fixture
+def pool():
+    pool = WorkerPool(
+        backend="stub",
+        devices=["cpu", "cpu"],
+        max_inflight=1,
+        start_method="spawn",
+        poll_interval=0.05,
+    )
+    wait_for(pool.ready)
+    yield pool
+    pool.shutdown(timeout=5)
+
+
+def test_jobs_spread_across_workers(pool):
+    futures = [pool.submit(row(seed)) for seed in range(4)]
+    results = [future.result(timeout=60) for future in futures]
+
+    assert [result["seed"] for result in results] == [0, 1, 2, 3]
+    assert all(result["payload"] for result in results)
+    assert {result["device"] for result in results} == {"cpu"}
+
+    stats = pool.stats()
+    assert sum(worker["completed"] for worker in stats["workers"]) == 4
+    # With one slot per worker, both take jobs
+    assert all(worker["completed"] for worker in stats["workers"])
+    assert all("sdxl" in worker["resident"] for worker in stats["workers"])
+
+
+def test_routes_to_worker_with_model_resident(pool):
+    pool.submit(row(1), model_key="flux").result(timeout=60)
+    warm = next(
+        worker["id"] for worker in pool.stats()["workers"] if "flux" in worker["resident"]
+    )
+
+    for seed in range(3):
+        result = pool.submit(row(seed), model_key="flux").result(timeout=60)
+        assert result["worker"] == warm
+
+
+def test_crashed_worker_is_restarted(pool):
+    victim = pool.stats()["workers"][0]
+    os.kill(victim["pid"], signal.SIGKILL)
+
+    wait_for(lambda: pool.stats()["workers"][0]["restarts"] == 1)
+    wait_for(pool.ready)
+
+    result = pool.submit(row(5)).result(timeout=60)
+    assert result["seed"] == 5
+    assert pool.stats()["workers"][0]["pid"] != victim["pid"]
+
+
+@pytest.fixture
+def slow_pool(monkeypatch):
+    # Forked workers inherit the registration; spawned ones would not
+    monkeypatch.setitem(BACKENDS, "slow-stub", SlowStubBackend)
+    with warnings.catch_warnings():
+        # Earlier tests may leave idle threads behind; the workers don't use them
+        warnings.simplefilter("ignore", DeprecationWarning)
+        pool = WorkerPool(
+            backend="slow-stub",
+            devices=["cpu", "cpu"],
+            max_inflight=1,
+            start_method="fork",
+            poll_interval=0.05,
+        )
+    wait_for(pool.ready)
+    yield pool
+    pool.shutdown(timeout=5)
+
+
+def busy_worker(pool):
+    wait_for(lambda: any(worker["inflight"] for worker in pool.stats()["workers"]))
+    return next(worker for worker in pool.stats()["workers"] if worker["inflight"])
+
+
+@pytest.mark.filterwarnings("ignore::DeprecationWarning")
+def test_job_on_crashed_worker_finishes_elsewhere(slow_pool):
+    future = slow_pool.submit(row(3))
+    victim = busy_worker(slow_pool)
+    os.kill(victim["pid"], signal.SIGKILL)
+
+    start = time.monotonic()
+    result = future.result(timeout=60)
+
+    assert result["seed"] == 3
+    assert result["worker"] != victim["id"]
+    # Retried straight away on the idle worker, not after the restart
+    assert time.monotonic() - start < SLOW_JOB_S * 2
+    assert slow_pool.stats()["workers"][victim["id"]]["restarts"] == 1
+
+
+def test_shutdown_waits_for_running_jobs(slow_pool):
+    future = slow_pool.submit(row(4))
+    busy_worker(slow_pool)
+
+    slow_pool.shutdown(timeout=30)
+
+    assert future.done()
+    assert future.result()["seed"] == 4
+
+
+def test_shutdown_fails_jobs_still_running_at_timeout(slow_pool):
+    running = slow_pool.submit(row(5))
+    busy_worker(slow_pool)
+
+    slow_pool.shutdown(timeout=0.2)
+
+    assert running.done()
+    with pytest.raises(RuntimeError, match="shut down"):
+        running.result()
+
+
+def test_frame_handoff_matches_in_worker_export():
+    pool = WorkerPool(
+        backend="stub",
+        devices=["cpu"],
+        max_inflight=1,
+        start_method="spawn",
+        poll_interval=0.05,
+        frame_handoff=True,
+    )
+    try:
+        wait_for(pool.ready)
+        exported = []
+        export_frame = pool._export_frame
+        pool._export_frame = lambda *args: exported.append(args) or export_frame(*args)
+        events = []
+        handed = pool.submit(row(9), on_event=events.append).result(timeout=60)
+        assert pool.stats()["frames_in_use"] == 0
+    finally:
+        pool.shutdown(timeout=5)
+
+    local = StubBackend()
+    normalized = row(9)
+    image, _ = local.segment_checked(local.generate([normalized])[0], normalized)
+    expected = local.export_payload(image, normalized)
+
+    assert handed["payload"] == bytes(expected["payload"])
+    # The export ran in this process, not in the worker
+    assert len(exported) == 1
+    export_events = [event for event in events if event["stage"] == "export"]
+    assert [event["status"] for event in export_events] == ["started", "done"]